@@ -6,10 +6,11 @@ resource "aws_apigatewayv2_api" "main" {
   description   = "DNS and HTTP validation API"
 
   cors_configuration {
-    allow_origins = ["*"]
-    allow_methods = ["GET", "POST", "OPTIONS"]
-    allow_headers = ["content-type", "x-amz-date", "authorization", "x-api-key"]
-    max_age       = 300
+    allow_origins  = ["*"]
+    allow_methods  = ["GET", "POST", "OPTIONS"]
+    allow_headers  = ["content-type", "x-amz-date", "authorization", "x-api-key", "if-none-match", "prefer", "last-event-id"]
+    expose_headers = ["etag"]
+    max_age        = 300
   }
 
   # Note: IP restriction is implemented via Lambda authorizer
@@ -91,6 +92,41 @@ resource "aws_lambda_permission" "api_ingest" {
   source_arn    = "${aws_apigatewayv2_api.main.execution_arn}/*/*"
 }
 
+# POST /jobs and GET /jobs routes (bulk validation jobs)
+resource "aws_apigatewayv2_route" "jobs_create" {
+  api_id             = aws_apigatewayv2_api.main.id
+  route_key          = "POST /jobs"
+  authorizer_id      = aws_apigatewayv2_authorizer.ip_authorizer.id
+  authorization_type = "CUSTOM"
+
+  target = "integrations/${aws_apigatewayv2_integration.jobs.id}"
+}
+
+resource "aws_apigatewayv2_route" "jobs_status" {
+  api_id             = aws_apigatewayv2_api.main.id
+  route_key          = "GET /jobs"
+  authorizer_id      = aws_apigatewayv2_authorizer.ip_authorizer.id
+  authorization_type = "CUSTOM"
+
+  target = "integrations/${aws_apigatewayv2_integration.jobs.id}"
+}
+
+resource "aws_apigatewayv2_integration" "jobs" {
+  api_id           = aws_apigatewayv2_api.main.id
+  integration_type = "AWS_PROXY"
+
+  integration_uri    = aws_lambda_function.bulk_job.invoke_arn
+  integration_method = "POST"
+}
+
+resource "aws_lambda_permission" "bulk_job" {
+  statement_id  = "AllowExecutionFromAPIGateway"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.bulk_job.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.main.execution_arn}/*/*"
+}
+
 # GET /status route
 resource "aws_apigatewayv2_route" "status" {
   api_id    = aws_apigatewayv2_api.main.id
@@ -115,6 +151,22 @@ resource "aws_lambda_permission" "status_api" {
   source_arn    = "${aws_apigatewayv2_api.main.execution_arn}/*/*"
 }
 
+# GET /status/stream route (server-sent events)
+resource "aws_apigatewayv2_route" "status_stream" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /status/stream"
+
+  target = "integrations/${aws_apigatewayv2_integration.status.id}"
+}
+
+# POST /status/batch route
+resource "aws_apigatewayv2_route" "status_batch" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /status/batch"
+
+  target = "integrations/${aws_apigatewayv2_integration.status.id}"
+}
+
 # GET /recent route
 resource "aws_apigatewayv2_route" "recent" {
   api_id    = aws_apigatewayv2_api.main.id
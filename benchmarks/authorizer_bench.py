@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Per-call cost of dnscheck-ip-authorizer as the allowlist grows
+
+Compares the original linear scan (re-parsing ALLOWED_IPS and building an
+ip_network per entry on every call) with the compiled, bisect-based
+allowlist in the current handler. Run from the repository root:
+
+    python3 benchmarks/authorizer_bench.py --sizes 10 100 1000 10000
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import ipaddress
+import json
+import os
+import random
+import time
+from pathlib import Path
+
+HANDLER = Path(__file__).resolve().parents[1] / 'lambda-functions' / 'dnscheck-ip-authorizer' / 'lambda_function.py'
+
+
+def load_handler():
+    spec = importlib.util.spec_from_file_location('ip_authorizer', HANDLER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_is_allowed(allowed_ips_str, source_ip):
+    """The authorizer's original matching loop, kept here as the baseline"""
+    allowed_ips = [ip.strip() for ip in allowed_ips_str.split(',') if ip.strip()]
+    source_ip_addr = ipaddress.ip_address(source_ip)
+    for allowed_ip in allowed_ips:
+        try:
+            if '/' in allowed_ip:
+                if source_ip_addr in ipaddress.ip_network(allowed_ip, strict=False):
+                    return True
+            elif source_ip_addr == ipaddress.ip_address(allowed_ip):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def random_allowlist(size, rng):
+    """Cloud-provider-like mix: mostly IPv4 /16-/28 blocks, some IPv6 /32-/64"""
+    entries = []
+    for _ in range(size):
+        if rng.random() < 0.8:
+            prefix = rng.randint(16, 28)
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+            entries.append(str(ipaddress.ip_network(f'{address}/{prefix}', strict=False)))
+        else:
+            prefix = rng.randint(32, 64)
+            address = ipaddress.IPv6Address(rng.getrandbits(128))
+            entries.append(str(ipaddress.ip_network(f'{address}/{prefix}', strict=False)))
+    return entries
+
+
+def authorizer_event(source_ip):
+    return {'requestContext': {'requestId': 'bench', 'http': {'sourceIp': source_ip}}}
+
+
+def per_call_us(fn, sources):
+    started = time.perf_counter()
+    for source in sources:
+        fn(source)
+    return (time.perf_counter() - started) / len(sources) * 1e6
+
+
+def run(sizes, calls, legacy_limit, seed):
+    rng = random.Random(seed)
+    handler = load_handler()
+    rows = []
+
+    for size in sizes:
+        entries = random_allowlist(size, rng)
+        allowed_ips = ','.join(entries)
+        # Worst case for the linear scan is a miss, so use random addresses
+        sources = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(calls)]
+
+        os.environ['ALLOWED_IPS'] = allowed_ips
+        handler._allowlist = None
+
+        # The handler logs a line each time it compiles the allowlist
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            ranges = handler.load_allowlist()
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        compiled_us = per_call_us(lambda ip: handler.lambda_handler(authorizer_event(ip), None), sources)
+
+        legacy_us = None
+        if size <= legacy_limit:
+            legacy_sources = sources[:max(1, calls // 10)]
+            legacy_us = per_call_us(lambda ip: legacy_is_allowed(allowed_ips, ip), legacy_sources)
+            # Both must agree, including on addresses inside the list
+            inside = [str(ipaddress.ip_network(entry).network_address + 1) for entry in entries[:50]]
+            for ip in legacy_sources[:50] + inside:
+                assert handler.is_allowed(ranges, ip) == legacy_is_allowed(allowed_ips, ip), ip
+
+        rows.append({
+            'entries': size,
+            'compileMs': round(compile_ms, 2),
+            'compiledUsPerCall': round(compiled_us, 2),
+            'legacyUsPerCall': round(legacy_us, 2) if legacy_us is not None else None
+        })
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--calls', type=int, default=2000, help='authorizer calls per size')
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='skip the linear-scan baseline above this many entries')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.calls, args.legacy_limit, args.seed)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'ENTRIES':>8}  {'COMPILE':>10}  {'COMPILED/CALL':>14}  {'LINEAR/CALL':>12}")
+    for row in rows:
+        legacy = f"{row['legacyUsPerCall']:.1f}us" if row['legacyUsPerCall'] is not None else '-'
+        print(f"{row['entries']:>8}  {row['compileMs']:>8.1f}ms  {row['compiledUsPerCall']:>12.1f}us  {legacy:>12}")
+
+
+if __name__ == '__main__':
+    main()
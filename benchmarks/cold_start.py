@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Import time and first-invocation latency for every Lambda handler
+
+Each measurement runs in a fresh interpreter so nothing is cached between
+runs. It reports, per function:
+
+  import   time to import lambda_function.py (the Lambda init phase)
+  first    the first invocation, which pays for lazily created clients
+  warm     the median of the following invocations
+
+By default the handlers get the local stand-ins from tools/dnscheck_local,
+so no AWS account is needed and the numbers cover the handler code itself.
+With --backend aws the real boto3 is used against a deployed stack; set
+DYNAMODB_TABLE and EVENTBUS_NAME to match. Save a run with --save and later
+pass it as --baseline to fail (exit 1) on regressions:
+
+    python3 benchmarks/cold_start.py --save cold_start.json
+    python3 benchmarks/cold_start.py --baseline cold_start.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+TOOLS_DIR = REPO_ROOT / 'tools'
+
+FUNCTIONS = [
+    'api_ingest',
+    'dns_resolver',
+    'http_prober',
+    'https_prober',
+    'aggregator',
+    'status_api',
+    'ip_authorizer',
+    'bulk_job',
+]
+
+# Environment for the child interpreters; probes go to a closed local port
+CHILD_ENV = {
+    'EVENTBUS_NAME': 'dnscheck-bus',
+    'DYNAMODB_TABLE': 'dnscheck-validations',
+    'ALLOWED_IPS': '127.0.0.1/32',
+    'HTTP_TIMEOUT': '1',
+    'HTTPS_TIMEOUT': '1',
+}
+
+
+def sample_event(key):
+    """A representative event for each function that needs no network access"""
+    from dnscheck_local.runner import api_event
+
+    detail = {'requestId': 'cold-start', 'target': 'localhost', 'timestamp': '2026-01-01T00:00:00Z'}
+
+    if key == 'api_ingest':
+        return api_event('POST', '/check', body={'target': 'example.com'})
+    if key == 'dns_resolver':
+        return {'detail-type': 'ValidationRequested', 'detail': dict(detail, target='127.0.0.1')}
+    if key in ('http_prober', 'https_prober'):
+        return {'detail-type': 'DNSResolved', 'detail': dict(detail, ipAddresses=['127.0.0.1'])}
+    if key == 'aggregator':
+        return {'detail-type': 'HTTPChecked', 'detail': dict(detail, status='ok', timings={'http': 1})}
+    if key == 'status_api':
+        return api_event('GET', '/status', query={'requestId': 'cold-start'})
+    if key == 'ip_authorizer':
+        return api_event('GET', '/status', source_ip='127.0.0.1')
+    if key == 'bulk_job':
+        return api_event('GET', '/jobs', query={'jobId': 'cold-start'})
+    raise ValueError(key)
+
+
+def child(key, backend, warm_runs):
+    """Runs inside the fresh interpreter; prints one JSON line"""
+    import contextlib
+    import importlib.util
+
+    sys.path.insert(0, str(TOOLS_DIR))
+    from dnscheck_local.handlers import FUNCTIONS as DIRECTORIES, LAMBDA_DIR, LAYER_DIR, LambdaContext
+
+    event = sample_event(key)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        if backend == 'local':
+            from dnscheck_local.bus import EventBus
+            from dnscheck_local.fakes import VALIDATIONS_SCHEMA, Boto3Facade
+            from dnscheck_local.handlers import load_handler_module
+            from dnscheck_local.store import MemoryStore
+
+            bus = EventBus(lambda *args: None, rules=[])
+            facade = Boto3Facade(bus, MemoryStore(), {os.environ['DYNAMODB_TABLE']: VALIDATIONS_SCHEMA})
+
+            started = time.perf_counter()
+            module = load_handler_module(key, facade)
+            import_ms = (time.perf_counter() - started) * 1000
+        else:
+            sys.path.insert(0, str(LAYER_DIR))
+            path = LAMBDA_DIR / DIRECTORIES[key] / 'lambda_function.py'
+            spec = importlib.util.spec_from_file_location('lambda_function', path)
+            module = importlib.util.module_from_spec(spec)
+
+            started = time.perf_counter()
+            spec.loader.exec_module(module)
+            import_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        module.lambda_handler(event, LambdaContext(key))
+        first_ms = (time.perf_counter() - started) * 1000
+
+        warm = []
+        for _ in range(warm_runs):
+            started = time.perf_counter()
+            module.lambda_handler(event, LambdaContext(key))
+            warm.append((time.perf_counter() - started) * 1000)
+
+    print(json.dumps({
+        'importMs': import_ms,
+        'firstInvokeMs': first_ms,
+        'warmInvokeMs': statistics.median(warm) if warm else None
+    }))
+
+
+def measure(key, backend, runs, warm_runs):
+    """Median of `runs` fresh-interpreter measurements for one function"""
+    samples = []
+    env = dict(os.environ)
+    for name, value in CHILD_ENV.items():
+        env.setdefault(name, value)
+
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', key, '--backend', backend, '--warm-runs', str(warm_runs)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        'function': key,
+        **{
+            metric: round(statistics.median(sample[metric] for sample in samples), 2)
+            for metric in ('importMs', 'firstInvokeMs', 'warmInvokeMs')
+        }
+    }
+
+
+def regressions(rows, baseline, tolerance, slack_ms):
+    """Metrics that got slower than baseline * (1 + tolerance) + slack_ms"""
+    previous = {row['function']: row for row in baseline}
+    found = []
+    for row in rows:
+        before = previous.get(row['function'])
+        if not before:
+            continue
+        for metric in ('importMs', 'firstInvokeMs'):
+            limit = before[metric] * (1 + tolerance) + slack_ms
+            if row[metric] > limit:
+                found.append(f"{row['function']} {metric}: {row[metric]:.1f}ms (baseline {before[metric]:.1f}ms)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', nargs='+', choices=FUNCTIONS, default=FUNCTIONS)
+    parser.add_argument('--backend', choices=['local', 'aws'], default='local')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per function (default 5)')
+    parser.add_argument('--warm-runs', type=int, default=5, help='warm invocations per interpreter (default 5)')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--save', metavar='FILE', help='write the results to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with an earlier --save and exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown (default 0.25)')
+    parser.add_argument('--slack-ms', type=float, default=5.0, help='allowed absolute slowdown (default 5ms)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.backend, args.warm_runs)
+        return 0
+
+    rows = [measure(key, args.backend, args.runs, args.warm_runs) for key in args.functions]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'FUNCTION':<14}  {'IMPORT':>9}  {'FIRST':>9}  {'WARM':>9}")
+        for row in rows:
+            print(f"{row['function']:<14}  {row['importMs']:>7.1f}ms  {row['firstInvokeMs']:>7.1f}ms  {row['warmInvokeMs']:>7.1f}ms")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(rows, indent=2) + '\n')
+
+    if args.baseline:
+        found = regressions(rows, json.loads(Path(args.baseline).read_text()), args.tolerance, args.slack_ms)
+        for line in found:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if found else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
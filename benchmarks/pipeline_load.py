@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""End-to-end throughput and latency of the validation pipeline under load
+
+Drives POST /check -> resolver -> probers -> aggregator -> GET /status at a
+fixed arrival rate (open loop: a slow pipeline does not slow down arrivals)
+through the in-process pipeline from tools/dnscheck_local. Everything the
+handlers talk to is local:
+
+  DynamoDB, EventBridge   the in-memory (or sqlite) stand-ins
+  DNS                     a stub UDP server answering A <name> = 127.0.0.1
+  HTTP/HTTPS              local servers; HTTPS uses a throwaway CA (openssl)
+
+Each stand-in can add latency (--dns-latency-ms, --http-latency-ms,
+--https-latency-ms, --jitter-ms). The report has throughput, p50/p95/p99 per
+stage and end to end, handler durations and AWS calls per validation. Save
+a run with --save and compare a later one with --baseline (exit 1 on
+regressions), as with cold_start.py:
+
+    python3 benchmarks/pipeline_load.py --rate 50 --count 500 --save load.json
+    python3 benchmarks/pipeline_load.py --rate 50 --count 500 --baseline load.json
+
+Stages are measured between the events that start and end them, so they
+include time spent waiting for a free handler (--concurrency), like
+EventBridge delivery does when Lambda concurrency runs out.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import queue
+import random
+import socket
+import socketserver
+import ssl
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / 'tools'))
+
+from dnscheck_local.cli import parse_env  # noqa: E402
+from dnscheck_local.runner import Pipeline  # noqa: E402
+from dnscheck_local.store import parse_store  # noqa: E402
+
+# Stub DNS answers every name under this domain; the certificate covers *.DOMAIN
+DOMAIN = 'bench.test'
+
+FINAL_EVENTS = ('ValidationCompleted', 'ValidationFailed')
+
+# Stage name -> (start events, end events); a stage runs from the last of its
+# start events (for the aggregator: the last step) to the last end event
+STAGES = {
+    'dns': (('ValidationRequested',), ('DNSResolved', 'DNSFailed')),
+    'http': (('DNSResolved',), ('HTTPChecked',)),
+    'https': (('DNSResolved',), ('HTTPSChecked',)),
+    'aggregate': (('DNSResolved', 'DNSFailed', 'HTTPChecked', 'HTTPSChecked'), FINAL_EVENTS),
+}
+
+# Order of the stages in the report; ingest, status and endToEnd are timed by the driver
+STAGE_ORDER = ['ingest', 'dns', 'http', 'https', 'aggregate', 'status', 'endToEnd']
+
+OPENSSL_CONFIG = f"""
+[req]
+distinguished_name = dn
+prompt = no
+
+[dn]
+CN = dnscheck benchmark
+
+[ca]
+basicConstraints = critical, CA:TRUE
+keyUsage = critical, keyCertSign, cRLSign
+subjectKeyIdentifier = hash
+
+[leaf]
+basicConstraints = critical, CA:FALSE
+keyUsage = critical, digitalSignature
+extendedKeyUsage = serverAuth
+subjectAltName = DNS:*.{DOMAIN}
+subjectKeyIdentifier = hash
+authorityKeyIdentifier = keyid
+"""
+
+
+def delay(latency_ms, jitter_ms):
+    """Sleep for latency_ms, +/- up to jitter_ms"""
+    seconds = (latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(values):
+    """count/p50/p95/p99/max/mean of a list of milliseconds"""
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(values[-1], 2),
+        'mean': round(sum(values) / len(values), 2)
+    }
+
+
+# Stand-ins for the outside world
+
+class StubDNSServer(socketserver.ThreadingUDPServer):
+    """Answers A queries with 127.0.0.1 and everything else with NOERROR/no data"""
+
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, ttl=60):
+        super().__init__(('127.0.0.1', 0), StubDNSHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ttl = ttl
+
+
+class StubDNSHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        data, sock = self.request
+        if len(data) < 12:
+            return
+
+        # The question ends after the zero-length root label plus QTYPE/QCLASS
+        end = 12
+        while end < len(data) and data[end]:
+            end += data[end] + 1
+        end += 5
+        question = data[12:end]
+        qtype = struct.unpack('!H', data[end - 4:end - 2])[0] if end <= len(data) else 0
+
+        answers = b''
+        if qtype == 1:
+            # Name compression pointer back to the question at offset 12
+            answers = struct.pack('!HHHIH', 0xC00C, 1, 1, self.server.ttl, 4) + socket.inet_aton('127.0.0.1')
+
+        header = struct.pack('!HHHHHH', struct.unpack('!H', data[:2])[0], 0x8180, 1, 1 if answers else 0, 0, 0)
+
+        delay(self.server.latency_ms, self.server.jitter_ms)
+        sock.sendto(header + question + answers, self.client_address)
+
+
+class StubHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    body = b'ok\n'
+
+    # Headers and body are written separately; on a kept-alive connection
+    # Nagle would hold the body back until the prober's delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        delay(self.server.latency_ms, self.server.jitter_ms)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """HTTP server on a free local port; with ssl_context it serves HTTPS
+
+    The TLS handshake is done in the request's own thread, so one slow
+    handshake doesn't hold up accepting the next connection.
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, ssl_context=None):
+        super().__init__(('127.0.0.1', 0), StubHTTPHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ssl_context = ssl_context
+
+    def finish_request(self, request, client_address):
+        if self.ssl_context is not None:
+            try:
+                request = self.ssl_context.wrap_socket(request, server_side=True)
+            except (OSError, ssl.SSLError):
+                return
+        super().finish_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Probers close connections early on purpose (timeouts, Connection: close)
+        pass
+
+
+def make_certificates(directory):
+    """A throwaway CA and a *.DOMAIN certificate signed by it; returns (ca, cert, key) paths"""
+    directory = Path(directory)
+    config = directory / 'openssl.cnf'
+    config.write_text(OPENSSL_CONFIG)
+    ca, ca_key = directory / 'ca.pem', directory / 'ca.key'
+    cert, key, csr = directory / 'leaf.pem', directory / 'leaf.key', directory / 'leaf.csr'
+    new_key = ['-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes']
+
+    for command in (
+        ['req', '-x509', '-config', config, '-extensions', 'ca', *new_key,
+         '-keyout', ca_key, '-out', ca, '-days', '1'],
+        ['req', '-new', '-config', config, *new_key, '-subj', f'/CN=*.{DOMAIN}',
+         '-keyout', key, '-out', csr],
+        ['x509', '-req', '-in', csr, '-CA', ca, '-CAkey', ca_key, '-CAcreateserial',
+         '-extfile', config, '-extensions', 'leaf', '-out', cert, '-days', '1'],
+    ):
+        subprocess.run(['openssl', *map(str, command)], check=True, capture_output=True)
+
+    return ca, cert, key
+
+
+@contextlib.contextmanager
+def stand_ins(args):
+    """Start the stub DNS, HTTP and HTTPS servers; yields the handler environment"""
+    with tempfile.TemporaryDirectory(prefix='dnscheck-load-') as directory:
+        ca, cert, key = make_certificates(directory)
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(cert, key)
+
+        servers = [
+            StubDNSServer(args.dns_latency_ms, args.jitter_ms, args.dns_ttl),
+            StubHTTPServer(args.http_latency_ms, args.jitter_ms),
+            StubHTTPServer(args.https_latency_ms, args.jitter_ms, server_context),
+        ]
+        for server in servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        dns, http, https = servers
+        try:
+            yield {
+                'DNS_NAMESERVERS': f'127.0.0.1:{dns.server_address[1]}',
+                'DNS_TIMEOUT': '5',
+                'HTTP_PORT': str(http.server_address[1]),
+                'HTTPS_PORT': str(https.server_address[1]),
+                'HTTPS_CA_FILE': str(ca),
+                'HTTP_TIMEOUT': '10',
+                'HTTPS_TIMEOUT': '10',
+                # Every submission should run the whole pipeline, even with --targets
+                'COALESCE_WINDOW': '0',
+            }
+        finally:
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+
+
+# The load run
+
+class LoadRun:
+    """Submits validations at a fixed rate and records when each event was published"""
+
+    def __init__(self, pipeline, status_workers=4):
+        self.pipeline = pipeline
+        self.marks = {}
+        self.submissions = {}
+        self.status_ms = []
+        self.outcomes = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._finished = queue.Queue()
+        self._status_threads = [
+            threading.Thread(target=self._status_worker, daemon=True) for _ in range(status_workers)
+        ]
+        pipeline.bus.listeners.append(self._on_event)
+        for thread in self._status_threads:
+            thread.start()
+
+    def _on_event(self, event):
+        request_id = event['detail'].get('requestId')
+        detail_type = event['detail-type']
+        with self._lock:
+            marks = self.marks.setdefault(request_id, {})
+            marks.setdefault(detail_type, event['published'])
+        if detail_type in FINAL_EVENTS:
+            self._finished.put(request_id)
+
+    def _status_worker(self):
+        while True:
+            request_id = self._finished.get()
+            if request_id is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = self.pipeline.status(request_id)
+            except Exception:
+                status = {}
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.status_ms.append(elapsed)
+                self.outcomes[request_id] = (status.get('summary') or {}).get('overallStatus', 'pending')
+
+    def submit(self, target):
+        started = time.monotonic()
+        try:
+            body = self.pipeline.submit([target])
+        except Exception:
+            body = {}
+        finished = time.monotonic()
+
+        accepted = [r['requestId'] for r in body.get('requests', []) if r.get('status') == 'accepted']
+        with self._lock:
+            if not accepted:
+                self.errors += 1
+            for request_id in accepted:
+                self.submissions[request_id] = (started, finished)
+
+    def run(self, targets, rate, submitters):
+        """Submit one validation per target, `rate` per second, then wait for them all"""
+        with ThreadPoolExecutor(max_workers=submitters, thread_name_prefix='dnscheck-load') as pool:
+            started = time.monotonic()
+            for index, target in enumerate(targets):
+                wait = started + index / rate - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                pool.submit(self.submit, target)
+
+    def finish(self, timeout):
+        """Wait for the pipeline to drain and every status lookup to finish"""
+        self.pipeline.wait(timeout)
+        for _ in self._status_threads:
+            self._finished.put(None)
+        for thread in self._status_threads:
+            thread.join(timeout)
+
+    def report(self):
+        stages = {name: [] for name in STAGE_ORDER}
+        first_submit, last_final = None, None
+
+        for request_id, (started, finished) in self.submissions.items():
+            marks = self.marks.get(request_id, {})
+            stages['ingest'].append((finished - started) * 1000)
+            first_submit = started if first_submit is None else min(first_submit, started)
+
+            for stage, (start_events, end_events) in STAGES.items():
+                begin = [marks[name] for name in start_events if name in marks]
+                end = [marks[name] for name in end_events if name in marks]
+                if begin and end:
+                    stages[stage].append((max(end) - max(begin)) * 1000)
+
+            final = [marks[name] for name in FINAL_EVENTS if name in marks]
+            if final:
+                stages['endToEnd'].append((final[0] - started) * 1000)
+                last_final = final[0] if last_final is None else max(last_final, final[0])
+
+        stages['status'] = list(self.status_ms)
+        completed = len(stages['endToEnd'])
+        duration = (last_final - first_submit) if completed else 0.0
+        outcomes = list(self.outcomes.values())
+
+        return {
+            'validations': {
+                'submitted': len(self.submissions),
+                'rejected': self.errors,
+                'completed': completed,
+                'ok': outcomes.count('ok'),
+                'notOk': len(outcomes) - outcomes.count('ok'),
+                'incomplete': len(self.submissions) - completed
+            },
+            'throughput': {
+                'durationSeconds': round(duration, 3),
+                'completedPerSecond': round(completed / duration, 2) if duration else 0.0
+            },
+            'stages': {name: summarize(values) for name, values in stages.items()}
+        }
+
+
+def handler_durations(invocations):
+    """Handler-only durations per function, excluding any wait for delivery"""
+    by_function = {}
+    for invocation in invocations:
+        by_function.setdefault(invocation['function'], []).append(invocation['durationMs'])
+    return {function: summarize(values) for function, values in sorted(by_function.items())}
+
+
+def calls_per_validation(before, after, completed):
+    """AWS API calls made during the run, divided by completed validations"""
+    if not completed:
+        return {}
+    return {
+        operation: round((count - before.get(operation, 0)) / completed, 2)
+        for operation, count in sorted(after.items())
+        if count - before.get(operation, 0)
+    }
+
+
+def run(args):
+    names = [f't{index}.{DOMAIN}' for index in range(args.targets or args.count)]
+    targets = [names[index % len(names)] for index in range(args.count)]
+
+    with stand_ins(args) as env, contextlib.ExitStack() as stack:
+        if not args.verbose:
+            # Handlers log to stdout like they would to CloudWatch
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+
+        env.update(args.env)
+        pipeline = stack.enter_context(Pipeline(store=parse_store(args.store), env=env,
+                                                max_workers=args.concurrency))
+
+        # Load every handler and fill per-container caches before measuring
+        if args.warmup:
+            pipeline.validate([f'warmup{index}.{DOMAIN}' for index in range(args.warmup)], timeout=args.timeout)
+        pipeline.invocations.clear()
+        calls_before = pipeline.facade.call_counts()
+
+        load = LoadRun(pipeline, status_workers=args.status_workers)
+        load.run(targets, args.rate, args.submitters)
+        load.finish(args.timeout)
+
+        # Call counts include the GET /status made for every validation
+        result = load.report()
+        result['handlers'] = handler_durations(pipeline.invocations)
+        result['callsPerValidation'] = calls_per_validation(
+            calls_before, pipeline.facade.call_counts(), result['validations']['completed']
+        )
+
+    result['config'] = {
+        'rate': args.rate,
+        'count': args.count,
+        'targets': len(names),
+        'concurrency': args.concurrency,
+        'dnsLatencyMs': args.dns_latency_ms,
+        'httpLatencyMs': args.http_latency_ms,
+        'httpsLatencyMs': args.https_latency_ms,
+        'jitterMs': args.jitter_ms,
+        'store': args.store
+    }
+    return result
+
+
+def print_report(result):
+    validations, throughput = result['validations'], result['throughput']
+    print(f"validations  {validations['completed']}/{validations['submitted']} completed "
+          f"({validations['ok']} ok, {validations['notOk']} not ok, {validations['incomplete']} incomplete)")
+    print(f"throughput   {throughput['completedPerSecond']:.1f}/s over {throughput['durationSeconds']:.1f}s "
+          f"(offered {result['config']['rate']}/s)")
+
+    for title, rows in (('STAGE', result['stages']), ('HANDLER', result['handlers'])):
+        print()
+        print(f"{title:<14}  {'COUNT':>6}  {'P50':>9}  {'P95':>9}  {'P99':>9}  {'MAX':>9}")
+        for name, stats in rows.items():
+            if not stats['count']:
+                continue
+            print(f"{name:<14}  {stats['count']:>6}  " + '  '.join(
+                f"{stats[metric]:>7.1f}ms" for metric in ('p50', 'p95', 'p99', 'max')))
+
+    print()
+    print('calls per validation  ' + ', '.join(
+        f'{operation} {count:g}' for operation, count in result['callsPerValidation'].items()))
+
+
+def regressions(result, baseline, tolerance, slack_ms):
+    """Stages slower than baseline * (1 + tolerance) + slack_ms, lower throughput, more AWS calls"""
+    found = []
+
+    for stage, stats in result['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not before or not before.get('count') or not stats.get('count'):
+            continue
+        for metric in ('p95', 'p99'):
+            limit = before[metric] * (1 + tolerance) + slack_ms
+            if stats[metric] > limit:
+                found.append(f"{stage} {metric}: {stats[metric]:.1f}ms (baseline {before[metric]:.1f}ms)")
+
+    rate, before_rate = result['throughput']['completedPerSecond'], baseline.get('throughput', {}).get('completedPerSecond')
+    if before_rate and rate < before_rate * (1 - tolerance):
+        found.append(f"throughput: {rate:.1f}/s (baseline {before_rate:.1f}/s)")
+
+    before_calls = baseline.get('callsPerValidation', {})
+    for operation, count in result['callsPerValidation'].items():
+        if count > before_calls.get(operation, 0) + 0.01:
+            found.append(f"{operation} per validation: {count:g} (baseline {before_calls.get(operation, 0):g})")
+
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=20, help='validations submitted per second (default 20)')
+    parser.add_argument('--count', type=int, default=200, help='validations to submit (default 200)')
+    parser.add_argument('--targets', type=int, default=0,
+                        help='distinct hostnames, reused round-robin (default: one per validation)')
+    parser.add_argument('--concurrency', type=int, default=32, help='handler invocations running at once (default 32)')
+    parser.add_argument('--submitters', type=int, default=8, help='threads calling POST /check (default 8)')
+    parser.add_argument('--status-workers', type=int, default=4, help='threads calling GET /status (default 4)')
+    parser.add_argument('--warmup', type=int, default=5, help='validations run before measuring (default 5)')
+    parser.add_argument('--dns-latency-ms', type=float, default=0.0)
+    parser.add_argument('--http-latency-ms', type=float, default=0.0)
+    parser.add_argument('--https-latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='+/- added to every stand-in latency')
+    parser.add_argument('--dns-ttl', type=int, default=60, help='TTL of the stub DNS answers (default 60)')
+    parser.add_argument('--store', default='memory', help='memory (default) or sqlite:PATH')
+    parser.add_argument('--env', action='append', metavar='KEY=VALUE', help='extra handler environment')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for the pipeline to drain')
+    parser.add_argument('--verbose', action='store_true', help="show the handlers' log output")
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--save', metavar='FILE', help='write the results to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with an earlier --save and exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown (default 0.25)')
+    parser.add_argument('--slack-ms', type=float, default=5.0, help='allowed absolute slowdown (default 5ms)')
+    args = parser.parse_args()
+    args.env = parse_env(args.env)
+
+    result = run(args)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(result, indent=2) + '\n')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get('config') != result['config']:
+            print(f'Warning: {args.baseline} was run with a different configuration', file=sys.stderr)
+        found = regressions(result, baseline, args.tolerance, args.slack_ms)
+        for line in found:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if found else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -62,6 +62,25 @@ resource "aws_cloudwatch_dashboard" "main" {
           region = local.region
           title  = "DynamoDB Metrics"
         }
+      },
+      {
+        type   = "metric"
+        x      = 12
+        y      = 0
+        width  = 12
+        height = 6
+
+        properties = {
+          metrics = concat(
+            [[local.metrics_namespace, "EndToEndLatency", "Stage", "aggregate", { stat = "p99" }]],
+            [for stage in ["ingest", "dns", "http", "https", "aggregate", "status"] :
+              [local.metrics_namespace, "StageDuration", "Stage", stage, { stat = "p99" }]
+            ]
+          )
+          period = 300
+          region = local.region
+          title  = "Pipeline Latency (p99)"
+        }
       }
     ]
   })
@@ -87,3 +106,24 @@ resource "aws_cloudwatch_metric_alarm" "lambda_errors" {
 
   tags = local.tags
 }
+
+# p99 latency alarms on the handlers' EMF metrics (see dnscheck_common.metrics)
+resource "aws_cloudwatch_metric_alarm" "latency_p99" {
+  for_each            = var.latency_p99_thresholds_ms
+  alarm_name          = "${local.project_name}-${replace(each.key, "_", "-")}-p99"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = 3
+  metric_name         = each.key == "end_to_end" ? "EndToEndLatency" : "StageDuration"
+  namespace           = local.metrics_namespace
+  period              = 300
+  extended_statistic  = "p99"
+  threshold           = each.value
+  alarm_description   = "p99 latency of the ${each.key} stage is above ${each.value}ms"
+  treat_missing_data  = "notBreaching"
+
+  dimensions = {
+    Stage = each.key == "end_to_end" ? "aggregate" : each.key
+  }
+
+  tags = local.tags
+}
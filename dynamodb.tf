@@ -26,6 +26,21 @@ resource "aws_dynamodb_table" "validations" {
     type = "S"
   }
 
+  attribute {
+    name = "summaryTarget"
+    type = "S"
+  }
+
+  attribute {
+    name = "finishedAt"
+    type = "S"
+  }
+
+  attribute {
+    name = "summaryJob"
+    type = "S"
+  }
+
   # GSI: byTarget
   global_secondary_index {
     name            = "byTarget"
@@ -34,5 +49,81 @@ resource "aws_dynamodb_table" "validations" {
     projection_type = "ALL"
   }
 
+  # GSI: byTargetSummary (sparse, only SUMMARY items, or finished RESULT items, set summaryTarget)
+  global_secondary_index {
+    name               = "byTargetSummary"
+    hash_key           = "summaryTarget"
+    range_key          = "finishedAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["target", "startedAt", "overallStatus", "timedOut"]
+  }
+
+  # GSI: byJob (sparse, only SUMMARY/RESULT items of bulk job requests set summaryJob)
+  global_secondary_index {
+    name               = "byJob"
+    hash_key           = "summaryJob"
+    range_key          = "requestId"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["target", "overallStatus", "startedAt", "finishedAt"]
+  }
+
+  # Coalescing locks, rate limit buckets and RESULT items (storage_layout = single)
+  # expire on their own
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+
+  # Change stream feeding the history exporter (only when var.history_export is enabled)
+  stream_enabled   = var.history_export
+  stream_view_type = var.history_export ? "NEW_AND_OLD_IMAGES" : null
+
   tags = local.tags
 }
+
+# Only records that finish a validation invoke the exporter: a SUMMARY insert
+# (storage_layout = items) or the update that adds finishedAt to a RESULT item
+# (storage_layout = single)
+resource "aws_lambda_event_source_mapping" "history_exporter" {
+  count = var.history_export ? 1 : 0
+
+  event_source_arn                   = aws_dynamodb_table.validations.stream_arn
+  function_name                      = aws_lambda_function.history_exporter.arn
+  starting_position                  = "LATEST"
+  batch_size                         = var.history_batch_size
+  maximum_batching_window_in_seconds = var.history_batch_window
+  maximum_retry_attempts             = 10
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({
+        eventName = ["INSERT"]
+        dynamodb = {
+          NewImage = {
+            step = { S = ["SUMMARY"] }
+          }
+        }
+      })
+    }
+
+    filter {
+      pattern = jsonencode({
+        eventName = ["MODIFY"]
+        dynamodb = {
+          NewImage = {
+            step       = { S = ["RESULT"] }
+            finishedAt = { S = [{ exists = true }] }
+          }
+          OldImage = {
+            finishedAt = { S = [{ exists = false }] }
+          }
+        }
+      })
+    }
+  }
+
+  depends_on = [
+    aws_iam_role_policy.history_exporter_stream
+  ]
+}
@@ -64,7 +64,38 @@ resource "aws_cloudwatch_event_rule" "aggregator_events" {
 }
 
 resource "aws_cloudwatch_event_target" "aggregator" {
+  count = var.aggregator_batching ? 0 : 1
+
   rule           = aws_cloudwatch_event_rule.aggregator_events.name
   event_bus_name = aws_cloudwatch_event_bus.dns_checks.name
   arn            = aws_lambda_function.aggregator.arn
 }
+
+# Batch mode: result events are buffered in SQS and consumed by the aggregator
+# through an event source mapping (see sqs.tf)
+resource "aws_cloudwatch_event_target" "aggregator_queue" {
+  count = var.aggregator_batching ? 1 : 0
+
+  rule           = aws_cloudwatch_event_rule.aggregator_events.name
+  event_bus_name = aws_cloudwatch_event_bus.dns_checks.name
+  arn            = aws_sqs_queue.aggregator[0].arn
+}
+
+# Rule: bulk job chunks and drained jobs → triggers bulk-job
+resource "aws_cloudwatch_event_rule" "bulk_job" {
+  name           = "${local.project_name}-rule-bulk-job"
+  event_bus_name = aws_cloudwatch_event_bus.dns_checks.name
+  description    = "Trigger bulk job on BulkJobChunk and BulkJobDrained events"
+
+  event_pattern = jsonencode({
+    detail-type = ["BulkJobChunk", "BulkJobDrained"]
+  })
+
+  tags = local.tags
+}
+
+resource "aws_cloudwatch_event_target" "bulk_job" {
+  rule           = aws_cloudwatch_event_rule.bulk_job.name
+  event_bus_name = aws_cloudwatch_event_bus.dns_checks.name
+  arn            = aws_lambda_function.bulk_job.arn
+}
@@ -1,42 +1,28 @@
 import { useState } from 'react'
 import './App.css'
-import StatusDisplay from './components/StatusDisplay'
+import RequestStatus from './components/RequestStatus'
 import ValidationForm from './components/ValidationForm'
-import { usePolling } from './hooks/usePolling'
 
 // Get API endpoint from environment or use placeholder
 const API_ENDPOINT = import.meta.env.VITE_API_ENDPOINT || ''
 
+// How status updates are fetched: 'long-poll' (default), 'sse' or 'poll'
+const STATUS_MODE = import.meta.env.VITE_STATUS_MODE || 'long-poll'
+
 function App() {
-  const [requestId, setRequestId] = useState(null)
-  const [status, setStatus] = useState(null)
+  // One entry per submitted target ({ requestId, target, status } from POST /check)
+  const [requests, setRequests] = useState([])
+  const [completed, setCompleted] = useState(() => new Set())
   const [error, setError] = useState(null)
 
-  // Poll for status updates
-  usePolling(
-    () => {
-      if (!requestId || !API_ENDPOINT) {
-        return null
-      }
-      return `${API_ENDPOINT}/status?requestId=${requestId}`
-    },
-    (data) => {
-      if (data) {
-        setStatus(data)
-        // Stop polling if validation is complete
-        if (data?.summary?.overallStatus) {
-          return true // Signal to stop polling
-        }
-      }
-      return false
-    },
-    2000, // 2 second interval
-    [requestId] // Restart polling when requestId changes
-  )
+  const handleComplete = (requestId) => {
+    setCompleted((previous) => new Set(previous).add(requestId))
+  }
 
   const handleSubmit = async (target) => {
     setError(null)
-    setStatus(null)
+    setRequests([])
+    setCompleted(new Set())
 
     try {
       const response = await fetch(`${API_ENDPOINT}/check`, {
@@ -52,14 +38,23 @@ function App() {
         throw new Error(errorData.error || 'Failed to submit validation request')
       }
 
+      // Comma-separated targets get one entry each in `requests`
       const data = await response.json()
-      setRequestId(data.requestId)
+      const submitted = data.requests || [{ requestId: data.requestId, target: data.target }]
+      const failed = submitted.filter((request) => request.status === 'failed')
+
+      if (failed.length) {
+        setError(`Failed to submit ${failed.map((request) => request.target).join(', ')}`)
+      }
+      setRequests(submitted.filter((request) => request.status !== 'failed'))
     } catch (err) {
       setError(err.message)
-      setRequestId(null)
+      setRequests([])
     }
   }
 
+  const inProgress = requests.some((request) => !completed.has(request.requestId))
+
   return (
     <div className="app">
       <header className="app-header">
@@ -74,7 +69,7 @@ function App() {
           </div>
         )}
 
-        <ValidationForm onSubmit={handleSubmit} disabled={!!requestId && !status?.summary} />
+        <ValidationForm onSubmit={handleSubmit} disabled={inProgress} />
 
         {error && (
           <div className="error-message">
@@ -82,9 +77,15 @@ function App() {
           </div>
         )}
 
-        {requestId && (
-          <StatusDisplay status={status} requestId={requestId} />
-        )}
+        {requests.map((request) => (
+          <RequestStatus
+            key={request.requestId}
+            apiEndpoint={API_ENDPOINT}
+            requestId={request.requestId}
+            mode={STATUS_MODE}
+            onComplete={handleComplete}
+          />
+        ))}
       </main>
     </div>
   )
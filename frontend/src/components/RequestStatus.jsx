@@ -0,0 +1,36 @@
+import { useState } from 'react'
+import StatusDisplay from './StatusDisplay'
+import { usePolling } from '../hooks/usePolling'
+
+// Follows one requestId until its summary arrives
+function RequestStatus({ apiEndpoint, requestId, mode, onComplete }) {
+  const [status, setStatus] = useState(null)
+
+  usePolling(
+    () => {
+      if (!requestId || !apiEndpoint) {
+        return null
+      }
+      const path = mode === 'sse' ? '/status/stream' : '/status'
+      return `${apiEndpoint}${path}?requestId=${requestId}`
+    },
+    (data) => {
+      if (data) {
+        setStatus(data)
+        // Stop polling if validation is complete
+        if (data?.summary?.overallStatus) {
+          onComplete(requestId)
+          return true // Signal to stop polling
+        }
+      }
+      return false
+    },
+    2000, // 2 second interval (plain polling, and retries after errors)
+    [requestId], // Restart polling when requestId changes
+    { mode }
+  )
+
+  return <StatusDisplay status={status} requestId={requestId} />
+}
+
+export default RequestStatus
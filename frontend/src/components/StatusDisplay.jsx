@@ -112,7 +112,7 @@ function StatusDisplay({ status, requestId }) {
                   <div className="step-timings">
                     {Object.entries(step.timings).map(([key, value]) => (
                       <span key={key} className="timing">
-                        {key}: {value}ms
+                        {key}: {typeof value === 'number' ? `${value}ms` : String(value)}
                       </span>
                     ))}
                   </div>
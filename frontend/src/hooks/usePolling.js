@@ -1,10 +1,16 @@
 import { useEffect, useRef } from 'react'
 
-export function usePolling(getUrl, onData, interval = 2000, dependencies = []) {
+// mode: 'poll' (fixed interval), 'long-poll' (the API holds each request until
+// the status changes, up to `wait` seconds) or 'sse' (EventSource on a
+// text/event-stream URL)
+export function usePolling(getUrl, onData, interval = 2000, dependencies = [], options = {}) {
+  const { mode = 'poll', wait = 20 } = options
   const pollingRef = useRef(null)
   const shouldStopRef = useRef(false)
   const getUrlRef = useRef(getUrl)
   const onDataRef = useRef(onData)
+  // ETag of the last response per URL, sent back as If-None-Match
+  const etagRef = useRef({ url: null, etag: null })
 
   // Update refs when functions change
   useEffect(() => {
@@ -23,6 +29,8 @@ export function usePolling(getUrl, onData, interval = 2000, dependencies = []) {
     // Reset for new polling
     shouldStopRef.current = false
 
+    let eventSource = null
+
     const poll = async () => {
       if (shouldStopRef.current) {
         return
@@ -35,17 +43,54 @@ export function usePolling(getUrl, onData, interval = 2000, dependencies = []) {
         return
       }
 
+      if (mode === 'sse') {
+        // EventSource reconnects by itself (with Last-Event-ID) after each response
+        eventSource = new EventSource(url)
+        const handleEvent = (event) => {
+          const shouldStop = onDataRef.current(JSON.parse(event.data))
+          if (shouldStop) {
+            shouldStopRef.current = true
+            eventSource.close()
+          }
+        }
+        eventSource.addEventListener('status', handleEvent)
+        eventSource.addEventListener('complete', handleEvent)
+        eventSource.onerror = (error) => {
+          console.error('Event stream error:', error)
+        }
+        return
+      }
+
+      let delay = interval
+
       try {
-        const response = await fetch(url)
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`)
+        if (etagRef.current.url !== url) {
+          etagRef.current = { url, etag: null }
+        }
+        const headers = etagRef.current.etag ? { 'If-None-Match': etagRef.current.etag } : {}
+        const requestUrl = mode === 'long-poll' && etagRef.current.etag
+          ? `${url}${url.includes('?') ? '&' : '?'}wait=${wait}`
+          : url
+        const response = await fetch(requestUrl, { headers })
+
+        // 304: nothing changed since the last poll, keep the current data
+        if (response.status !== 304) {
+          if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`)
+          }
+          etagRef.current.etag = response.headers.get('ETag')
+          const data = await response.json()
+          const shouldStop = onDataRef.current(data)
+
+          if (shouldStop) {
+            shouldStopRef.current = true
+            return
+          }
         }
-        const data = await response.json()
-        const shouldStop = onDataRef.current(data)
 
-        if (shouldStop) {
-          shouldStopRef.current = true
-          return
+        // The server already waited for a change, ask again right away
+        if (mode === 'long-poll') {
+          delay = 0
         }
       } catch (error) {
         console.error('Polling error:', error)
@@ -53,7 +98,7 @@ export function usePolling(getUrl, onData, interval = 2000, dependencies = []) {
       }
 
       if (!shouldStopRef.current) {
-        pollingRef.current = setTimeout(poll, interval)
+        pollingRef.current = setTimeout(poll, delay)
       }
     }
 
@@ -64,7 +109,10 @@ export function usePolling(getUrl, onData, interval = 2000, dependencies = []) {
       if (pollingRef.current) {
         clearTimeout(pollingRef.current)
       }
+      if (eventSource) {
+        eventSource.close()
+      }
     }
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [interval, ...dependencies])
+  }, [interval, mode, wait, ...dependencies])
 }
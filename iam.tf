@@ -43,6 +43,20 @@ resource "aws_iam_role_policy" "api_ingest" {
         ]
         Resource = aws_cloudwatch_event_bus.dns_checks.arn
       },
+      {
+        Sid    = "DynamoDBAccess"
+        Effect = "Allow"
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:GetItem",
+          "dynamodb:DeleteItem",
+          "dynamodb:Query"
+        ]
+        Resource = [
+          aws_dynamodb_table.validations.arn,
+          "${aws_dynamodb_table.validations.arn}/index/*"
+        ]
+      },
     ]
   })
 }
@@ -137,6 +151,15 @@ resource "aws_iam_role_policy" "http_prober" {
         ]
         Resource = aws_cloudwatch_event_bus.dns_checks.arn
       },
+      {
+        Sid    = "DynamoDBRateLimits"
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ]
+        Resource = aws_dynamodb_table.validations.arn
+      },
     ]
   })
 }
@@ -184,6 +207,15 @@ resource "aws_iam_role_policy" "https_prober" {
         ]
         Resource = aws_cloudwatch_event_bus.dns_checks.arn
       },
+      {
+        Sid    = "DynamoDBRateLimits"
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ]
+        Resource = aws_dynamodb_table.validations.arn
+      },
     ]
   })
 }
@@ -236,7 +268,9 @@ resource "aws_iam_role_policy" "aggregator" {
         Effect = "Allow"
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
           "dynamodb:GetItem",
           "dynamodb:Query"
         ]
@@ -249,6 +283,29 @@ resource "aws_iam_role_policy" "aggregator" {
   })
 }
 
+resource "aws_iam_role_policy" "aggregator_sqs" {
+  count = var.aggregator_batching ? 1 : 0
+
+  name = "${local.project_name}-aggregator-sqs-policy"
+  role = aws_iam_role.aggregator.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "SQSConsume"
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.aggregator[0].arn
+      }
+    ]
+  })
+}
+
 # Status API Lambda Role
 resource "aws_iam_role" "status_api" {
   name = "${local.project_name}-status-api-role"
@@ -289,12 +346,178 @@ resource "aws_iam_role_policy" "status_api" {
         Effect = "Allow"
         Action = [
           "dynamodb:Query",
-          "dynamodb:GetItem"
+          "dynamodb:GetItem",
+          "dynamodb:BatchGetItem"
+        ]
+        Resource = [
+          aws_dynamodb_table.validations.arn,
+          "${aws_dynamodb_table.validations.arn}/index/*"
+        ]
+      }
+    ]
+  })
+}
+
+# Bulk Job Lambda Role
+resource "aws_iam_role" "bulk_job" {
+  name = "${local.project_name}-bulk-job-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Effect = "Allow"
+      Principal = {
+        Service = "lambda.amazonaws.com"
+      }
+      Action = "sts:AssumeRole"
+    }]
+  })
+
+  tags = local.tags
+}
+
+resource "aws_iam_role_policy" "bulk_job" {
+  name = "${local.project_name}-bulk-job-policy"
+  role = aws_iam_role.bulk_job.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "CloudWatchLogsAccess"
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:${local.region}:*:*"
+      },
+      {
+        Sid    = "EventBridgePutEvents"
+        Effect = "Allow"
+        Action = [
+          "events:PutEvents"
+        ]
+        Resource = aws_cloudwatch_event_bus.dns_checks.arn
+      },
+      {
+        Sid    = "DynamoDBAccess"
+        Effect = "Allow"
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:GetItem",
+          "dynamodb:Query"
         ]
         Resource = [
           aws_dynamodb_table.validations.arn,
           "${aws_dynamodb_table.validations.arn}/index/*"
         ]
+      },
+      {
+        Sid    = "S3ReadInputs"
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject"
+        ]
+        Resource = "${aws_s3_bucket.jobs.arn}/*"
+      },
+      {
+        # Without it S3 answers 403 instead of 404 for a missing input key
+        Sid    = "S3ListInputs"
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = aws_s3_bucket.jobs.arn
+      },
+      {
+        Sid    = "S3WriteResults"
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject"
+        ]
+        Resource = "${aws_s3_bucket.jobs.arn}/results/*"
+      }
+    ]
+  })
+}
+
+# History Exporter Lambda Role
+resource "aws_iam_role" "history_exporter" {
+  name = "${local.project_name}-history-exporter-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Effect = "Allow"
+      Principal = {
+        Service = "lambda.amazonaws.com"
+      }
+      Action = "sts:AssumeRole"
+    }]
+  })
+
+  tags = local.tags
+}
+
+resource "aws_iam_role_policy" "history_exporter" {
+  name = "${local.project_name}-history-exporter-policy"
+  role = aws_iam_role.history_exporter.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "CloudWatchLogsAccess"
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:${local.region}:*:*"
+      },
+      {
+        Sid    = "DynamoDBReadSteps"
+        Effect = "Allow"
+        Action = [
+          "dynamodb:Query"
+        ]
+        Resource = aws_dynamodb_table.validations.arn
+      },
+      {
+        Sid    = "S3WriteHistory"
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject"
+        ]
+        Resource = "${aws_s3_bucket.history.arn}/history/*"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "history_exporter_stream" {
+  count = var.history_export ? 1 : 0
+
+  name = "${local.project_name}-history-exporter-stream-policy"
+  role = aws_iam_role.history_exporter.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "DynamoDBStreamConsume"
+        Effect = "Allow"
+        Action = [
+          "dynamodb:DescribeStream",
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:ListStreams"
+        ]
+        Resource = aws_dynamodb_table.validations.stream_arn
       }
     ]
   })
@@ -338,3 +561,24 @@ resource "aws_iam_role_policy" "ip_authorizer" {
     ]
   })
 }
+
+resource "aws_iam_role_policy" "ip_authorizer_ssm" {
+  count = var.allowed_ips_parameter != "" ? 1 : 0
+
+  name = "${local.project_name}-ip-authorizer-ssm-policy"
+  role = aws_iam_role.ip_authorizer.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "SSMAllowlistRead"
+        Effect = "Allow"
+        Action = [
+          "ssm:GetParameter"
+        ]
+        Resource = "arn:aws:ssm:${local.region}:${data.aws_caller_identity.current.account_id}:parameter/${trimprefix(var.allowed_ips_parameter, "/")}"
+      }
+    ]
+  })
+}
@@ -1,136 +1,608 @@
 import json
 import os
-import boto3
+import time
+from botocore.exceptions import ClientError
 from datetime import datetime
 
-eventbridge = boto3.client('events')
-dynamodb = boto3.resource('dynamodb')
+# Shared layer: tuned client pool, event emission with retries, EMF metrics
+from dnscheck_common import clients, events, locks, metrics, results
 
-def lambda_handler(event, context):
-    """Aggregates all validation events, writes to DynamoDB, and emits final status"""
+# stepsSeen entries are "<step>|<status>|<timestamp>"
+PROGRESS_SEPARATOR = '|'
 
-    try:
-        # Parse EventBridge event
-        # Handle both string and dict formats
-        if isinstance(event.get('detail'), str):
-            detail = json.loads(event['detail'])
-        else:
-            detail = event.get('detail', {})
-
-        request_id = detail.get('requestId', '')
-        detail_type = event.get('detail-type', '')
-        target = detail.get('target', '')
-
-        table_name = os.environ.get('DYNAMODB_TABLE', 'dnscheck-validations')
-        table = dynamodb.Table(table_name)
-
-        # Write step result to DynamoDB
-        step_name = detail_type.lower()
-        status = detail.get('status', 'unknown')
-        reason = detail.get('reason', '')
-        timings = detail.get('timings', {})
-        timestamp = detail.get('timestamp', datetime.utcnow().isoformat() + 'Z')
-
-        # Store step item
-        table.put_item(
-            Item={
-                'requestId': request_id,
-                'step': step_name,
-                'status': status,
-                'reason': reason,
-                'timings': timings,
-                'ts': timestamp,
-                'target': target,
-                'time': timestamp
-            }
-        )
+# Requests per TransactWriteItems counting job results (plus the JOB item: 100 items)
+JOB_TRANSACTION_SIZE = 99
+
+
+class CompletionError(Exception):
+    """A finalized request whose final event, lock release or job count did not go through"""
+
+
+def parse_steps_seen(steps_seen):
+    """Map step name -> {status, ts} from the PROGRESS item's stepsSeen set"""
+    steps = {}
+    for entry in steps_seen:
+        step_name, status, ts = entry.split(PROGRESS_SEPARATOR, 2)
+        steps[step_name] = {'status': status, 'ts': ts}
+    return steps
+
+
+def build_step_item(detail_type, detail):
+    """DynamoDB item for one result event"""
+    timestamp = detail.get('timestamp', datetime.utcnow().isoformat() + 'Z')
+
+    step_item = {
+        'requestId': detail.get('requestId', ''),
+        'step': detail_type.lower(),
+        'status': detail.get('status', 'unknown'),
+        'reason': detail.get('reason', ''),
+        'timings': results.to_dynamodb(detail.get('timings', {})),
+        'ts': timestamp,
+        'target': detail.get('target', ''),
+        'time': timestamp
+    }
+
+    # When ingest accepted the request; startedAt of the SUMMARY
+    if detail.get('requestedAt'):
+        step_item['requestedAt'] = detail['requestedAt']
+
+    # Bulk job the request belongs to; SUMMARY is indexed by it
+    if detail.get('jobId'):
+        step_item['jobId'] = detail['jobId']
 
-        # Check if we have all required events
-        # Query for all steps for this request
-        response = table.query(
-            KeyConditionExpression='requestId = :rid',
-            ExpressionAttributeValues={
-                ':rid': request_id
+    # Coalescing lock ingest took for the request's target
+    if detail.get('lockKey'):
+        step_item['lockKey'] = detail['lockKey']
+
+    # Probes that went ahead without their rate limit tokens, so a failure
+    # may be the server's rate limiting rather than the target
+    if detail.get('rateLimited'):
+        step_item['rateLimited'] = True
+
+    # Per-IP probe results from the HTTP/HTTPS probers
+    if detail.get('results'):
+        step_item['results'] = results.to_dynamodb(detail['results'])
+
+    return step_item
+
+
+def record_progress(table, request_id, step_items):
+    """Add steps to the request's PROGRESS item and return every step seen so far
+
+    One atomic update instead of reading every step back. stepsSeen is a
+    string set, so ADD-ing the same step twice (EventBridge or SQS
+    redelivery) leaves it unchanged.
+    """
+    progress = table.update_item(
+        Key={
+            'requestId': request_id,
+            'step': 'PROGRESS'
+        },
+        UpdateExpression='ADD stepsSeen :steps',
+        ExpressionAttributeValues={
+            ':steps': {
+                PROGRESS_SEPARATOR.join([item['step'], item['status'], item['ts']])
+                for item in step_items
             }
+        },
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+
+    return parse_steps_seen(progress.get('stepsSeen', set()))
+
+
+def record_result(table, request_id, step_items):
+    """Merge steps into the request's RESULT item and return every step seen so far
+
+    The single storage layout: one UpdateItem SETs each step's map attribute
+    and ADDs it to stepsSeen like record_progress(), so a request costs one
+    write per step instead of a put and an update.
+    """
+    # A step delivered twice in one batch is set once (overlapping paths are rejected)
+    attributes = {
+        results.step_attribute(step_item['step']): {
+            key: value for key, value in step_item.items()
+            if key not in ('requestId', 'step', 'time') + results.REQUEST_ATTRIBUTES
+        }
+        for step_item in step_items
+    }
+    attributes.update(
+        (key, step_items[0][key]) for key in results.REQUEST_ATTRIBUTES if step_items[0].get(key)
+    )
+
+    expires_at = results.expires_at(time.time())
+    if expires_at:
+        attributes['expiresAt'] = expires_at
+
+    values = {f':v{i}': value for i, value in enumerate(attributes.values())}
+    values[':steps'] = {
+        PROGRESS_SEPARATOR.join([item['step'], item['status'], item['ts']])
+        for item in step_items
+    }
+
+    result = table.update_item(
+        Key={
+            'requestId': request_id,
+            'step': results.RESULT_STEP
+        },
+        UpdateExpression='SET ' + ', '.join(f'#a{i} = :v{i}' for i in range(len(attributes))) + ' ADD stepsSeen :steps',
+        ExpressionAttributeNames={f'#a{i}': name for i, name in enumerate(attributes)},
+        ExpressionAttributeValues=values,
+        ReturnValues='UPDATED_NEW'
+    )['Attributes']
+
+    return parse_steps_seen(result.get('stepsSeen', set()))
+
+
+def store_steps(table, request_id, step_items):
+    """Record steps in the STORAGE_LAYOUT in use and return every step seen so far
+
+    In the items layout the step items must already have been written.
+    """
+    if results.layout() == results.SINGLE:
+        return record_result(table, request_id, step_items)
+    return record_progress(table, request_id, step_items)
+
+
+def is_complete(steps):
+    """DNSResolved or DNSFailed, plus HTTPChecked and HTTPSChecked unless DNS failed"""
+    dns_complete = 'dnsresolved' in steps or 'dnsfailed' in steps
+    dns_failed = 'dnsfailed' in steps
+
+    http_complete = 'httpchecked' in steps
+    https_complete = 'httpschecked' in steps
+
+    # If DNS failed, HTTP/HTTPS won't run, so we're done
+    # Otherwise, we need all three steps
+    return dns_complete and (dns_failed or (http_complete and https_complete))
+
+
+def timed_out(steps):
+    """Whether a stage ran out of the request's end-to-end deadline"""
+    return any(step['status'] == 'timeout' for step in steps.values())
+
+
+def overall_status_for(steps):
+    if steps.get('dnsfailed', {}).get('status') in ('fail', 'timeout'):
+        return 'fail'
+    if any(steps.get(s, {}).get('status') in ('fail', 'timeout') for s in ['httpchecked', 'httpschecked']):
+        return 'fail'
+    if any(steps.get(s, {}).get('status') == 'warn' for s in ['httpchecked', 'httpschecked']):
+        return 'warn'
+    return 'ok'
+
+
+def parse_timestamp(value):
+    """datetime from the ISO 8601 'Z' timestamps in events"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def store_summary(table, summary_item):
+    """Write the summary once; raises ConditionalCheckFailedException if it exists
+
+    The summary is written with completionPending (when, in epoch seconds),
+    which complete() removes once the request's final event, lock release
+    and job count went through.
+    In the single storage layout the summary attributes go onto the RESULT
+    item, without ts/time (the item stays out of the byTarget index).
+    """
+    if results.layout() != results.SINGLE:
+        table.put_item(
+            Item=dict(summary_item, **{results.COMPLETION_PENDING: int(time.time())}),
+            ConditionExpression='attribute_not_exists(requestId)'
         )
+        return
 
-        steps = {item['step']: item for item in response['Items']}
+    attributes = {key: summary_item[key] for key in results.SUMMARY_ATTRIBUTES if key in summary_item}
+    attributes[results.COMPLETION_PENDING] = int(time.time())
+    table.update_item(
+        Key={
+            'requestId': summary_item['requestId'],
+            'step': results.RESULT_STEP
+        },
+        UpdateExpression='SET ' + ', '.join(f'#a{i} = :v{i}' for i in range(len(attributes))),
+        ConditionExpression='attribute_not_exists(finishedAt)',
+        ExpressionAttributeNames={f'#a{i}': name for i, name in enumerate(attributes)},
+        ExpressionAttributeValues={f':v{i}': value for i, value in enumerate(attributes.values())}
+    )
 
-        # Determine if validation is complete
-        # We need: DNSResolved or DNSFailed, HTTPChecked, HTTPSChecked
-        dns_complete = 'dnsresolved' in steps or 'dnsfailed' in steps
-        dns_failed = 'dnsfailed' in steps
 
-        http_complete = 'httpchecked' in steps
-        https_complete = 'httpschecked' in steps
+def final_entry(summary):
+    """ValidationCompleted/ValidationFailed entry of a summary as store_summary() writes it"""
+    if summary['overallStatus'] == 'ok':
+        event_type = 'ValidationCompleted'
+    else:
+        event_type = 'ValidationFailed'
 
-        # If DNS failed, HTTP/HTTPS won't run, so we're done
-        # Otherwise, we need all three steps
-        all_complete = dns_complete and (dns_failed or (http_complete and https_complete))
+    final_detail = {
+        'requestId': summary['requestId'],
+        'target': summary['target'],
+        'status': summary['overallStatus'],
+        'startedAt': summary['startedAt'],
+        'finishedAt': summary['finishedAt'],
+        'timestamp': summary['finishedAt']
+    }
 
-        if all_complete:
-            # Determine overall status
-            overall_status = 'ok'
-            if steps.get('dnsfailed', {}).get('status') == 'fail':
-                overall_status = 'fail'
-            elif any(steps.get(s, {}).get('status') == 'fail' for s in ['httpchecked', 'httpschecked']):
-                overall_status = 'fail'
-            elif any(steps.get(s, {}).get('status') == 'warn' for s in ['httpchecked', 'httpschecked']):
-                overall_status = 'warn'
-
-            # Get start and end times
-            timestamps = [item.get('ts', '') for item in steps.values() if item.get('ts')]
-            started_at = min(timestamps) if timestamps else timestamp
-            finished_at = timestamp
-
-            # Store summary
-            table.put_item(
-                Item={
-                    'requestId': request_id,
-                    'step': 'SUMMARY',
-                    'target': target,
-                    'startedAt': started_at,
-                    'finishedAt': finished_at,
-                    'overallStatus': overall_status,
-                    'ts': finished_at,
-                    'time': finished_at
-                }
+    if summary.get('summaryJob'):
+        final_detail['jobId'] = summary['summaryJob']
+
+    if summary.get('timedOut'):
+        final_detail['timedOut'] = True
+
+    return events.entry('dnscheck.aggregator', event_type, final_detail)
+
+
+def pending_completion(table, request_id):
+    """Final event entry of a request finalized earlier whose completion never went through, else None
+
+    A completion pending for less than COMPLETION_GRACE seconds (default 30,
+    the aggregator's timeout) may still be running in the invocation that
+    finalized the request, as when its HTTP and HTTPS steps arrive at once,
+    so it is left to that invocation. Failed completions come back later:
+    Lambda retries an event after a minute, SQS after the visibility timeout.
+    """
+    summary = table.get_item(Key=results.summary_key(request_id), ConsistentRead=True).get('Item')
+    if not summary or results.COMPLETION_PENDING not in summary:
+        return None
+
+    grace = float(os.environ.get('COMPLETION_GRACE', '30'))
+    if time.time() - float(summary[results.COMPLETION_PENDING]) < grace:
+        return None
+
+    print(f"Request {request_id} finalized earlier without completing, completing it now")
+    metrics.current().count('CompletionsResumed')
+    return final_entry(summary)
+
+
+def finalize(table, request_id, target, steps, requested_at=None, job_id=None):
+    """Write the SUMMARY item and return the final event entry
+
+    Only the invocation that creates SUMMARY finalizes, so concurrent last
+    steps or redeliveries produce one final event. Returns None if the
+    request was already finalized, unless completing it failed back then:
+    the redelivery then returns the final event again, for complete() to
+    finish the job.
+
+    startedAt is when ingest accepted the request (older events without
+    requestedAt fall back to the first step), so finishedAt - startedAt is
+    the request's whole time in the pipeline and is emitted as the
+    EndToEndLatency metric.
+
+    Requests of a bulk job also set summaryJob, the key of the sparse byJob
+    index the job's results file is read from.
+    """
+    overall_status = overall_status_for(steps)
+
+    # Get start and end times
+    timestamps = [item['ts'] for item in steps.values() if item['ts']]
+    started_at = requested_at or (min(timestamps) if timestamps else datetime.utcnow().isoformat() + 'Z')
+    finished_at = max(timestamps) if timestamps else started_at
+
+    summary_item = {
+        'requestId': request_id,
+        'step': 'SUMMARY',
+        'target': target,
+        'startedAt': started_at,
+        'finishedAt': finished_at,
+        'overallStatus': overall_status,
+        'ts': finished_at,
+        'time': finished_at,
+        # Key of the sparse byTargetSummary index (only SUMMARY items carry it)
+        'summaryTarget': target
+    }
+
+    if job_id:
+        summary_item['summaryJob'] = job_id
+
+    # A timeout fails the request, but it says nothing about the target
+    if timed_out(steps):
+        summary_item['timedOut'] = True
+
+    try:
+        store_summary(table, summary_item)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"Request {request_id} already finalized")
+        return pending_completion(table, request_id)
+
+    invocation = metrics.current()
+    invocation.count('Finalized')
+    invocation.add('EndToEndLatency', round(
+        (parse_timestamp(finished_at) - parse_timestamp(started_at)).total_seconds() * 1000, 2
+    ))
+
+    return final_entry(summary_item)
+
+
+def release_lock(table, step_item):
+    """Let new requests for the target start a validation again"""
+    if step_item.get('lockKey'):
+        try:
+            locks.release(table, step_item['lockKey'], step_item['requestId'])
+        except Exception as e:
+            # The lock still expires on its own
+            print(f"Error releasing {step_item['lockKey']}: {str(e)}")
+
+
+def complete(table, final_events, step_items):
+    """Emit the final events, release the targets' locks and count bulk job results
+
+    step_items maps each requestId to one of its step items, which carries
+    the lock key. A request whose event went out has completionPending
+    removed from its summary, together with its job count for requests of
+    a bulk job. Returns the requestIds that did not get that far; their
+    messages are redelivered and finalize() hands their final event back.
+    """
+    if not final_events:
+        return set()
+
+    failed = {json.loads(entry['Detail'])['requestId'] for entry in events.put_events(final_events)}
+    if failed:
+        print(f"Failed to emit {len(failed)} final event(s)")
+
+    jobs = {}
+    for entry in final_events:
+        detail = json.loads(entry['Detail'])
+        if detail['requestId'] in failed:
+            continue
+
+        release_lock(table, step_items[detail['requestId']])
+
+        if detail.get('jobId'):
+            jobs.setdefault(detail['jobId'], []).append(detail)
+            continue
+
+        try:
+            table.update_item(
+                Key=results.summary_key(detail['requestId']),
+                UpdateExpression='REMOVE #pending',
+                ExpressionAttributeNames={'#pending': results.COMPLETION_PENDING}
             )
+        except Exception as e:
+            print(f"Error completing {detail['requestId']}: {str(e)}")
+            failed.add(detail['requestId'])
+
+    for job_id, details in jobs.items():
+        failed |= record_job_results(table, job_id, details)
+
+    return failed
+
+
+def job_transaction(table_name, job_id, details):
+    """TransactWriteItems items adding details to the job's counters and completing each request"""
+    counts = {'ok': 0, 'warn': 0, 'fail': 0}
+    for detail in details:
+        counts[detail['status']] = counts.get(detail['status'], 0) + 1
+
+    items = [{
+        'Update': {
+            'TableName': table_name,
+            'Key': results.serialize_item({'requestId': job_id, 'step': 'JOB'}),
+            'UpdateExpression': 'ADD completed :completed, resultsOk :ok, resultsWarn :warn, resultsFail :fail',
+            'ConditionExpression': 'attribute_exists(requestId)',
+            'ExpressionAttributeValues': results.serialize_item({
+                ':completed': sum(counts.values()),
+                ':ok': counts['ok'],
+                ':warn': counts['warn'],
+                ':fail': counts['fail']
+            })
+        }
+    }]
+
+    for detail in details:
+        items.append({
+            'Update': {
+                'TableName': table_name,
+                'Key': results.serialize_item(results.summary_key(detail['requestId'])),
+                'UpdateExpression': 'REMOVE #pending',
+                'ConditionExpression': 'attribute_exists(#pending)',
+                'ExpressionAttributeNames': {'#pending': results.COMPLETION_PENDING}
+            }
+        })
+
+    return items
+
+
+def cancellation_codes(error):
+    """Per-item cancellation reason codes of a TransactionCanceledException, or None for other errors"""
+    if not isinstance(error, ClientError) or error.response['Error']['Code'] != 'TransactionCanceledException':
+        return None
+    return [reason.get('Code', 'None') for reason in error.response.get('CancellationReasons', [])]
+
+
+def record_job_results(table, job_id, details):
+    """Count finalized requests on their bulk job's JOB item, exactly once
+
+    Each request's count goes in one transaction with the removal of its
+    completionPending, conditional on it still being there, so a request
+    completed again (a redelivery after a failure, or two invocations
+    finalizing it at once) is never counted twice. Up to
+    JOB_TRANSACTION_SIZE requests share a transaction; when one of them
+    cancels it, they are retried one by one. Whoever sees the job's last
+    result after the input was fully read (here or in the bulk job's chunk
+    reader) emits BulkJobDrained, which writes the results file.
+
+    Returns the requestIds that could not be counted.
+    """
+    dynamodb = metrics.TimedCalls(clients.client('dynamodb'), 'DynamoDBLatency')
+    failed = set()
+    counted = 0
+
+    def transact(chunk):
+        dynamodb.transact_write_items(TransactItems=job_transaction(table.name, job_id, chunk))
+
+    for i in range(0, len(details), JOB_TRANSACTION_SIZE):
+        chunk = details[i:i + JOB_TRANSACTION_SIZE]
+        if len(chunk) > 1:
+            try:
+                transact(chunk)
+                counted += len(chunk)
+                continue
+            except Exception as e:
+                if cancellation_codes(e) is None:
+                    print(f"Error recording results of job {job_id}: {str(e)}")
+                    failed.update(detail['requestId'] for detail in chunk)
+                    continue
+
+        for detail in chunk:
+            try:
+                transact([detail])
+                counted += 1
+            except Exception as e:
+                codes = cancellation_codes(e) or []
+                if codes[1:] == ['ConditionalCheckFailed']:
+                    # Completed (and counted) before, by this request's first delivery or another invocation
+                    continue
+                if codes[:1] == ['ConditionalCheckFailed']:
+                    print(f"Job {job_id} no longer exists, not counting {detail['requestId']}")
+                    continue
+                print(f"Error recording result of {detail['requestId']} on job {job_id}: {str(e)}")
+                failed.add(detail['requestId'])
 
-            # Emit final event
-            eventbus_name = os.environ.get('EVENTBUS_NAME', 'dns-checks')
-
-            if overall_status == 'ok':
-                event_type = 'ValidationCompleted'
-            else:
-                event_type = 'ValidationFailed'
-
-            eventbridge.put_events(
-                Entries=[{
-                    'Source': 'dnscheck.aggregator',
-                    'DetailType': event_type,
-                    'Detail': json.dumps({
-                        'requestId': request_id,
-                        'target': target,
-                        'status': overall_status,
-                        'startedAt': started_at,
-                        'finishedAt': finished_at,
-                        'timestamp': finished_at
-                    }),
-                    'EventBusName': eventbus_name
-                }]
+    if not counted:
+        return failed
+
+    job = table.get_item(Key={'requestId': job_id, 'step': 'JOB'}, ConsistentRead=True).get('Item') or {}
+    if job.get('readDone') and job.get('completed', 0) >= job.get('totalRequests', 0):
+        if events.put_events([events.entry('dnscheck.aggregator', 'BulkJobDrained', {'jobId': job_id})]):
+            print(f"Failed to emit BulkJobDrained for job {job_id}")
+
+    return failed
+
+
+def handle_sqs_batch(records, table):
+    """Aggregate a batch of result events delivered through SQS
+
+    Steps are grouped by requestId: every step item is written through one
+    BatchWriteItem stream, each request gets a single PROGRESS update, and the
+    final events for all requests completed by this batch go out together.
+    In the single storage layout the one RESULT update per request replaces
+    both the step items and the PROGRESS update.
+    Messages of a request that could not be processed are reported back as
+    batchItemFailures so only they are retried.
+    """
+    failures = []
+    groups = {}
+
+    for record in records:
+        try:
+            # The SQS body is the EventBridge event, detail included as an object
+            event = json.loads(record['body'])
+            detail = events.parse_detail(event)
+            step_item = build_step_item(event.get('detail-type', ''), detail)
+        except Exception as e:
+            print(f"Error parsing message {record.get('messageId')}: {str(e)}")
+            failures.append(record['messageId'])
+            continue
+
+        groups.setdefault(step_item['requestId'], []).append((record['messageId'], step_item))
+
+    # Store step items; overwrite_by_pkeys drops duplicates within the batch.
+    # The single layout writes them with each request's RESULT update instead.
+    try:
+        if results.layout() != results.SINGLE:
+            with table.batch_writer(overwrite_by_pkeys=['requestId', 'step']) as batch:
+                for messages in groups.values():
+                    for _, step_item in messages:
+                        batch.put_item(Item=step_item)
+    except Exception as e:
+        print(f"Error writing step items: {str(e)}")
+        return {
+            'batchItemFailures': [{'itemIdentifier': record['messageId']} for record in records]
+        }
+
+    final_events = []
+    lock_holders = {}
+    completed = 0
+
+    for request_id, messages in groups.items():
+        try:
+            step_items = [step_item for _, step_item in messages]
+            steps = store_steps(table, request_id, step_items)
+
+            if is_complete(steps):
+                completed += 1
+                final_event = finalize(
+                    table, request_id, step_items[0]['target'], steps,
+                    step_items[0].get('requestedAt'), step_items[0].get('jobId')
+                )
+                if final_event:
+                    final_events.append(final_event)
+                    lock_holders[request_id] = step_items[0]
+        except Exception as e:
+            print(f"Error aggregating {request_id}: {str(e)}")
+            failures.extend(message_id for message_id, _ in messages)
+
+    # Requests whose completion failed are redelivered with all their messages
+    for request_id in complete(table, final_events, lock_holders):
+        failures.extend(message_id for message_id, _ in groups[request_id])
+
+    invocation = metrics.current()
+    invocation.count('Messages', len(records))
+    invocation.count('MessagesFailed', len(failures))
+    invocation.count('Requests', len(groups))
+    invocation.count('RequestsCompleted', completed)
+    invocation.count('RequestsFinalized', len(final_events))
+    invocation.set_status('partial' if failures else 'ok')
+
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]
+    }
+
+
+@metrics.instrumented('aggregate')
+def lambda_handler(event, context):
+    """Aggregates all validation events, writes to DynamoDB, and emits final status"""
+
+    table_name = os.environ.get('DYNAMODB_TABLE', 'dnscheck-validations')
+    table = metrics.TimedCalls(clients.resource('dynamodb').Table(table_name), 'DynamoDBLatency')
+
+    # SQS batch mode (aggregator_batching = true): no try/except around the
+    # whole batch, failures are reported per message
+    if 'Records' in event:
+        return handle_sqs_batch(event['Records'], table)
+
+    try:
+        # Parse EventBridge event
+        detail = events.parse_detail(event)
+
+        # Store step item (idempotent: a redelivered event rewrites the same item)
+        step_item = build_step_item(event.get('detail-type', ''), detail)
+        if results.layout() != results.SINGLE:
+            table.put_item(Item=step_item)
+
+        request_id = step_item['requestId']
+        steps = store_steps(table, request_id, [step_item])
+
+        all_complete = is_complete(steps)
+        finalized = False
+        metrics.current().set_status('complete' if all_complete else 'pending')
+
+        if all_complete:
+            final_event = finalize(
+                table, request_id, step_item['target'], steps,
+                step_item.get('requestedAt'), step_item.get('jobId')
             )
+            if final_event:
+                if complete(table, [final_event], {request_id: step_item}):
+                    raise CompletionError(f"Completing {request_id} failed")
+                finalized = True
 
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'requestId': request_id,
-                'step': step_name,
-                'status': status,
-                'allComplete': all_complete
+                'step': step_item['step'],
+                'status': step_item['status'],
+                'allComplete': all_complete,
+                'finalized': finalized
             })
         }
 
+    except CompletionError:
+        # Raised so Lambda retries the event; finalize() then resumes the completion
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
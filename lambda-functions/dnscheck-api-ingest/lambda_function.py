@@ -1,13 +1,106 @@
 import json
+import math
 import os
 import uuid
-import boto3
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-eventbridge = boto3.client('events')
+# Shared layer: tuned client pool, event emission with retries, EMF metrics
+from dnscheck_common import clients, deadlines, events, jsonfast, locks, metrics
+from dnscheck_common.targets import normalize_target
 
+# Parallel lock/summary lookups when a request has many targets
+CLAIM_MAX_WORKERS = 16
+
+# SUMMARY items read per page when looking for a result to reuse (maxAge)
+RECENT_SUMMARIES = 5
+
+
+def parse_targets(body):
+    """Return the raw target strings from the request body.
+
+    Supports the original comma-separated ``target`` string as well as a
+    ``targets`` list for callers submitting many hosts at once. Items of
+    ``targets`` that aren't strings are returned as they are, to be
+    reported as invalid rather than coerced into hostnames.
+    """
+    raw_targets = []
+
+    targets = body.get('targets')
+    if isinstance(targets, list):
+        raw_targets.extend(targets)
+    elif isinstance(targets, str):
+        raw_targets.extend(targets.split(','))
+
+    target = body.get('target', '')
+    if isinstance(target, str):
+        raw_targets.extend(target.split(','))
+
+    return [t for t in raw_targets if not isinstance(t, str) or t.strip()]
+
+
+def get_table():
+    table_name = os.environ.get('DYNAMODB_TABLE', 'dnscheck-validations')
+    return metrics.TimedCalls(clients.resource('dynamodb').Table(table_name), 'DynamoDBLatency')
+
+
+def find_recent_summary(table, target, max_age):
+    """Newest SUMMARY of target finished in the last max_age seconds, or None
+
+    Requests that ran out of their deadline are skipped: they say nothing
+    about the target. Limit applies before the filter, so pages of a few
+    summaries are read, newest first, until one passes the filter or the
+    window runs out.
+    """
+    since = (datetime.utcnow() - timedelta(seconds=max_age)).isoformat() + 'Z'
+    kwargs = {
+        'IndexName': 'byTargetSummary',
+        'KeyConditionExpression': 'summaryTarget = :target AND finishedAt >= :since',
+        'FilterExpression': 'attribute_not_exists(timedOut)',
+        'ExpressionAttributeValues': {':target': target, ':since': since},
+        'ScanIndexForward': False,
+        'Limit': RECENT_SUMMARIES
+    }
+    while True:
+        page = table.query(**kwargs)
+        if page.get('Items'):
+            return page['Items'][0]
+        if 'LastEvaluatedKey' not in page:
+            return None
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def claim_target(table, target, max_age, coalesce_window):
+    """Decide how one target is served; returns (request, lock key or None)
+
+    - cached: a summary finished within maxAge is returned as is
+    - coalesced: a validation of the target is already running, its requestId is returned
+    - new: a fresh requestId, holding the target's lock when coalescing is on
+    """
+    if max_age is not None:
+        summary = find_recent_summary(table, target, max_age)
+        if summary:
+            return {
+                'requestId': summary['requestId'],
+                'target': target,
+                'status': 'cached',
+                'overallStatus': summary['overallStatus'],
+                'finishedAt': summary['finishedAt']
+            }, None
+
+    request_id = str(uuid.uuid4())
+    if coalesce_window <= 0:
+        return {'requestId': request_id, 'target': target}, None
+
+    running = locks.acquire(table, target, request_id, coalesce_window)
+    if running:
+        return {'requestId': running, 'target': target, 'status': 'coalesced'}, None
+    return {'requestId': request_id, 'target': target}, locks.lock_key(target)
+
+
+@metrics.instrumented('ingest')
 def lambda_handler(event, context):
-    """API Gateway handler that validates input and emits ValidationRequested event"""
+    """API Gateway handler that validates input and emits ValidationRequested events"""
 
     try:
         # Parse request body
@@ -16,9 +109,9 @@ def lambda_handler(event, context):
         else:
             body = event.get('body', {})
 
-        target = body.get('target', '').strip()
+        raw_targets = parse_targets(body)
 
-        if not target:
+        if not raw_targets:
             return {
                 'statusCode': 400,
                 'headers': {
@@ -31,10 +124,36 @@ def lambda_handler(event, context):
             }
 
         # Max targets limit from environment
-        max_targets = int(os.environ.get('MAX_TARGETS', '10'))
+        max_targets = int(os.environ.get('MAX_TARGETS', '500'))
+
+        # Normalize and deduplicate, keeping the order the caller gave us
+        targets = []
+        invalid = []
+        seen = set()
+        for raw in raw_targets:
+            if not isinstance(raw, str):
+                invalid.append(raw)
+                continue
+            target = normalize_target(raw)
+            if target is None:
+                invalid.append(raw.strip())
+            elif target not in seen:
+                seen.add(target)
+                targets.append(target)
+
+        if invalid:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'error': 'Invalid target(s)',
+                    'invalid': invalid
+                })
+            }
 
-        # Validate target count (for future multi-target support)
-        targets = [t.strip() for t in target.split(',') if t.strip()]
         if len(targets) > max_targets:
             return {
                 'statusCode': 400,
@@ -47,24 +166,119 @@ def lambda_handler(event, context):
                 })
             }
 
-        # Generate request ID
-        request_id = str(uuid.uuid4())
-
-        # Emit ValidationRequested event
-        eventbus_name = os.environ.get('EVENTBUS_NAME', 'dns-checks')
-
-        eventbridge.put_events(
-            Entries=[{
-                'Source': 'dnscheck.api-ingest',
-                'DetailType': 'ValidationRequested',
-                'Detail': json.dumps({
-                    'requestId': request_id,
-                    'target': target,
-                    'timestamp': datetime.utcnow().isoformat() + 'Z'
-                }),
-                'EventBusName': eventbus_name
-            }]
-        )
+        # Reuse a recent result instead of probing again (seconds, fractions allowed)
+        max_age = body.get('maxAge')
+        if max_age is not None and (isinstance(max_age, bool) or not isinstance(max_age, (int, float))
+                                    or not math.isfinite(max_age) or max_age < 0):
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'error': 'maxAge must be a non-negative number of seconds'
+                })
+            }
+
+        # Parent ID groups all requests submitted together
+        batch_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        timestamp = now.isoformat() + 'Z'
+        deadline = deadlines.stamp(now)
+
+        # Concurrent requests for a target share one validation while its lock
+        # is held; off by default, so plain submissions don't touch DynamoDB
+        coalesce_window = int(os.environ.get('COALESCE_WINDOW', '0'))
+        if coalesce_window > 0 or max_age is not None:
+            table = get_table()
+            if len(targets) > 1:
+                with ThreadPoolExecutor(max_workers=min(len(targets), CLAIM_MAX_WORKERS)) as executor:
+                    claims = list(executor.map(
+                        lambda target: claim_target(table, target, max_age, coalesce_window), targets
+                    ))
+            else:
+                claims = [claim_target(table, targets[0], max_age, coalesce_window)]
+        else:
+            table = None
+            claims = [({'requestId': str(uuid.uuid4()), 'target': target}, None) for target in targets]
+
+        # One ValidationRequested event per target that isn't cached or coalesced
+        requests = []
+        entries = []
+        held_locks = {}
+        for request, lock_key in claims:
+            requests.append(request)
+            if 'status' in request:
+                continue
+
+            detail = {
+                'requestId': request['requestId'],
+                'batchId': batch_id,
+                'target': request['target'],
+                'timestamp': timestamp,
+                # Carried through every stage for the end-to-end latency
+                'requestedAt': timestamp
+            }
+            if deadline:
+                # Every stage bounds its timeouts by what is left until then
+                detail['deadline'] = deadline
+            if lock_key:
+                # Released by the aggregator when the request is finalized
+                detail['lockKey'] = lock_key
+                held_locks[request['requestId']] = lock_key
+            entries.append(events.entry('dnscheck.api-ingest', 'ValidationRequested', detail))
+
+        # Sent 10 per PutEvents call; only failed entries are retried
+        failed_entries = events.put_events(entries)
+        failed_ids = {jsonfast.loads(entry['Detail'])['requestId'] for entry in failed_entries}
+
+        # Nothing will finalize these, so let the next request try again
+        for request_id in failed_ids:
+            if request_id in held_locks:
+                locks.release(table, held_locks[request_id], request_id)
+
+        for request in requests:
+            if 'status' not in request:
+                request['status'] = 'failed' if request['requestId'] in failed_ids else 'accepted'
+
+        coalesced = sum(1 for request in requests if request['status'] == 'coalesced')
+        cached = sum(1 for request in requests if request['status'] == 'cached')
+
+        metrics.current().count('Accepted', len(entries) - len(failed_ids))
+        metrics.current().count('Coalesced', coalesced)
+        metrics.current().count('Cached', cached)
+        metrics.current().count('Failed', len(failed_ids))
+        if failed_ids:
+            metrics.current().set_status('partial')
+
+        if len(failed_ids) == len(requests):
+            return {
+                'statusCode': 502,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'error': 'Failed to submit validation requests',
+                    'batchId': batch_id
+                })
+            }
+
+        response_body = {
+            'batchId': batch_id,
+            'status': 'accepted' if not failed_ids else 'partial',
+            'accepted': len(entries) - len(failed_ids),
+            'coalesced': coalesced,
+            'cached': cached,
+            'failed': len(failed_ids),
+            'requests': requests
+        }
+
+        # Single-target submissions keep the original response shape
+        if len(requests) == 1:
+            response_body['requestId'] = requests[0]['requestId']
+            response_body['target'] = requests[0]['target']
 
         return {
             'statusCode': 200,
@@ -72,11 +286,7 @@ def lambda_handler(event, context):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'requestId': request_id,
-                'target': target,
-                'status': 'accepted'
-            })
+            'body': json.dumps(response_body)
         }
 
     except Exception as e:
@@ -0,0 +1,602 @@
+import csv
+import json
+import os
+import time
+import uuid
+from botocore.exceptions import ClientError
+from datetime import datetime
+from decimal import Decimal
+
+# Shared layer: tuned client pool, event emission with retries, EMF metrics
+from dnscheck_common import clients, deadlines, events, jsonfast, metrics
+from dnscheck_common.targets import normalize_target
+
+INPUT_FORMATS = ('lines', 'csv')
+
+# Bytes per S3 read; the input file is streamed, never loaded whole
+READ_CHUNK_BYTES = 64 * 1024
+
+# A CSV header line longer than this is rejected at submission
+HEADER_MAX_BYTES = 64 * 1024
+
+# Stop reading once less than this is left before the Lambda timeout (ms)
+CHUNK_TIME_MARGIN_MS = 30000
+
+# The byJob index is eventually consistent; re-read it this many times
+# (with a pause in between) while the newest results are still missing
+RESULTS_INDEX_ATTEMPTS = 5
+RESULTS_INDEX_DELAY = 2.0
+
+# Presigned GET /jobs resultUrl lifetime (seconds)
+RESULT_URL_EXPIRES = 3600
+
+# JOB item counters, all initialized to 0 so updates can use SET a = a + :n
+JOB_COUNTERS = ('submitted', 'skipped', 'unsent', 'completed', 'resultsOk', 'resultsWarn', 'resultsFail')
+
+# Rows of the results file: SUMMARY attributes projected into byJob
+RESULT_ATTRIBUTES = ('requestId', 'target', 'overallStatus', 'startedAt', 'finishedAt')
+
+
+def json_response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(body, default=decimal_default)
+    }
+
+
+def decimal_default(obj):
+    """Convert the Decimals DynamoDB returns to int/float for JSON serialization"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def get_table():
+    table_name = os.environ.get('DYNAMODB_TABLE', 'dnscheck-validations')
+    return metrics.TimedCalls(clients.resource('dynamodb').Table(table_name), 'DynamoDBLatency')
+
+
+def get_s3():
+    return metrics.TimedCalls(clients.client('s3'), 'S3Latency')
+
+
+def jobs_bucket():
+    return os.environ.get('JOBS_BUCKET', 'dnscheck-jobs')
+
+
+def result_key(job_id):
+    return f'results/{job_id}.ndjson.gz'
+
+
+def split_csv_line(text):
+    """Fields of one CSV line (quoted fields may not span lines)"""
+    return next(csv.reader([text]), [])
+
+
+def read_header(s3, input_key):
+    """Column names from the first line of a CSV input"""
+    body = s3.get_object(Bucket=jobs_bucket(), Key=input_key, Range=f'bytes=0-{HEADER_MAX_BYTES - 1}')['Body']
+    try:
+        data = body.read()
+    finally:
+        body.close()
+
+    line, newline, _ = data.partition(b'\n')
+    if not newline and len(data) >= HEADER_MAX_BYTES:
+        raise ValueError('CSV header line is too long')
+
+    header = split_csv_line(line.decode('utf-8-sig', errors='replace').rstrip('\r'))
+    return [name.strip() for name in header], len(line) + len(newline)
+
+
+def parse_job_request(body):
+    """Validated job settings from a POST /jobs body; raises ValueError with the message for a 400"""
+    input_key = body.get('inputKey')
+    if not isinstance(input_key, str) or not input_key.strip():
+        raise ValueError('Missing required field: inputKey')
+    input_key = input_key.strip()
+
+    input_format = body.get('format') or ('csv' if input_key.lower().endswith('.csv') else 'lines')
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(INPUT_FORMATS)}")
+
+    column = body.get('column', 0)
+    if isinstance(column, bool) or not isinstance(column, (int, str)) or (isinstance(column, int) and column < 0):
+        raise ValueError('column must be a column name or a 0-based index')
+
+    # A named column implies a header line
+    header = body.get('header', isinstance(column, str))
+    if not isinstance(header, bool):
+        raise ValueError('header must be true or false')
+    if isinstance(column, str) and not header:
+        raise ValueError('A named column requires header: true')
+
+    return input_key, input_format, column, header
+
+
+def create_job(event):
+    """POST /jobs {"inputKey": "...", "format": "lines|csv", "column": 0, "header": false}"""
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except json.JSONDecodeError:
+        body = None
+    if not isinstance(body, dict):
+        return json_response(400, {'error': 'Request body must be a JSON object'})
+
+    try:
+        input_key, input_format, column, header = parse_job_request(body)
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+
+    s3 = get_s3()
+    try:
+        size = s3.head_object(Bucket=jobs_bucket(), Key=input_key)['ContentLength']
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return json_response(404, {'error': f'Input not found: {input_key}'})
+        raise
+
+    # Data starts after the header; named columns are resolved to an index once
+    data_offset = 0
+    column_index = column if isinstance(column, int) else None
+    if input_format == 'csv' and header and size:
+        try:
+            names, data_offset = read_header(s3, input_key)
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+        if column_index is None:
+            if column not in names:
+                return json_response(400, {'error': f'Column not found in header: {column}'})
+            column_index = names.index(column)
+
+    job_id = str(uuid.uuid4())
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+
+    job_item = {
+        'requestId': job_id,
+        'step': 'JOB',
+        'jobStatus': 'running',
+        'inputKey': input_key,
+        'inputFormat': input_format,
+        'columnIndex': column_index or 0,
+        'inputBytes': size,
+        'nextOffset': data_offset,
+        'readDone': False,
+        'createdAt': timestamp,
+        'ts': timestamp,
+        **{counter: 0 for counter in JOB_COUNTERS}
+    }
+    get_table().put_item(Item=job_item)
+
+    events.emit('dnscheck.bulk-job', 'BulkJobChunk', {'jobId': job_id, 'offset': data_offset})
+    metrics.current().set_property('jobId', job_id)
+
+    return json_response(202, {
+        'jobId': job_id,
+        'status': 'running',
+        'inputKey': input_key,
+        'inputBytes': size
+    })
+
+
+def job_status(event):
+    """GET /jobs?jobId=...: progress counters, plus the results file once complete"""
+    job_id = (event.get('queryStringParameters') or {}).get('jobId', '')
+    if not job_id:
+        return json_response(400, {'error': 'Missing required parameter: jobId'})
+
+    job = get_table().get_item(Key={'requestId': job_id, 'step': 'JOB'}).get('Item')
+    if not job:
+        return json_response(404, {'error': 'Job not found'})
+
+    body = {
+        'jobId': job_id,
+        'status': job['jobStatus'],
+        'inputKey': job['inputKey'],
+        'createdAt': job['createdAt'],
+        # Bytes of the input read so far
+        'readBytes': job['nextOffset'],
+        'inputBytes': job['inputBytes'],
+        'readDone': job['readDone'],
+        **{counter: job.get(counter, 0) for counter in JOB_COUNTERS}
+    }
+
+    if job.get('resultKey'):
+        body['resultKey'] = job['resultKey']
+        body['resultRows'] = job.get('resultRows', 0)
+        body['finishedAt'] = job.get('finishedAt')
+        body['resultUrl'] = get_s3().generate_presigned_url(
+            'get_object',
+            Params={'Bucket': jobs_bucket(), 'Key': job['resultKey']},
+            ExpiresIn=RESULT_URL_EXPIRES
+        )
+
+    return json_response(200, body)
+
+
+def iter_lines(body, offset):
+    """Yield (end offset, line text) for each line of a streamed S3 body starting at offset
+
+    Reads READ_CHUNK_BYTES at a time, so memory stays flat however large the
+    input is; the end offset is where the next chunk invocation resumes.
+    """
+    position = offset
+    buffer = b''
+
+    for data in body.iter_chunks(READ_CHUNK_BYTES):
+        buffer += data
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            position += len(line) + 1
+            yield position, line.decode('utf-8', errors='replace')
+
+    if buffer:
+        yield position + len(buffer), buffer.decode('utf-8', errors='replace')
+
+
+def raw_target(text, input_format, column_index, first_line):
+    """The target text of one input line, or None for blank and comment lines"""
+    if first_line:
+        text = text.lstrip('\ufeff')
+    text = text.strip()
+    if not text or text.startswith('#'):
+        return None
+
+    if input_format == 'csv':
+        fields = split_csv_line(text)
+        return fields[column_index] if column_index < len(fields) else ''
+
+    return text
+
+
+def claim_chunk(table, job_id, offset, claimer):
+    """Mark the chunk at offset as being read; False if another invocation has it
+
+    Duplicate BulkJobChunk deliveries are dropped here. A Lambda retry of the
+    same invocation keeps its aws_request_id, so it can take the chunk over.
+    """
+    try:
+        table.update_item(
+            Key={'requestId': job_id, 'step': 'JOB'},
+            UpdateExpression='SET claimedOffset = :offset, claimedBy = :claimer',
+            ConditionExpression=(
+                'nextOffset = :offset AND jobStatus = :running AND '
+                '(attribute_not_exists(claimedOffset) OR claimedOffset <> :offset OR claimedBy = :claimer)'
+            ),
+            ExpressionAttributeValues={
+                ':offset': offset,
+                ':claimer': claimer,
+                ':running': 'running'
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    return True
+
+
+def schedule_chunk(job_id, offset):
+    events.emit('dnscheck.bulk-job', 'BulkJobChunk', {'jobId': job_id, 'offset': offset})
+
+
+def drain_if_done(job):
+    """Emit BulkJobDrained once the input is read and every request is finalized"""
+    if job.get('readDone') and job.get('completed', 0) >= job.get('totalRequests', 0):
+        events.emit('dnscheck.bulk-job', 'BulkJobDrained', {'jobId': job['requestId']})
+        return True
+    return False
+
+
+def line_request_id(job_id, line_end):
+    """requestId of the input line ending at byte line_end
+
+    Derived from the job and the line's position, so a chunk read again after
+    a failed invocation sends the same requests, which the aggregator counts
+    only once, instead of new ones that would complete the job early.
+    """
+    return str(uuid.uuid5(uuid.UUID(job_id), str(line_end)))
+
+
+def process_chunk(detail, context):
+    """Read targets from offset and fan them out as paced, batched ValidationRequested events
+
+    One invocation reads up to JOB_CHUNK_SIZE lines (or until the timeout is
+    near), records how far it got and schedules the next chunk with another
+    BulkJobChunk event. Events are sent PUT_EVENTS_BATCH_SIZE at a time at no
+    more than JOB_RATE targets per second per invocation. A job is read by
+    one invocation at a time (see claim_chunk), so that is also the job's
+    rate, but jobs running side by side are paced separately and add up.
+    """
+    job_id = detail['jobId']
+    offset = int(detail['offset'])
+    table = get_table()
+    invocation = metrics.current()
+    invocation.set_stage('job-chunk')
+    invocation.set_property('jobId', job_id)
+
+    job = table.get_item(Key={'requestId': job_id, 'step': 'JOB'}).get('Item')
+    if not job:
+        print(f"Job {job_id} not found")
+        invocation.set_status('skipped')
+        return {'statusCode': 404, 'body': json.dumps({'jobId': job_id, 'status': 'not-found'})}
+
+    if job['nextOffset'] != offset:
+        # Read before; make sure the next chunk was scheduled (its event may
+        # have failed after the progress update) unless it is already claimed
+        if (job.get('lastChunkOffset') == offset and not job['readDone']
+                and job.get('claimedOffset') != job['nextOffset']):
+            schedule_chunk(job_id, int(job['nextOffset']))
+        invocation.set_status('skipped')
+        return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'duplicate'})}
+
+    if not claim_chunk(table, job_id, offset, context.aws_request_id):
+        invocation.set_status('skipped')
+        return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'duplicate'})}
+
+    rate = float(os.environ.get('JOB_RATE', '50'))
+    chunk_size = int(os.environ.get('JOB_CHUNK_SIZE', '5000'))
+
+    s3 = get_s3()
+    body = s3.get_object(Bucket=jobs_bucket(), Key=job['inputKey'], Range=f'bytes={offset}-')['Body'] \
+        if offset < job['inputBytes'] else None
+
+    counts = {'submitted': 0, 'skipped': 0, 'unsent': 0}
+    lines_read = 0
+    next_offset = offset
+    read_done = True
+    batch = []
+    started = time.monotonic()
+
+    def send(details):
+        # Pace against the rate for everything sent by this invocation
+        sent = counts['submitted'] + counts['unsent']
+        delay = (started + sent / rate - time.monotonic()) if rate > 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+        # Stamped when sent, so pacing doesn't count towards EndToEndLatency
+        now = datetime.utcnow()
+        timestamp = now.isoformat() + 'Z'
+        stamps = {'timestamp': timestamp, 'requestedAt': timestamp}
+        deadline = deadlines.stamp(now)
+        if deadline:
+            stamps['deadline'] = deadline
+        failed = events.put_events([
+            events.entry('dnscheck.bulk-job', 'ValidationRequested', {**detail, **stamps})
+            for detail in details
+        ])
+        counts['submitted'] += len(details) - len(failed)
+        counts['unsent'] += len(failed)
+
+    try:
+        for end, text in (iter_lines(body, offset) if body is not None else ()):
+            raw = raw_target(text, job['inputFormat'], int(job['columnIndex']), next_offset == 0)
+            lines_read += 1
+
+            if raw is not None:
+                target = normalize_target(raw)
+                if target is None:
+                    counts['skipped'] += 1
+                else:
+                    batch.append({
+                        'requestId': line_request_id(job_id, end),
+                        'batchId': job_id,
+                        'jobId': job_id,
+                        'target': target
+                    })
+
+            if len(batch) == events.PUT_EVENTS_BATCH_SIZE:
+                send(batch)
+                batch = []
+
+            next_offset = end
+
+            # Stop only between batches so the counters match next_offset
+            if not batch and (lines_read >= chunk_size
+                              or context.get_remaining_time_in_millis() < CHUNK_TIME_MARGIN_MS):
+                read_done = next_offset >= job['inputBytes']
+                break
+
+        if batch:
+            send(batch)
+    finally:
+        if body is not None:
+            body.close()
+
+    update_expression = (
+        'SET nextOffset = :next, lastChunkOffset = :offset, submitted = submitted + :submitted, '
+        'skipped = skipped + :skipped, unsent = unsent + :unsent'
+    )
+    values = {
+        ':next': next_offset,
+        ':offset': offset,
+        ':submitted': counts['submitted'],
+        ':skipped': counts['skipped'],
+        ':unsent': counts['unsent']
+    }
+    if read_done:
+        update_expression += ', readDone = :done, totalRequests = submitted + :submitted'
+        values[':done'] = True
+
+    try:
+        job = table.update_item(
+            Key={'requestId': job_id, 'step': 'JOB'},
+            UpdateExpression=update_expression,
+            ConditionExpression='nextOffset = :offset',
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"Chunk {offset} of job {job_id} was recorded by another invocation")
+        invocation.set_status('skipped')
+        return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'duplicate'})}
+
+    invocation.count('Submitted', counts['submitted'])
+    invocation.count('Skipped', counts['skipped'])
+    invocation.count('Unsent', counts['unsent'])
+    invocation.set_status('partial' if counts['unsent'] else 'ok')
+
+    if read_done:
+        drain_if_done(job)
+    else:
+        schedule_chunk(job_id, next_offset)
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'jobId': job_id,
+            'offset': offset,
+            'nextOffset': next_offset,
+            'readDone': read_done,
+            **counts
+        })
+    }
+
+
+def query_results(table, job_id):
+    """Every SUMMARY row of the job from the byJob index, page by page"""
+    kwargs = {
+        'IndexName': 'byJob',
+        'KeyConditionExpression': 'summaryJob = :job',
+        'ProjectionExpression': ', '.join(RESULT_ATTRIBUTES),
+        'ExpressionAttributeValues': {':job': job_id}
+    }
+    while True:
+        page = table.query(**kwargs)
+        yield from page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def write_results_file(table, job_id, path):
+    """Write the job's results as gzip-compressed NDJSON; returns the row count"""
+    import gzip
+
+    rows = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as output:
+        for item in query_results(table, job_id):
+            output.write(jsonfast.dumps({name: item.get(name) for name in RESULT_ATTRIBUTES}))
+            output.write('\n')
+            rows += 1
+    return rows
+
+
+def write_results(detail):
+    """Collect a drained job's results into results/<jobId>.ndjson.gz and complete it"""
+    job_id = detail['jobId']
+    table = get_table()
+    invocation = metrics.current()
+    invocation.set_stage('job-results')
+    invocation.set_property('jobId', job_id)
+
+    try:
+        job = table.update_item(
+            Key={'requestId': job_id, 'step': 'JOB'},
+            UpdateExpression='SET jobStatus = :writing',
+            ConditionExpression='jobStatus IN (:running, :writing) AND readDone = :done',
+            ExpressionAttributeValues={':writing': 'writing', ':running': 'running', ':done': True},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        invocation.set_status('skipped')
+        return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'duplicate'})}
+
+    # Only needed once per job, so not imported during init
+    import tempfile
+
+    key = result_key(job_id)
+    descriptor, path = tempfile.mkstemp(suffix='.ndjson.gz')
+    os.close(descriptor)
+
+    try:
+        for attempt in range(RESULTS_INDEX_ATTEMPTS):
+            if attempt > 0:
+                time.sleep(RESULTS_INDEX_DELAY)
+            rows = write_results_file(table, job_id, path)
+            if rows >= job['completed']:
+                break
+        else:
+            print(f"Job {job_id}: {rows} of {job['completed']} results in the byJob index")
+
+        get_s3().upload_file(path, jobs_bucket(), key, ExtraArgs={
+            'ContentType': 'application/x-ndjson',
+            'ContentEncoding': 'gzip'
+        })
+    finally:
+        os.remove(path)
+
+    finished_at = datetime.utcnow().isoformat() + 'Z'
+    try:
+        table.update_item(
+            Key={'requestId': job_id, 'step': 'JOB'},
+            UpdateExpression='SET jobStatus = :complete, resultKey = :key, resultRows = :rows, finishedAt = :finished',
+            ConditionExpression='jobStatus = :writing',
+            ExpressionAttributeValues={
+                ':complete': 'complete',
+                ':writing': 'writing',
+                ':key': key,
+                ':rows': rows,
+                ':finished': finished_at
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        invocation.set_status('skipped')
+        return {'statusCode': 200, 'body': json.dumps({'jobId': job_id, 'status': 'duplicate'})}
+
+    invocation.count('ResultRows', rows)
+
+    events.emit('dnscheck.bulk-job', 'BulkJobCompleted', {
+        'jobId': job_id,
+        'resultKey': key,
+        'resultRows': rows,
+        'resultsOk': int(job['resultsOk']),
+        'resultsWarn': int(job['resultsWarn']),
+        'resultsFail': int(job['resultsFail']),
+        'timestamp': finished_at
+    })
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'jobId': job_id,
+            'status': 'complete',
+            'resultKey': key,
+            'resultRows': rows
+        })
+    }
+
+
+@metrics.instrumented('job')
+def lambda_handler(event, context):
+    """Bulk validation jobs: the /jobs API plus the BulkJobChunk and BulkJobDrained events"""
+
+    # Job events: no try/except, so a failed chunk or results file is
+    # retried by Lambda's asynchronous invocation retries
+    detail_type = event.get('detail-type')
+    if detail_type == 'BulkJobChunk':
+        return process_chunk(events.parse_detail(event), context)
+    if detail_type == 'BulkJobDrained':
+        return write_results(events.parse_detail(event))
+
+    try:
+        method = event.get('requestContext', {}).get('http', {}).get('method', '') or event.get('httpMethod', '')
+        if method == 'POST':
+            return create_job(event)
+        return job_status(event)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return json_response(500, {'error': 'Internal server error'})
@@ -1,102 +1,566 @@
+import asyncio
+import ipaddress
 import json
 import os
+import random
 import socket
-import boto3
+import struct
+import time
+from collections import OrderedDict
 from datetime import datetime
 
-eventbridge = boto3.client('events')
+# Shared layer: tuned client pool, event emission with retries, EMF metrics
+from dnscheck_common import deadlines, events, metrics
 
+# DNS wire format constants (RFC 1035 / RFC 3596)
+QTYPES = {'A': 1, 'CNAME': 5, 'AAAA': 28}
+QTYPE_NAMES = {value: name for name, value in QTYPES.items()}
+QCLASS_IN = 1
+QTYPE_OPT = 41
+EDNS_UDP_PAYLOAD = 1232
+
+RCODE_NAMES = {
+    0: 'NOERROR',
+    1: 'FORMERR',
+    2: 'SERVFAIL',
+    3: 'NXDOMAIN',
+    4: 'NOTIMP',
+    5: 'REFUSED'
+}
+
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+
+# Answers cached across warm invocations of the same container, keyed by
+# (name, qtype) and kept in least-recently-used order
+DNS_CACHE = OrderedDict()
+CACHE_STATS = {
+    'hits': 0,
+    'misses': 0,
+    'expired': 0,
+    'evictions': 0
+}
+
+# Only definitive negative answers are cached; timeouts are always retried
+NEGATIVE_RCODES = ('NXDOMAIN', 'SERVFAIL')
+
+
+class DNSError(Exception):
+    """Raised for malformed or mismatched DNS responses"""
+
+
+def parse_nameservers(value):
+    """Parse a comma-separated list of ``host``, ``host:port`` or ``[v6]:port`` entries"""
+    servers = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        port = 53
+        if entry.startswith('['):
+            host, _, rest = entry[1:].partition(']')
+            if rest.startswith(':'):
+                port = int(rest[1:])
+        elif entry.count(':') == 1:
+            host, port = entry.split(':')
+            port = int(port)
+        else:
+            host = entry
+        servers.append((host, port))
+    return servers
+
+
+def load_nameservers():
+    """Nameservers from DNS_NAMESERVERS, falling back to /etc/resolv.conf"""
+    configured = os.environ.get('DNS_NAMESERVERS', '')
+    if configured:
+        return parse_nameservers(configured)
+
+    servers = []
+    try:
+        with open('/etc/resolv.conf') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    servers.append((parts[1], 53))
+    except OSError:
+        pass
+
+    return servers or [('8.8.8.8', 53)]
+
+
+def encode_name(name):
+    """Encode a hostname as a sequence of length-prefixed labels"""
+    encoded = b''
+    for label in name.rstrip('.').split('.'):
+        try:
+            raw = label.encode('ascii')
+        except UnicodeEncodeError:
+            raise DNSError(f'Invalid label in name: {name}')
+        if not raw or len(raw) > 63:
+            raise DNSError(f'Invalid label in name: {name}')
+        encoded += bytes([len(raw)]) + raw
+    return encoded + b'\x00'
+
+
+def build_query(query_id, name, qtype):
+    """Build a recursive query with an EDNS0 OPT record advertising a larger UDP payload"""
+    header = struct.pack('!HHHHHH', query_id, FLAG_RD, 1, 0, 0, 1)
+    question = encode_name(name) + struct.pack('!HH', QTYPES[qtype], QCLASS_IN)
+    opt = b'\x00' + struct.pack('!HHIH', QTYPE_OPT, EDNS_UDP_PAYLOAD, 0, 0)
+    return header + question + opt
+
+
+def read_name(message, offset):
+    """Read a possibly compressed name, returning (name, offset after the name)"""
+    labels = []
+    end_offset = None
+    jumps = 0
+
+    while True:
+        if offset >= len(message):
+            raise DNSError('Name extends past end of message')
+        length = message[offset]
+
+        if length & 0xC0 == 0xC0:
+            # Compression pointer
+            if offset + 1 >= len(message):
+                raise DNSError('Truncated compression pointer')
+            if end_offset is None:
+                end_offset = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            jumps += 1
+            if jumps > 32:
+                raise DNSError('Compression pointer loop')
+            continue
+
+        if length == 0:
+            offset += 1
+            break
+
+        labels.append(message[offset + 1:offset + 1 + length].decode('ascii', 'replace'))
+        offset += 1 + length
+
+    return '.'.join(labels), (end_offset if end_offset is not None else offset)
+
+
+def parse_response(message, query_id):
+    """Parse a DNS response into (rcode, truncated, answers)
+
+    answers is a list of dicts with type, name, value and ttl for the record
+    types we care about (A, AAAA, CNAME); anything else is skipped.
+    """
+    if len(message) < 12:
+        raise DNSError('Response shorter than DNS header')
+
+    response_id, flags, qdcount, ancount, _, _ = struct.unpack('!HHHHHH', message[:12])
+    if response_id != query_id:
+        raise DNSError('Response ID does not match query')
+
+    rcode = flags & 0x000F
+    truncated = bool(flags & FLAG_TC)
+
+    # A truncated answer section is unusable; the caller retries over TCP
+    if truncated:
+        return rcode, truncated, []
+
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = read_name(message, offset)
+        offset += 4
+
+    answers = []
+    for _ in range(ancount):
+        name, offset = read_name(message, offset)
+        if offset + 10 > len(message):
+            raise DNSError('Truncated resource record')
+        rtype, _, ttl, rdlength = struct.unpack('!HHIH', message[offset:offset + 10])
+        offset += 10
+        rdata = message[offset:offset + rdlength]
+
+        if rtype == QTYPES['A'] and rdlength == 4:
+            value = socket.inet_ntop(socket.AF_INET, rdata)
+        elif rtype == QTYPES['AAAA'] and rdlength == 16:
+            value = socket.inet_ntop(socket.AF_INET6, rdata)
+        elif rtype == QTYPES['CNAME']:
+            value, _ = read_name(message, offset)
+        else:
+            value = None
+
+        if value is not None:
+            answers.append({
+                'type': QTYPE_NAMES[rtype],
+                'name': name,
+                'value': value,
+                'ttl': ttl
+            })
+
+        offset += rdlength
+
+    return rcode, truncated, answers
+
+
+class _UDPQueryProtocol(asyncio.DatagramProtocol):
+    """Resolves a future with the first datagram whose ID matches the query"""
+
+    def __init__(self, future, query_id):
+        self.future = future
+        self.query_id = query_id
+
+    def datagram_received(self, data, addr):
+        if self.future.done() or len(data) < 2:
+            return
+        # Ignore stray datagrams for other queries
+        if struct.unpack('!H', data[:2])[0] == self.query_id:
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc or ConnectionError('UDP socket closed'))
+
+
+async def _udp_exchange(server, message, query_id):
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _UDPQueryProtocol(future, query_id),
+        remote_addr=server
+    )
+    try:
+        transport.sendto(message)
+        return await future
+    finally:
+        transport.close()
+
+
+async def _tcp_exchange(server, message):
+    reader, writer = await asyncio.open_connection(server[0], server[1])
+    try:
+        writer.write(struct.pack('!H', len(message)) + message)
+        await writer.drain()
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+        return await reader.readexactly(length)
+    finally:
+        writer.close()
+
+
+async def query(name, qtype, servers, timeout):
+    """Run one query against the nameservers in order, bounded by a hard deadline
+
+    Each server gets an equal share of whatever time is left, so one
+    unresponsive server cannot use up the whole budget. Truncated UDP answers
+    are retried over TCP against the same server.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    last_error = 'timeout'
+
+    for index, server in enumerate(servers):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        attempt_timeout = remaining / (len(servers) - index)
+
+        query_id = random.getrandbits(16)
+        transport = 'udp'
+
+        try:
+            # A name that can't be encoded fails this query, not the whole lookup
+            message = build_query(query_id, name, qtype)
+            response = await asyncio.wait_for(_udp_exchange(server, message, query_id), attempt_timeout)
+            rcode, truncated, answers = parse_response(response, query_id)
+
+            if truncated:
+                transport = 'tcp'
+                tcp_timeout = max(deadline - time.monotonic(), 0.001)
+                response = await asyncio.wait_for(_tcp_exchange(server, message), tcp_timeout)
+                rcode, _, answers = parse_response(response, query_id)
+
+        except asyncio.TimeoutError:
+            last_error = 'timeout'
+            continue
+        except (OSError, DNSError, asyncio.IncompleteReadError) as e:
+            last_error = str(e) or type(e).__name__
+            continue
+
+        # SERVFAIL / REFUSED from one server is worth asking the next one
+        if rcode in (2, 5) and index < len(servers) - 1:
+            last_error = RCODE_NAMES.get(rcode, str(rcode))
+            continue
+
+        return {
+            'qtype': qtype,
+            'rcode': RCODE_NAMES.get(rcode, str(rcode)),
+            'answers': answers,
+            'server': f'{server[0]}:{server[1]}',
+            'transport': transport,
+            'latencyMs': round((time.monotonic() - started) * 1000, 2)
+        }
+
+    return {
+        'qtype': qtype,
+        'rcode': 'TIMEOUT' if last_error == 'timeout' else 'ERROR',
+        'error': last_error,
+        'answers': [],
+        'latencyMs': round((time.monotonic() - started) * 1000, 2)
+    }
+
+
+def cache_get(name, qtype):
+    """Return a cached result with TTLs counted down, or None on a miss"""
+    key = (name.lower(), qtype)
+    entry = DNS_CACHE.get(key)
+    now = time.monotonic()
+
+    if entry is not None and entry[0] <= now:
+        del DNS_CACHE[key]
+        CACHE_STATS['expired'] += 1
+        entry = None
+
+    if entry is None:
+        CACHE_STATS['misses'] += 1
+        return None
+
+    DNS_CACHE.move_to_end(key)
+    CACHE_STATS['hits'] += 1
+
+    expires_at, cached_at, result = entry
+    elapsed = int(now - cached_at)
+    return dict(
+        result,
+        answers=[dict(answer, ttl=max(answer['ttl'] - elapsed, 0)) for answer in result['answers']],
+        cache='hit',
+        latencyMs=0
+    )
+
+
+def cache_put(name, qtype, result):
+    """Cache a query result for its record TTL, or DNS_NEGATIVE_TTL for negative answers"""
+    max_entries = int(os.environ.get('DNS_CACHE_SIZE', '4096'))
+    if max_entries <= 0:
+        return
+
+    rcode = result['rcode']
+    if rcode == 'NOERROR' and result['answers']:
+        ttl = min(answer['ttl'] for answer in result['answers'])
+        ttl = min(ttl, int(os.environ.get('DNS_CACHE_MAX_TTL', '3600')))
+    elif rcode == 'NOERROR' or rcode in NEGATIVE_RCODES:
+        # NODATA, NXDOMAIN and SERVFAIL
+        ttl = int(os.environ.get('DNS_NEGATIVE_TTL', '30'))
+    else:
+        return
+
+    if ttl <= 0:
+        return
+
+    key = (name.lower(), qtype)
+    now = time.monotonic()
+    DNS_CACHE[key] = (now + ttl, now, result)
+    DNS_CACHE.move_to_end(key)
+
+    while len(DNS_CACHE) > max_entries:
+        DNS_CACHE.popitem(last=False)
+        CACHE_STATS['evictions'] += 1
+
+
+def cache_stats():
+    """Cache counters for this container, used to size DNS_CACHE_SIZE"""
+    lookups = CACHE_STATS['hits'] + CACHE_STATS['misses']
+    return dict(
+        CACHE_STATS,
+        size=len(DNS_CACHE),
+        hitRate=round(CACHE_STATS['hits'] / lookups, 4) if lookups else 0
+    )
+
+
+async def resolve_all(name, servers, timeout):
+    """Answer from the cache where possible and send the remaining queries concurrently"""
+    results = {}
+    missing = []
+
+    for qtype in QTYPES:
+        cached = cache_get(name, qtype)
+        if cached is not None:
+            results[qtype] = cached
+        else:
+            missing.append(qtype)
+
+    if missing:
+        answered = await asyncio.gather(*(query(name, qtype, servers, timeout) for qtype in missing))
+        for result in answered:
+            cache_put(name, result['qtype'], result)
+            results[result['qtype']] = dict(result, cache='miss')
+
+    return results
+
+
+def resolve(name, timeout, servers=None):
+    """Resolve name, returning per-type query results
+
+    The overall wall time is that of the slowest query, never the sum.
+    """
+    return asyncio.run(resolve_all(name, servers or load_nameservers(), timeout))
+
+
+def literal_result(target):
+    """Short-circuit for targets that are already IP addresses"""
+    address = ipaddress.ip_address(target)
+    qtype = 'A' if address.version == 4 else 'AAAA'
+    return {
+        qtype: {
+            'qtype': qtype,
+            'rcode': 'NOERROR',
+            'answers': [{'type': qtype, 'name': target, 'value': target, 'ttl': 0}],
+            'transport': 'literal',
+            'latencyMs': 0
+        }
+    }
+
+
+def summarize(target, results):
+    """Build record lists, address lists and per-query timings from query results"""
+    records = {}
+    queries = {}
+    timings = {}
+
+    for qtype, result in results.items():
+        records[qtype] = [
+            {'name': answer['name'], 'value': answer['value'], 'ttl': answer['ttl']}
+            for answer in result['answers'] if answer['type'] == qtype
+        ]
+        queries[qtype] = {
+            key: result[key] for key in ('rcode', 'server', 'transport', 'error') if key in result
+        }
+        timings[f'dns{qtype}'] = int(result['latencyMs'])
+        if 'cache' in result:
+            timings[f'dns{qtype}Cache'] = result['cache']
+
+    ip_list = []
+    for qtype in ('A', 'AAAA'):
+        for record in records.get(qtype, []):
+            if record['value'] not in ip_list:
+                ip_list.append(record['value'])
+
+    return records, queries, timings, ip_list
+
+
+def failure_reason(results, ip_list):
+    """Return why resolution failed, or None if we have addresses"""
+    if ip_list:
+        return None
+
+    rcodes = [result['rcode'] for result in results.values()]
+    if 'NXDOMAIN' in rcodes:
+        return 'DNS resolution failed: NXDOMAIN'
+    if all(rcode == 'TIMEOUT' for rcode in rcodes):
+        return 'DNS resolution timed out'
+    failing = [rcode for rcode in rcodes if rcode != 'NOERROR']
+    if failing:
+        return f'DNS resolution failed: {failing[0]}'
+    return 'DNS resolution failed: no A or AAAA records'
+
+
+@metrics.instrumented('dns')
 def lambda_handler(event, context):
     """Resolves DNS and emits DNSResolved or DNSFailed event"""
 
     try:
         # Parse EventBridge event
-        # Handle both string and dict formats
-        if isinstance(event.get('detail'), str):
-            detail = json.loads(event['detail'])
-        else:
-            detail = event.get('detail', {})
+        detail = events.parse_detail(event)
 
         request_id = detail.get('requestId', '')
         target = detail.get('target', '')
 
-        # Timeout from environment (seconds)
-        timeout = int(os.environ.get('DNS_TIMEOUT', '5'))
+        # Per-query deadline from environment (seconds), cut short by the
+        # request's end-to-end deadline and this invocation's remaining time.
+        # Past the deadline only cached answers are used.
+        deadline = deadlines.for_event(detail, context)
+        timeout = deadline.cap(float(os.environ.get('DNS_TIMEOUT', '5')))
 
-        start_time = datetime.utcnow()
+        start = time.monotonic()
+        expired, evictions = CACHE_STATS['expired'], CACHE_STATS['evictions']
 
-        # Resolve DNS
         try:
-            socket.setdefaulttimeout(timeout)
-            ip_addresses = socket.gethostbyname_ex(target)
-            ip_list = ip_addresses[2] if len(ip_addresses) > 2 else []
+            results = literal_result(target)
+        except ValueError:
+            results = resolve(target, timeout)
+
+        duration_ms = int((time.monotonic() - start) * 1000)
+        end_time = datetime.utcnow()
 
-            end_time = datetime.utcnow()
-            duration_ms = int((end_time - start_time).total_seconds() * 1000)
+        records, queries, timings, ip_list = summarize(target, results)
+        timings['dns'] = duration_ms
+        reason = failure_reason(results, ip_list)
 
+        # Out of time for the whole request rather than a failure of its DNS
+        status = 'fail'
+        if reason == 'DNS resolution timed out' and deadline.expired():
+            status = 'timeout'
+            reason = 'Deadline exceeded during DNS resolution'
+
+        stats = cache_stats()
+
+        invocation = metrics.current()
+        invocation.add_timings(timings)
+        for result in results.values():
+            if result.get('cache') == 'miss':
+                invocation.add('DNSQueryLatency', result['latencyMs'])
+        invocation.count('CacheHits', sum(1 for result in results.values() if result.get('cache') == 'hit'))
+        invocation.count('CacheMisses', sum(1 for result in results.values() if result.get('cache') == 'miss'))
+        invocation.count('CacheExpired', CACHE_STATS['expired'] - expired)
+        invocation.count('CacheEvictions', CACHE_STATS['evictions'] - evictions)
+        invocation.count('CacheSize', stats['size'])
+        invocation.set_status('ok' if reason is None else status)
+
+        if reason is None:
             # Emit DNSResolved event
-            eventbus_name = os.environ.get('EVENTBUS_NAME', 'dns-checks')
-
-            eventbridge.put_events(
-                Entries=[{
-                    'Source': 'dnscheck.dns-resolver',
-                    'DetailType': 'DNSResolved',
-                    'Detail': json.dumps({
-                        'requestId': request_id,
-                        'target': target,
-                        'status': 'ok',
-                        'ipAddresses': ip_list,
-                        'timings': {
-                            'dns': duration_ms
-                        },
-                        'timestamp': end_time.isoformat() + 'Z'
-                    }),
-                    'EventBusName': eventbus_name
-                }]
-            )
+            events.emit('dnscheck.dns-resolver', 'DNSResolved', {
+                'requestId': request_id,
+                'target': target,
+                'status': 'ok',
+                'ipAddresses': ip_list,
+                'records': records,
+                'queries': queries,
+                'timings': timings,
+                'timestamp': end_time.isoformat() + 'Z',
+                **events.passthrough(detail)
+            })
 
             return {
                 'statusCode': 200,
                 'body': json.dumps({
                     'requestId': request_id,
                     'status': 'resolved',
-                    'ipAddresses': ip_list
+                    'ipAddresses': ip_list,
+                    'cache': stats
                 })
             }
 
-        except socket.gaierror as e:
-            # DNS resolution failed
-            end_time = datetime.utcnow()
-            duration_ms = int((end_time - start_time).total_seconds() * 1000)
-
-            eventbus_name = os.environ.get('EVENTBUS_NAME', 'dns-checks')
-
-            eventbridge.put_events(
-                Entries=[{
-                    'Source': 'dnscheck.dns-resolver',
-                    'DetailType': 'DNSFailed',
-                    'Detail': json.dumps({
-                        'requestId': request_id,
-                        'target': target,
-                        'status': 'fail',
-                        'reason': f'DNS resolution failed: {str(e)}',
-                        'timings': {
-                            'dns': duration_ms
-                        },
-                        'timestamp': end_time.isoformat() + 'Z'
-                    }),
-                    'EventBusName': eventbus_name
-                }]
-            )
+        # DNS resolution failed
+        events.emit('dnscheck.dns-resolver', 'DNSFailed', {
+            'requestId': request_id,
+            'target': target,
+            'status': status,
+            'reason': reason,
+            'queries': queries,
+            'timings': timings,
+            'timestamp': end_time.isoformat() + 'Z',
+            **events.passthrough(detail)
+        })
 
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'requestId': request_id,
-                    'status': 'failed',
-                    'reason': str(e)
-                })
-            }
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'requestId': request_id,
+                'status': 'failed',
+                'reason': reason,
+                'cache': stats
+            })
+        }
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,265 @@
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from urllib.parse import quote
+
+# Shared layer: tuned client pool, JSON encoding, EMF metrics, storage layouts
+from dnscheck_common import clients, jsonfast, metrics, results
+
+# Column prefix of each validation step; DNSResolved and DNSFailed are both dns
+STEP_COLUMNS = {
+    'dnsresolved': 'dns',
+    'dnsfailed': 'dns',
+    'httpchecked': 'http',
+    'httpschecked': 'https'
+}
+
+# Per-IP probe phases (see the probers) copied onto each probe row
+PROBE_PHASES = ('connect', 'tls', 'ttfb', 'transfer', 'redirects', 'total')
+
+
+def number(value):
+    """int/float for a Decimal (or any number), None for anything else"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+        return None
+    return int(value) if value % 1 == 0 else float(value)
+
+
+def parse_timestamp(value):
+    """datetime from the ISO 8601 'Z' timestamps in events"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def history_bucket():
+    return os.environ.get('HISTORY_BUCKET', 'dnscheck-history')
+
+
+def history_format():
+    """ndjson (gzip, the default) or parquet"""
+    return os.environ.get('HISTORY_FORMAT', 'ndjson')
+
+
+def query_steps(table, request_id):
+    """Step items of a request stored in the items layout"""
+    response = table.query(
+        KeyConditionExpression='requestId = :rid',
+        ExpressionAttributeValues={
+            ':rid': request_id
+        },
+        ConsistentRead=True
+    )
+    return [item for item in response['Items'] if item['step'] in STEP_COLUMNS]
+
+
+def completed_validation(record, table):
+    """(summary, steps) of the validation a stream record finalizes, or None
+
+    Items layout: the INSERT of a SUMMARY item; its steps are read back
+    with one Query. Single layout: the MODIFY that added finishedAt to a
+    RESULT item, which holds the steps itself. Every other change (steps,
+    PROGRESS, locks, rate limit buckets, TTL deletes) is skipped.
+    """
+    change = record.get('dynamodb', {})
+    new_image = change.get('NewImage')
+    if not new_image or 'step' not in new_image:
+        return None
+
+    step = new_image['step']['S']
+    if step == 'SUMMARY' and record['eventName'] == 'INSERT':
+        summary = results.deserialize_item(new_image)
+        return summary, query_steps(table, summary['requestId'])
+
+    if step == results.RESULT_STEP and 'finishedAt' in new_image and 'finishedAt' not in change.get('OldImage', {}):
+        return results.expand(results.deserialize_item(new_image))
+
+    return None
+
+
+def build_row(summary, steps):
+    """History row of one finished validation
+
+    Columns are flat where they can be: per-step statuses, the merged
+    numeric timings and one probe row per address the probers tried.
+    """
+    row = {
+        'requestId': summary['requestId'],
+        'target': summary.get('target', ''),
+        'jobId': summary.get('summaryJob'),
+        'startedAt': summary.get('startedAt'),
+        'finishedAt': summary['finishedAt'],
+        'overallStatus': summary.get('overallStatus'),
+        'timedOut': bool(summary.get('timedOut')),
+        'endToEndMs': None,
+        'dnsStatus': None,
+        'httpStatus': None,
+        'httpsStatus': None,
+        'timings': {},
+        'probes': []
+    }
+
+    if summary.get('startedAt'):
+        row['endToEndMs'] = round(
+            (parse_timestamp(summary['finishedAt']) - parse_timestamp(summary['startedAt'])).total_seconds() * 1000, 2
+        )
+
+    for step in sorted(steps, key=lambda x: x.get('ts', '')):
+        column = STEP_COLUMNS.get(step['step'])
+        if column is None:
+            continue
+        row[f'{column}Status'] = step.get('status')
+
+        for name, value in (step.get('timings') or {}).items():
+            # Cache hit/miss markers and the like are not timings
+            if number(value) is not None:
+                row['timings'][name] = number(value)
+
+        for result in step.get('results') or []:
+            probe = {
+                'step': column,
+                'ip': result.get('ip'),
+                'status': result.get('status'),
+                'httpStatusCode': number(result.get('httpStatusCode')),
+                'rateLimited': bool(step.get('rateLimited'))
+            }
+            for phase in PROBE_PHASES:
+                probe[phase] = number((result.get('timings') or {}).get(phase))
+            row['probes'].append(probe)
+
+    return row
+
+
+def partition_prefix(row):
+    """Hive-style date=/target= prefix of a row, as Athena and the query tool read it"""
+    prefix = os.environ.get('HISTORY_PREFIX', 'history/')
+    return f"{prefix}date={row['finishedAt'][:10]}/target={quote(row['target'], safe='')}"
+
+
+def encode_ndjson(rows):
+    return gzip.compress(''.join(jsonfast.dumps(row) + '\n' for row in rows).encode('utf-8'))
+
+
+def parquet_schema(pyarrow):
+    """Schema of every Parquet file, so columns don't depend on the rows of a batch
+
+    Inferred from the rows, timings would be a struct of whichever keys the
+    batch had (none at all fails) and a column that is None throughout
+    would lose its type.
+    """
+    probe = pyarrow.struct(
+        [
+            ('step', pyarrow.string()),
+            ('ip', pyarrow.string()),
+            ('status', pyarrow.string()),
+            ('httpStatusCode', pyarrow.int64()),
+            ('rateLimited', pyarrow.bool_())
+        ]
+        + [(phase, pyarrow.float64()) for phase in PROBE_PHASES]
+    )
+    return pyarrow.schema([
+        ('requestId', pyarrow.string()),
+        ('target', pyarrow.string()),
+        ('jobId', pyarrow.string()),
+        ('startedAt', pyarrow.string()),
+        ('finishedAt', pyarrow.string()),
+        ('overallStatus', pyarrow.string()),
+        ('timedOut', pyarrow.bool_()),
+        ('endToEndMs', pyarrow.float64()),
+        ('dnsStatus', pyarrow.string()),
+        ('httpStatus', pyarrow.string()),
+        ('httpsStatus', pyarrow.string()),
+        ('timings', pyarrow.map_(pyarrow.string(), pyarrow.float64())),
+        ('probes', pyarrow.list_(probe))
+    ])
+
+
+def encode_parquet(rows):
+    """Parquet file of rows; needs pyarrow in the layer or the function package"""
+    import io
+    import pyarrow
+    import pyarrow.parquet
+
+    output = io.BytesIO()
+    table = pyarrow.Table.from_pylist(rows, schema=parquet_schema(pyarrow))
+    pyarrow.parquet.write_table(table, output, compression='zstd')
+    return output.getvalue()
+
+
+def write_partition(s3, key_prefix, rows):
+    """Upload one partition's rows of this batch; returns the object key"""
+    if history_format() == 'parquet':
+        key = f'{key_prefix}.parquet'
+        s3.put_object(
+            Bucket=history_bucket(), Key=key, Body=encode_parquet(rows),
+            ContentType='application/vnd.apache.parquet'
+        )
+    else:
+        key = f'{key_prefix}.ndjson.gz'
+        s3.put_object(
+            Bucket=history_bucket(), Key=key, Body=encode_ndjson(rows),
+            ContentType='application/x-ndjson', ContentEncoding='gzip'
+        )
+    return key
+
+
+@metrics.instrumented('history')
+def lambda_handler(event, context):
+    """Exports finished validations from the table's stream into the history bucket
+
+    One object per date/target partition and batch, named after the first
+    stream record in it, so a retried batch overwrites what it wrote before.
+    Delivery is still at least once (a shard is retried from the earliest
+    failed record on); readers drop duplicate requestIds.
+    """
+    table_name = os.environ.get('DYNAMODB_TABLE', 'dnscheck-validations')
+    table = metrics.TimedCalls(clients.resource('dynamodb').Table(table_name), 'DynamoDBLatency')
+    records = event.get('Records', [])
+
+    failed = []
+    partitions = defaultdict(list)
+
+    for record in records:
+        sequence = record['dynamodb']['SequenceNumber']
+        try:
+            validation = completed_validation(record, table)
+            if validation is None:
+                continue
+            row = build_row(*validation)
+        except Exception as e:
+            print(f"Error exporting stream record {sequence}: {str(e)}")
+            failed.append(sequence)
+            continue
+        partitions[partition_prefix(row)].append((sequence, row))
+
+    s3 = metrics.TimedCalls(clients.client('s3'), 'S3Latency')
+    exported = 0
+
+    for prefix, entries in partitions.items():
+        try:
+            write_partition(s3, f'{prefix}/{entries[0][0]}', [row for _, row in entries])
+            exported += len(entries)
+        except Exception as e:
+            print(f"Error writing {prefix}: {str(e)}")
+            failed.extend(sequence for sequence, _ in entries)
+
+    invocation = metrics.current()
+    invocation.count('Records', len(records))
+    invocation.count('HistoryRows', exported)
+    invocation.count('HistoryFiles', len(partitions))
+    invocation.set_status('partial' if failed else 'ok')
+
+    print(json.dumps({
+        'historyExport': {
+            'records': len(records),
+            'rows': exported,
+            'partitions': len(partitions),
+            'failed': len(failed)
+        }
+    }))
+
+    # Lambda retries the shard from the earliest failed record on
+    return {
+        'batchItemFailures': [{'itemIdentifier': min(failed, key=int)}] if failed else []
+    }
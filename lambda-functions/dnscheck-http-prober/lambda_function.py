@@ -1,22 +1,123 @@
 import json
 import os
-import urllib.request
-import urllib.error
-import boto3
+import socket
+import time
 from datetime import datetime
 
-eventbridge = boto3.client('events')
+# Shared layer: tuned client pool, event emission with retries, EMF metrics
+from dnscheck_common import deadlines, events, metrics, pinned, probes, ratelimit, redirects
+
+USER_AGENT = 'dnscheck-http-prober/1.0'
+
+# Connections stay open so redirects to the same origin can reuse them
+REQUEST_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': '*/*'
+}
+
+# Response bodies are read (for transfer timing) up to this many bytes
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', '1048576'))
+
+
+def probe_ip(target, ip, timeout, connections=None):
+    """Send GET / to one address with the target as Host header
+
+    Phases are timed separately with a monotonic clock: TCP connect, time to
+    first byte (request sent until response headers) and body transfer.
+    Redirects are then followed hop by hop (see dnscheck_common.redirects),
+    timed together as the redirects phase. The connection and redirect
+    chain are added to connections (by IP) so they can be aborted. Without
+    an IP, the OS resolves the target.
+    """
+    started = time.perf_counter()
+    status_code = None
+    error_message = None
+    body_bytes = None
+
+    port = int(os.environ.get('HTTP_PORT', '80'))
+    conn = pinned.PinnedHTTPConnection(target, ip, port=port, timeout=timeout)
+    chain = redirects.Chain(
+        redirects.url_for('http', target, port), pinned.hop_connections(target, ip, timeout),
+        REQUEST_HEADERS, MAX_BODY_BYTES
+    )
+    chain.add_connection(conn)
+    if connections is not None:
+        connections[ip] = (conn, chain)
+    phases = conn.phases
+    try:
+        conn.connect()
+
+        request_started = time.perf_counter()
+        conn.request('GET', '/', headers=REQUEST_HEADERS)
+        response = conn.getresponse()
+        phases['ttfb'] = probes.elapsed_ms(request_started)
+        status_code = response.status
+
+        transfer_started = time.perf_counter()
+        body_bytes = len(response.read(MAX_BODY_BYTES))
+        phases['transfer'] = probes.elapsed_ms(transfer_started)
+        if not response.isclosed():
+            conn.close()
+
+        location = response.getheader('Location')
+        chain.record(status_code, location, probes.elapsed_ms(started), False)
+
+        redirects_started = time.perf_counter()
+        try:
+            status_code, final_bytes = chain.follow(status_code, location)
+        except Exception:
+            # The chain broke off, so there is no final status
+            status_code = None
+            raise
+        if final_bytes is not None:
+            body_bytes = final_bytes
+            phases['redirects'] = probes.elapsed_ms(redirects_started)
+    except socket.timeout:
+        error_message = 'timed out'
+    except Exception as e:
+        error_message = str(e) or type(e).__name__
+    finally:
+        chain.close()
+
+    phases['total'] = probes.elapsed_ms(started)
+
+    if status_code and 200 <= status_code < 400:
+        status = 'ok'
+    elif status_code and status_code >= 400:
+        status = 'warn'
+        error_message = f"HTTP {status_code}"
+    else:
+        status = 'fail'
+        error_message = error_message or 'Connection failed'
+
+    result = {
+        'ip': ip,
+        'status': status,
+        'timings': phases
+    }
+
+    if status_code:
+        result['httpStatusCode'] = status_code
+
+    if body_bytes is not None:
+        result['bytes'] = body_bytes
+
+    if any('location' in hop for hop in chain.hops):
+        result['redirects'] = chain.hops
 
+    if error_message:
+        result['reason'] = error_message
+
+    return result
+
+
+@metrics.instrumented('http')
 def lambda_handler(event, context):
     """Checks HTTP endpoint and emits HTTPChecked event"""
 
     try:
         # Parse EventBridge event
-        # Handle both string and dict formats
-        if isinstance(event.get('detail'), str):
-            detail = json.loads(event['detail'])
-        else:
-            detail = event.get('detail', {})
+        detail = events.parse_detail(event)
 
         request_id = detail.get('requestId', '')
         target = detail.get('target', '')
@@ -24,61 +125,59 @@ def lambda_handler(event, context):
 
         if not ip_addresses:
             # No IPs to check
+            metrics.current().set_status('skipped')
             return {
                 'statusCode': 200,
                 'body': json.dumps({'message': 'No IP addresses to check'})
             }
 
-        # Timeout from environment (seconds)
-        timeout = int(os.environ.get('HTTP_TIMEOUT', '10'))
+        # The request's end-to-end deadline, or this invocation's end if sooner
+        deadline = deadlines.for_event(detail, context)
 
-        start_time = datetime.utcnow()
+        # per-ip probes every resolved address; hostname is the original behaviour
+        probe_mode = os.environ.get('PROBE_MODE', 'per-ip')
 
-        # Try HTTP on first IP
-        http_url = f"http://{target}"
-        status_code = None
-        error_message = None
+        # Addresses to probe, which also decides the rate limit buckets
+        addresses = [] if probe_mode == 'hostname' else probes.select_addresses(ip_addresses)
 
-        try:
-            req = urllib.request.Request(http_url)
-            req.add_header('User-Agent', 'dnscheck-http-prober/1.0')
+        # Wait for the per-host/per-IP rate limits before connecting. The
+        # wait is reported as httpWait, apart from the probe's latency
+        waited, acquired = ratelimit.wait(target, addresses, deadline.remaining())
 
-            with urllib.request.urlopen(req, timeout=timeout) as response:
-                status_code = response.getcode()
+        # Timeout from environment (seconds), cut short by the deadline
+        timeout = deadline.cap(int(os.environ.get('HTTP_TIMEOUT', '10')))
 
-        except urllib.error.HTTPError as e:
-            status_code = e.code
-            if status_code >= 400:
-                error_message = f"HTTP {status_code}"
-        except urllib.error.URLError as e:
-            error_message = str(e.reason) if hasattr(e, 'reason') else str(e)
-        except Exception as e:
-            error_message = str(e)
+        started = time.perf_counter()
 
-        end_time = datetime.utcnow()
-        duration_ms = int((end_time - start_time).total_seconds() * 1000)
-
-        # Determine status
-        if status_code and 200 <= status_code < 400:
-            status = 'ok'
-        elif status_code and status_code >= 400:
-            status = 'warn'
-            error_message = f"HTTP {status_code}"
+        results = None
+        probed = []
+        if deadline.expired():
+            # Report right away instead of probing with no time left
+            status, status_code, error_message = 'timeout', None, 'Deadline exceeded before probing'
         else:
-            status = 'fail'
-            error_message = error_message or 'Connection failed'
+            # hostname mode is one probe letting the OS resolve the target
+            probed = probes.probe_all(
+                [None] if probe_mode == 'hostname' else addresses,
+                lambda ip, connections: probe_ip(target, ip, timeout, connections),
+                deadline
+            )
+            status, status_code, error_message = probes.combine_results(probed)
+            if probe_mode != 'hostname':
+                results = probed
 
-        # Emit HTTPChecked event
-        eventbus_name = os.environ.get('EVENTBUS_NAME', 'dns-checks')
+        end_time = datetime.utcnow()
+        duration_ms = probes.elapsed_ms(started)
 
         event_detail = {
             'requestId': request_id,
             'target': target,
             'status': status,
             'timings': {
-                'http': duration_ms
+                'http': duration_ms,
+                **probes.phase_timings(probed, 'http')
             },
-            'timestamp': end_time.isoformat() + 'Z'
+            'timestamp': end_time.isoformat() + 'Z',
+            **events.passthrough(detail)
         }
 
         if status_code:
@@ -87,14 +186,26 @@ def lambda_handler(event, context):
         if error_message:
             event_detail['reason'] = error_message
 
-        eventbridge.put_events(
-            Entries=[{
-                'Source': 'dnscheck.http-prober',
-                'DetailType': 'HTTPChecked',
-                'Detail': json.dumps(event_detail),
-                'EventBusName': eventbus_name
-            }]
-        )
+        # Redirect hops of the slowest address, like the phase timings
+        if probed and 'redirects' in probes.slowest_result(probed):
+            event_detail['redirects'] = probes.slowest_result(probed)['redirects']
+
+        if waited is not None:
+            event_detail['timings']['httpWait'] = waited
+
+        if not acquired:
+            event_detail['rateLimited'] = True
+
+        if results is not None:
+            event_detail['results'] = results
+
+        invocation = metrics.current()
+        invocation.add_timings(event_detail['timings'])
+        invocation.count('Addresses', len(results) if results is not None else 1)
+        invocation.set_status(status)
+        invocation.count('RateLimitExceeded', 0 if acquired else 1)
+
+        events.emit('dnscheck.http-prober', 'HTTPChecked', event_detail)
 
         return {
             'statusCode': 200,
@@ -1,23 +1,150 @@
 import json
 import os
-import urllib.request
-import urllib.error
+import socket
 import ssl
-import boto3
+import time
 from datetime import datetime
 
-eventbridge = boto3.client('events')
+# Shared layer: tuned client pool, event emission with retries, EMF metrics
+from dnscheck_common import deadlines, events, metrics, pinned, probes, ratelimit, redirects
 
+USER_AGENT = 'dnscheck-https-prober/1.0'
+
+# Connections stay open so redirects to the same origin can reuse them
+REQUEST_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': '*/*'
+}
+
+# Response bodies are read (for transfer timing) up to this many bytes
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', '1048576'))
+
+
+def probe_ip(target, ip, timeout, ctx, connections=None):
+    """Send GET / over TLS to one address with the target as SNI and Host header
+
+    Phases are timed separately with a monotonic clock: TCP connect, TLS
+    handshake, time to first byte (request sent until response headers) and
+    body transfer. Redirects are then followed hop by hop (see
+    dnscheck_common.redirects), timed together as the redirects phase. The
+    connection and redirect chain are added to connections (by IP) so they
+    can be aborted. Without an IP, the OS resolves the target.
+    """
+    started = time.perf_counter()
+    status_code = None
+    error_message = None
+    ssl_valid = None
+    body_bytes = None
+
+    port = int(os.environ.get('HTTPS_PORT', '443'))
+    conn = pinned.PinnedHTTPSConnection(target, ip, ctx, port=port, timeout=timeout)
+    chain = redirects.Chain(
+        redirects.url_for('https', target, port), pinned.hop_connections(target, ip, timeout),
+        REQUEST_HEADERS, MAX_BODY_BYTES
+    )
+    chain.add_connection(conn)
+    if connections is not None:
+        connections[ip] = (conn, chain)
+    phases = conn.phases
+    try:
+        conn.connect()
+        ssl_valid = True
+
+        request_started = time.perf_counter()
+        conn.request('GET', '/', headers=REQUEST_HEADERS)
+        response = conn.getresponse()
+        phases['ttfb'] = probes.elapsed_ms(request_started)
+        status_code = response.status
+
+        # TLS 1.3 session tickets arrive after the handshake, so the session is
+        # only worth caching once the response has started; once the server
+        # closes the connection, the session goes with it
+        pinned.store_tls_session(ip, target, conn.tls_sock.session)
+
+        transfer_started = time.perf_counter()
+        body_bytes = len(response.read(MAX_BODY_BYTES))
+        phases['transfer'] = probes.elapsed_ms(transfer_started)
+        if not response.isclosed():
+            conn.close()
+
+        location = response.getheader('Location')
+        chain.record(status_code, location, probes.elapsed_ms(started), False)
+
+        redirects_started = time.perf_counter()
+        try:
+            status_code, final_bytes = chain.follow(status_code, location)
+        except Exception:
+            # The chain broke off, so there is no final status
+            status_code = None
+            raise
+        if final_bytes is not None:
+            body_bytes = final_bytes
+            phases['redirects'] = probes.elapsed_ms(redirects_started)
+    except ssl.SSLError as e:
+        ssl_valid = False
+        error_message = f"SSL error: {str(e)}"
+    except socket.timeout:
+        error_message = 'timed out'
+        ssl_valid = ssl_valid or False
+    except Exception as e:
+        error_message = str(e) or type(e).__name__
+        ssl_valid = ssl_valid or False
+    finally:
+        chain.close()
+
+    phases['total'] = probes.elapsed_ms(started)
+
+    # Determine status
+    if ssl_valid and status_code and 200 <= status_code < 400:
+        status = 'ok'
+    elif ssl_valid and status_code and status_code >= 400:
+        status = 'warn'
+        error_message = f"HTTP {status_code}"
+    elif not ssl_valid:
+        status = 'fail'
+        error_message = error_message or 'SSL validation failed'
+    else:
+        status = 'fail'
+        error_message = error_message or 'Connection failed'
+
+    result = {
+        'ip': ip,
+        'status': status,
+        'sslValid': ssl_valid,
+        'timings': phases
+    }
+
+    if conn.tls_resumed is not None:
+        result['tlsResumed'] = conn.tls_resumed
+
+    if status_code:
+        result['httpStatusCode'] = status_code
+
+    if body_bytes is not None:
+        result['bytes'] = body_bytes
+
+    if any('location' in hop for hop in chain.hops):
+        result['redirects'] = chain.hops
+
+    if error_message:
+        result['reason'] = error_message
+
+    return result
+
+
+def ssl_validity(results):
+    """Whether every finished address had a valid certificate, None if none finished"""
+    finished = [r['sslValid'] for r in results if r['status'] != 'timeout']
+    return all(finished) if finished else None
+
+
+@metrics.instrumented('https')
 def lambda_handler(event, context):
     """Checks HTTPS endpoint and emits HTTPSChecked event"""
 
     try:
         # Parse EventBridge event
-        # Handle both string and dict formats
-        if isinstance(event.get('detail'), str):
-            detail = json.loads(event['detail'])
-        else:
-            detail = event.get('detail', {})
+        detail = events.parse_detail(event)
 
         request_id = detail.get('requestId', '')
         target = detail.get('target', '')
@@ -25,75 +152,64 @@ def lambda_handler(event, context):
 
         if not ip_addresses:
             # No IPs to check
+            metrics.current().set_status('skipped')
             return {
                 'statusCode': 200,
                 'body': json.dumps({'message': 'No IP addresses to check'})
             }
 
-        # Timeout from environment (seconds)
-        timeout = int(os.environ.get('HTTPS_TIMEOUT', '10'))
+        # The request's end-to-end deadline, or this invocation's end if sooner
+        deadline = deadlines.for_event(detail, context)
 
-        start_time = datetime.utcnow()
+        # per-ip probes every resolved address; hostname is the original behaviour
+        probe_mode = os.environ.get('PROBE_MODE', 'per-ip')
 
-        # Try HTTPS on first IP
-        https_url = f"https://{target}"
-        status_code = None
-        error_message = None
-        ssl_valid = None
+        # Addresses to probe, which also decides the rate limit buckets
+        addresses = [] if probe_mode == 'hostname' else probes.select_addresses(ip_addresses)
 
-        try:
-            # Create SSL context
-            ctx = ssl.create_default_context()
-
-            req = urllib.request.Request(https_url)
-            req.add_header('User-Agent', 'dnscheck-https-prober/1.0')
-
-            with urllib.request.urlopen(req, timeout=timeout, context=ctx) as response:
-                status_code = response.getcode()
-                ssl_valid = True
-
-        except ssl.SSLError as e:
-            ssl_valid = False
-            error_message = f"SSL error: {str(e)}"
-        except urllib.error.HTTPError as e:
-            status_code = e.code
-            ssl_valid = True  # SSL worked, but HTTP error
-            if status_code >= 400:
-                error_message = f"HTTP {status_code}"
-        except urllib.error.URLError as e:
-            error_message = str(e.reason) if hasattr(e, 'reason') else str(e)
-            ssl_valid = False
-        except Exception as e:
-            error_message = str(e)
-            ssl_valid = False
+        # Wait for the per-host/per-IP rate limits before connecting. The
+        # wait is reported as httpsWait, apart from the probe's latency
+        waited, acquired = ratelimit.wait(target, addresses, deadline.remaining())
 
-        end_time = datetime.utcnow()
-        duration_ms = int((end_time - start_time).total_seconds() * 1000)
-
-        # Determine status
-        if ssl_valid and status_code and 200 <= status_code < 400:
-            status = 'ok'
-        elif ssl_valid and status_code and status_code >= 400:
-            status = 'warn'
-            error_message = f"HTTP {status_code}"
-        elif not ssl_valid:
-            status = 'fail'
-            error_message = error_message or 'SSL validation failed'
+        # Timeout from environment (seconds), cut short by the deadline
+        timeout = deadline.cap(int(os.environ.get('HTTPS_TIMEOUT', '10')))
+
+        started = time.perf_counter()
+
+        # Shared per-container SSL context
+        ctx = pinned.get_ssl_context()
+
+        results = None
+        probed = []
+        if deadline.expired():
+            # Report right away instead of probing with no time left
+            status, status_code, ssl_valid, error_message = 'timeout', None, None, 'Deadline exceeded before probing'
         else:
-            status = 'fail'
-            error_message = error_message or 'Connection failed'
+            # hostname mode is one probe letting the OS resolve the target
+            probed = probes.probe_all(
+                [None] if probe_mode == 'hostname' else addresses,
+                lambda ip, connections: probe_ip(target, ip, timeout, ctx, connections),
+                deadline,
+                unfinished={'sslValid': None}
+            )
+            status, status_code, error_message = probes.combine_results(probed)
+            ssl_valid = ssl_validity(probed)
+            if probe_mode != 'hostname':
+                results = probed
 
-        # Emit HTTPSChecked event
-        eventbus_name = os.environ.get('EVENTBUS_NAME', 'dns-checks')
+        end_time = datetime.utcnow()
+        duration_ms = probes.elapsed_ms(started)
 
         event_detail = {
             'requestId': request_id,
             'target': target,
             'status': status,
             'timings': {
-                'https': duration_ms
+                'https': duration_ms,
+                **probes.phase_timings(probed, 'https')
             },
-            'timestamp': end_time.isoformat() + 'Z'
+            'timestamp': end_time.isoformat() + 'Z',
+            **events.passthrough(detail)
         }
 
         if status_code:
@@ -105,14 +221,34 @@ def lambda_handler(event, context):
         if error_message:
             event_detail['reason'] = error_message
 
-        eventbridge.put_events(
-            Entries=[{
-                'Source': 'dnscheck.https-prober',
-                'DetailType': 'HTTPSChecked',
-                'Detail': json.dumps(event_detail),
-                'EventBusName': eventbus_name
-            }]
-        )
+        # Redirect hops of the slowest address, like the phase timings
+        if probed and 'redirects' in probes.slowest_result(probed):
+            event_detail['redirects'] = probes.slowest_result(probed)['redirects']
+
+        if waited is not None:
+            event_detail['timings']['httpsWait'] = waited
+
+        if not acquired:
+            event_detail['rateLimited'] = True
+
+        if results is not None:
+            event_detail['results'] = results
+
+            # Resumed handshakes are much cheaper, so report them to separate
+            # handshake cost from server latency
+            handshakes = [r['tlsResumed'] for r in results if 'tlsResumed' in r]
+            if handshakes:
+                event_detail['tlsResumed'] = all(handshakes)
+                event_detail['tlsSessionsResumed'] = sum(handshakes)
+
+        invocation = metrics.current()
+        invocation.add_timings(event_detail['timings'])
+        invocation.count('Addresses', len(results) if results is not None else 1)
+        invocation.set_status(status)
+        invocation.count('RateLimitExceeded', 0 if acquired else 1)
+        invocation.count('TLSSessionsResumed', event_detail.get('tlsSessionsResumed', 0))
+
+        events.emit('dnscheck.https-prober', 'HTTPSChecked', event_detail)
 
         return {
             'statusCode': 200,
@@ -1,27 +1,159 @@
 import json
 import os
+import time
 import ipaddress
+from bisect import bisect_right
 
+# Shared layer: tuned client pool (boto3 is only imported if SSM is used), EMF metrics
+from dnscheck_common import clients, metrics
+
+# Compiled allowlist, kept for the life of the container:
+# {'signature': (file, mtime), 'loadedAt': ..., 'ranges': {4: (starts, ends), 6: (starts, ends)}}
+_allowlist = None
+
+
+def parse_entries(text):
+    """IPs/CIDRs from comma, whitespace or newline separated text; '#' starts a comment"""
+    entries = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        entries.extend(entry for entry in line.replace(',', ' ').split() if entry)
+    return entries
+
+
+def compile_allowlist(entries):
+    """Merge entries into sorted, non-overlapping integer ranges per IP version
+
+    Returns {4: (starts, ends), 6: (starts, ends)}. Invalid entries are
+    skipped, as before.
+    """
+    ranges = {4: [], 6: []}
+
+    for entry in entries:
+        try:
+            # A bare address is a /32 or /128 network
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            continue
+        ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+
+    compiled = {}
+    for version, spans in ranges.items():
+        starts, ends = [], []
+        for start, end in sorted(spans):
+            # Overlapping or adjacent: extend the previous range
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        compiled[version] = (starts, ends)
+
+    return compiled
+
+
+def is_allowed(ranges, source_ip):
+    """O(log n) membership test against compiled ranges"""
+    address = ipaddress.ip_address(source_ip)
+
+    # IPv4 clients can show up as IPv4-mapped IPv6 addresses
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+
+    starts, ends = ranges[address.version]
+    value = int(address)
+    i = bisect_right(starts, value) - 1
+    return i >= 0 and value <= ends[i]
+
+
+def file_signature(path):
+    """(path, mtime) of ALLOWED_IPS_FILE, so an updated file is recompiled"""
+    try:
+        return path, os.stat(path).st_mtime if path else None
+    except OSError:
+        return path, None
+
+
+def load_parameter(name):
+    """StringList/String SSM parameter value"""
+    response = clients.client('ssm').get_parameter(Name=name, WithDecryption=True)
+    return response['Parameter']['Value']
+
+
+def load_allowlist():
+    """Compiled allowlist from ALLOWED_IPS, ALLOWED_IPS_FILE and ALLOWED_IPS_PARAMETER
+
+    Compiled once per container and reused. It is rebuilt when the file
+    changes, or every ALLOWED_IPS_REFRESH_SECONDS when an SSM parameter is
+    configured.
+    """
+    global _allowlist
+
+    # Environment variables can't change within a container, so only the file
+    # and the SSM refresh interval are checked on each call (reading a large
+    # ALLOWED_IPS from os.environ is itself O(n))
+    path = os.environ.get('ALLOWED_IPS_FILE', '')
+    parameter = os.environ.get('ALLOWED_IPS_PARAMETER', '')
+    signature = file_signature(path)
+
+    if _allowlist is not None and _allowlist['signature'] == signature:
+        refresh = float(os.environ.get('ALLOWED_IPS_REFRESH_SECONDS', '300'))
+        if not parameter or time.monotonic() - _allowlist['loadedAt'] < refresh:
+            return _allowlist['ranges']
+
+    entries = parse_entries(os.environ.get('ALLOWED_IPS', ''))
+
+    if path:
+        try:
+            with open(path) as f:
+                entries.extend(parse_entries(f.read()))
+        except OSError as e:
+            print(f"Error reading ALLOWED_IPS_FILE: {str(e)}")
+
+    if parameter:
+        try:
+            entries.extend(parse_entries(load_parameter(parameter)))
+        except Exception as e:
+            print(f"Error loading ALLOWED_IPS_PARAMETER: {str(e)}")
+            # Keep serving the last good list rather than locking everyone out,
+            # and don't retry SSM before the next refresh
+            if _allowlist is not None:
+                _allowlist['loadedAt'] = time.monotonic()
+                return _allowlist['ranges']
+
+    ranges = compile_allowlist(entries)
+    _allowlist = {'signature': signature, 'loadedAt': time.monotonic(), 'ranges': ranges}
+
+    print(json.dumps({
+        'allowlist': {
+            'entries': len(entries),
+            'ipv4Ranges': len(ranges[4][0]),
+            'ipv6Ranges': len(ranges[6][0])
+        }
+    }))
+
+    return ranges
+
+
+@metrics.instrumented('authorizer')
 def lambda_handler(event, context):
     """
     Lambda authorizer for API Gateway v2 that validates source IP addresses.
 
-    Expected environment variables:
+    Expected environment variables (any combination):
     - ALLOWED_IPS: Comma-separated list of IP addresses/CIDR blocks to allow
+    - ALLOWED_IPS_FILE: Path to a file of IP addresses/CIDR blocks (e.g. in a layer)
+    - ALLOWED_IPS_PARAMETER: SSM parameter name holding IP addresses/CIDR blocks
     """
 
     # Get request ID for context
     request_id = event.get('requestContext', {}).get('requestId', 'unknown')
 
-    # Get allowed IPs from environment variable
-    allowed_ips_str = os.environ.get('ALLOWED_IPS', '')
-    if not allowed_ips_str:
+    ranges = load_allowlist()
+    if not ranges[4][0] and not ranges[6][0]:
         # Default deny if no allowed IPs configured
         return generate_policy('Deny', request_id)
 
-    # Parse allowed IPs
-    allowed_ips = [ip.strip() for ip in allowed_ips_str.split(',') if ip.strip()]
-
     # Extract source IP from request context (HTTP API v2 format)
     request_context = event.get('requestContext', {})
     source_ip = request_context.get('http', {}).get('sourceIp')
@@ -32,39 +164,20 @@ def lambda_handler(event, context):
 
     # Check if source IP is in allowed list
     try:
-        source_ip_addr = ipaddress.ip_address(source_ip)
-        is_allowed = False
-
-        for allowed_ip in allowed_ips:
-            try:
-                # Try as CIDR block first
-                if '/' in allowed_ip:
-                    network = ipaddress.ip_network(allowed_ip, strict=False)
-                    if source_ip_addr in network:
-                        is_allowed = True
-                        break
-                else:
-                    # Try as single IP
-                    allowed_ip_addr = ipaddress.ip_address(allowed_ip)
-                    if source_ip_addr == allowed_ip_addr:
-                        is_allowed = True
-                        break
-            except (ValueError, ipaddress.AddressValueError):
-                # Invalid IP format in allowed list, skip
-                continue
-
-        if is_allowed:
+        if is_allowed(ranges, source_ip):
             return generate_policy('Allow', request_id)
         else:
             return generate_policy('Deny', request_id)
 
-    except (ValueError, ipaddress.AddressValueError):
+    except ValueError:
         # Invalid source IP format, deny
         return generate_policy('Deny', request_id)
 
 
 def generate_policy(effect, request_id):
     """Generate an IAM policy for API Gateway HTTP API v2 REQUEST authorizer"""
+    metrics.current().set_status('allowed' if effect == 'Allow' else 'denied')
+
     # HTTP API v2 uses IAM policy format for REQUEST authorizers
     policy_document = {
         'Version': '2012-10-17',
@@ -1,10 +1,43 @@
+import base64
+import hashlib
 import json
 import os
-import boto3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from datetime import datetime
 
-dynamodb = boto3.resource('dynamodb')
+# Shared layer: tuned client pool (created on first use, not at import time), EMF metrics
+from dnscheck_common import clients, metrics, results
+
+# Completed validations never change once SUMMARY exists, so their serialized
+# /status body is kept per container: requestId -> (body, etag)
+COMPLETED_CACHE = OrderedDict()
+
+# Finished results can be cached by the browser indefinitely; private keeps
+# shared caches and CDNs from serving them past the IP allowlist authorizer
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+PENDING_CACHE_CONTROL = 'no-cache'
+
+# GET /recent page size
+RECENT_DEFAULT_LIMIT = 10
+RECENT_MAX_LIMIT = 100
+
+# Long-poll / event-stream re-read backoff (seconds)
+LONG_POLL_MIN_DELAY = 0.1
+LONG_POLL_MAX_DELAY = 1.0
+# Time left for serializing the response before the Lambda timeout
+LONG_POLL_SAFETY_MARGIN = 2.0
+
+# How soon EventSource reconnects after each /status/stream response
+SSE_RETRY_MS = 100
+
+# POST /status/batch limits
+BATCH_MAX_REQUEST_IDS = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+# LastEvaluatedKey attributes of the byTargetSummary index (table + index keys)
+RECENT_CURSOR_KEYS = {'requestId', 'step', 'summaryTarget', 'finishedAt'}
 
 def decimal_default(obj):
     """Convert Decimal to int/float for JSON serialization"""
@@ -12,23 +45,401 @@ def decimal_default(obj):
         return int(obj) if obj % 1 == 0 else float(obj)
     raise TypeError
 
+class ClientTable:
+    """The subset of the resource Table API used here, on the low-level client
+
+    Skips the resource layer's model loading and generic (de)serializers;
+    attribute values are marshalled directly.
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def get_item(self, Key, **kwargs):
+        response = self.client.get_item(TableName=self.name, Key=results.serialize_item(Key), **kwargs)
+        if 'Item' in response:
+            response['Item'] = results.deserialize_item(response['Item'])
+        return response
+
+    def query(self, **kwargs):
+        if 'ExpressionAttributeValues' in kwargs:
+            kwargs['ExpressionAttributeValues'] = results.serialize_item(kwargs['ExpressionAttributeValues'])
+        if 'ExclusiveStartKey' in kwargs:
+            kwargs['ExclusiveStartKey'] = results.serialize_item(kwargs['ExclusiveStartKey'])
+
+        response = self.client.query(TableName=self.name, **kwargs)
+
+        response['Items'] = [results.deserialize_item(item) for item in response.get('Items', [])]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = results.deserialize_item(response['LastEvaluatedKey'])
+        return response
+
+
+def get_dynamodb():
+    """Low-level client (default) or resource, per DYNAMODB_API, shared per container"""
+    if os.environ.get('DYNAMODB_API', 'client') == 'resource':
+        return 'resource', clients.resource('dynamodb')
+    return 'client', clients.client('dynamodb')
+
+
+def get_table(table_name):
+    api, dynamodb = get_dynamodb()
+    if api == 'resource':
+        return dynamodb.Table(table_name)
+    return ClientTable(dynamodb, table_name)
+
+
+def batch_get_item(request_items):
+    """BatchGetItem with plain Python keys and items, whichever API is in use"""
+    api, dynamodb = get_dynamodb()
+    if api == 'resource':
+        return dynamodb.batch_get_item(RequestItems=request_items)
+
+    response = dynamodb.batch_get_item(RequestItems={
+        name: dict(request, Keys=[results.serialize_item(key) for key in request['Keys']])
+        for name, request in request_items.items()
+    })
+    return {
+        'Responses': {
+            name: [results.deserialize_item(item) for item in items]
+            for name, items in response.get('Responses', {}).items()
+        },
+        'UnprocessedKeys': {
+            name: dict(request, Keys=[results.deserialize_item(key) for key in request['Keys']])
+            for name, request in (response.get('UnprocessedKeys') or {}).items()
+        }
+    }
+
+
+def encode_cursor(last_evaluated_key):
+    """Opaque pagination cursor from a LastEvaluatedKey (all string attributes)"""
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key, sort_keys=True).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """LastEvaluatedKey from a cursor, or None if it is malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(key, dict) or set(key) != RECENT_CURSOR_KEYS:
+        return None
+    if not all(isinstance(value, str) for value in key.values()):
+        return None
+    return key
+
+
+def batch_get_summaries(table_name, request_ids):
+    """Summaries for request_ids, fetched in parallel BatchGetItem chunks
+
+    Returns (summaries by requestId, requestIds still unprocessed after
+    retrying UnprocessedKeys with exponential backoff). In the single storage
+    layout the RESULT items are read, and only requests without one (stored
+    before the switch) fall back to their SUMMARY items.
+    """
+    if results.layout() != results.SINGLE:
+        found, unprocessed = batch_get_steps(table_name, request_ids, 'SUMMARY')
+        return {request_id: results.public(item) for request_id, item in found.items()}, unprocessed
+
+    found, unprocessed = batch_get_steps(table_name, request_ids, results.RESULT_STEP)
+    summaries = {}
+    for request_id, item in found.items():
+        summary = results.summary(item)
+        if summary is not None:
+            summaries[request_id] = summary
+
+    missing = [request_id for request_id in request_ids if request_id not in found and request_id not in unprocessed]
+    if missing:
+        fetched, missed = batch_get_steps(table_name, missing, 'SUMMARY')
+        summaries.update((request_id, results.public(item)) for request_id, item in fetched.items())
+        unprocessed.extend(missed)
+
+    return summaries, unprocessed
+
+
+def batch_get_steps(table_name, request_ids, step):
+    """The step items of request_ids, fetched in parallel BatchGetItem chunks
+
+    Returns (items by requestId, requestIds still unprocessed after retrying
+    UnprocessedKeys with exponential backoff).
+    """
+    chunk_size = int(os.environ.get('BATCH_GET_CHUNK_SIZE', '25'))
+    chunks = [request_ids[i:i + chunk_size] for i in range(0, len(request_ids), chunk_size)]
+
+    def fetch(chunk):
+        found = []
+        request = {
+            table_name: {
+                'Keys': [{'requestId': request_id, 'step': step} for request_id in chunk]
+            }
+        }
+
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(0.05 * 2 ** (attempt - 1))
+            response = batch_get_item(request)
+            found.extend(response['Responses'].get(table_name, []))
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+
+        unprocessed = [key['requestId'] for key in request.get(table_name, {}).get('Keys', [])]
+        return found, unprocessed
+
+    items = {}
+    unprocessed = []
+
+    if not chunks:
+        return items, unprocessed
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        for found, missed in executor.map(fetch, chunks):
+            items.update((item['requestId'], item) for item in found)
+            unprocessed.extend(missed)
+
+    return items, unprocessed
+
+
+def read_request(table, request_id, consistent_read=False):
+    """(SUMMARY item or None, step items oldest first) of one request
+
+    In the single storage layout that is one GetItem of the RESULT item.
+    Requests without one, stored in the items layout (before a switch, or
+    with the items layout in use), are read with a Query of all their items.
+    """
+    if results.layout() == results.SINGLE:
+        item = table.get_item(
+            Key={
+                'requestId': request_id,
+                'step': results.RESULT_STEP
+            },
+            ConsistentRead=consistent_read
+        ).get('Item')
+        if item:
+            return results.expand(item)
+
+    # Query all steps for this request
+    response = table.query(
+        KeyConditionExpression='requestId = :rid',
+        ExpressionAttributeValues={
+            ':rid': request_id
+        },
+        ConsistentRead=consistent_read
+    )
+
+    # Separate summary from steps
+    summary = None
+    steps = []
+
+    for item in response['Items']:
+        if item['step'] == 'SUMMARY':
+            summary = results.public(item)
+        elif item['step'] == 'PROGRESS':
+            # Aggregator bookkeeping, not a validation step
+            continue
+        elif item['step'] == results.RESULT_STEP:
+            # Stored in the single layout before switching back to items
+            result_summary, result_steps = results.expand(item)
+            summary = summary or result_summary
+            steps.extend(result_steps)
+        else:
+            steps.append(item)
+
+    # Sort steps by timestamp
+    steps.sort(key=lambda x: x.get('ts', ''))
+    return summary, steps
+
+
+def query_steps(table, request_id):
+    """All step items for one request, oldest first"""
+    return read_request(table, request_id)[1]
+
+
+def completed_cache_get(request_id):
+    cached = COMPLETED_CACHE.get(request_id)
+    if cached is not None:
+        COMPLETED_CACHE.move_to_end(request_id)
+    metrics.current().count('CacheHits' if cached is not None else 'CacheMisses')
+    return cached
+
+
+def completed_cache_put(request_id, body, etag):
+    max_size = int(os.environ.get('STATUS_CACHE_SIZE', '1024'))
+    if max_size <= 0:
+        return
+    COMPLETED_CACHE[request_id] = (body, etag)
+    COMPLETED_CACHE.move_to_end(request_id)
+    while len(COMPLETED_CACHE) > max_size:
+        COMPLETED_CACHE.popitem(last=False)
+
+
+def make_etag(body):
+    """Strong ETag derived from the serialized response body"""
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison, so W/"x" matches "x" """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+
+
+def status_response(body, etag, completed, if_none_match):
+    """200 with the body, or 304 if the client already has this version"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if completed else PENDING_CACHE_CONTROL
+    }
+
+    if etag_matches(if_none_match, etag):
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': ''
+        }
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body
+    }
+
+
+def load_status(table, request_id, consistent_read=False):
+    """Serialized /status body for a request: (body, etag, completed)"""
+    # Completed requests are served without touching DynamoDB
+    cached = completed_cache_get(request_id)
+    if cached is not None:
+        body, etag = cached
+        return body, etag, True
+
+    summary, steps = read_request(table, request_id, consistent_read)
+
+    # Flat phase breakdown across all steps (dns*, http*, https*)
+    timings = {}
+    for step in steps:
+        step.setdefault('timings', {})
+        timings.update(step['timings'])
+
+    body = json.dumps({
+        'requestId': request_id,
+        'summary': summary,
+        'steps': steps,
+        'timings': timings
+    }, default=decimal_default)
+    etag = make_etag(body)
+
+    if summary is not None:
+        completed_cache_put(request_id, body, etag)
+
+    return body, etag, summary is not None
+
+
+def max_wait_seconds():
+    return float(os.environ.get('STATUS_MAX_WAIT', '20'))
+
+
+def requested_wait(query_params, headers, default=0.0):
+    """Seconds the client is willing to wait: ?wait=N or Prefer: wait=N (RFC 7240)"""
+    value = query_params.get('wait')
+    if value is None:
+        for preference in headers.get('prefer', '').split(','):
+            name, _, argument = preference.strip().partition('=')
+            if name.strip().lower() == 'wait':
+                value = argument
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return default
+
+
+def wait_for_change(table, request_id, seen_etag, wait, context=None):
+    """Re-read the status until it differs from seen_etag, completes, or the wait runs out
+
+    The wait is capped by STATUS_MAX_WAIT and by the time the invocation has
+    left. Reads are consistent and back off from LONG_POLL_MIN_DELAY to
+    LONG_POLL_MAX_DELAY, so a fast pipeline is seen within ~100ms while a slow
+    one costs only about one read per second.
+    """
+    budget = min(wait, max_wait_seconds())
+    if context is not None:
+        budget = min(budget, context.get_remaining_time_in_millis() / 1000 - LONG_POLL_SAFETY_MARGIN)
+    deadline = time.monotonic() + budget
+    delay = LONG_POLL_MIN_DELAY
+
+    while True:
+        body, etag, completed = load_status(table, request_id, consistent_read=True)
+        if completed or not etag_matches(seen_etag, etag):
+            return body, etag, completed
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return body, etag, completed
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, LONG_POLL_MAX_DELAY)
+
+
+def sse_response(body, etag, completed, last_event_id):
+    """One text/event-stream response
+
+    Lambda's Python runtime cannot stream a response, so each invocation
+    returns as soon as there is something new: a "status" event (or
+    "complete" once SUMMARY exists), or just a keep-alive comment if the wait
+    ran out. EventSource then reconnects after `retry` ms with Last-Event-ID
+    set to the ETag it saw.
+    """
+    lines = [f'retry: {SSE_RETRY_MS}', '']
+    if etag_matches(last_event_id, etag):
+        lines += [': no change', '']
+    else:
+        lines += [f'id: {etag}', f"event: {'complete' if completed else 'status'}", f'data: {body}', '']
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': '\n'.join(lines) + '\n'
+    }
+
+
+@metrics.instrumented('status')
 def lambda_handler(event, context):
     """API Gateway handler for status queries"""
 
     try:
         table_name = os.environ.get('DYNAMODB_TABLE', 'dnscheck-validations')
-        table = dynamodb.Table(table_name)
+        table = metrics.TimedCalls(get_table(table_name), 'DynamoDBLatency')
 
         # Parse query parameters
         # API Gateway HTTP API v2: path can be in event['path'] or requestContext.http.path
         path = event.get('path', '') or event.get('requestContext', {}).get('http', {}).get('path', '') or event.get('rawPath', '')
         query_params = event.get('queryStringParameters') or {}
 
-        if path == '/status' or path.endswith('/status'):
-            # GET /status?requestId=...
-            request_id = query_params.get('requestId', '')
+        if path == '/status/batch' or path.endswith('/status/batch'):
+            # POST /status/batch {"requestIds": [...], "includeSteps": false}
+            metrics.current().set_stage('status-batch')
+            try:
+                body = json.loads(event.get('body') or '{}')
+            except json.JSONDecodeError:
+                body = None
 
-            if not request_id:
+            request_ids = body.get('requestIds') if isinstance(body, dict) else None
+
+            if (not isinstance(request_ids, list) or not request_ids
+                    or not all(isinstance(request_id, str) and request_id for request_id in request_ids)):
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -36,32 +447,59 @@ def lambda_handler(event, context):
                         'Access-Control-Allow-Origin': '*'
                     },
                     'body': json.dumps({
-                        'error': 'Missing required parameter: requestId'
+                        'error': 'requestIds must be a non-empty list of strings'
                     })
                 }
 
-            # Query all steps for this request
-            response = table.query(
-                KeyConditionExpression='requestId = :rid',
-                ExpressionAttributeValues={
-                    ':rid': request_id
+            # Keep the caller's order, drop duplicates
+            request_ids = list(dict.fromkeys(request_ids))
+
+            if len(request_ids) > BATCH_MAX_REQUEST_IDS:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': f'Too many requestIds (max {BATCH_MAX_REQUEST_IDS})'
+                    })
                 }
-            )
 
-            items = response['Items']
+            # Completed requests already cached in this container skip DynamoDB
+            summaries = {}
+            for request_id in request_ids:
+                cached = completed_cache_get(request_id)
+                if cached is not None:
+                    summaries[request_id] = json.loads(cached[0])['summary']
 
-            # Separate summary from steps
-            summary = None
-            steps = []
+            fetched, unprocessed = batch_get_summaries(
+                table_name, [request_id for request_id in request_ids if request_id not in summaries]
+            )
+            summaries.update(fetched)
 
-            for item in items:
-                if item['step'] == 'SUMMARY':
-                    summary = item
-                else:
-                    steps.append(item)
+            # Step detail only for requests that are still running
+            steps = {}
+            if body.get('includeSteps'):
+                pending = [
+                    request_id for request_id in request_ids
+                    if request_id not in summaries and request_id not in unprocessed
+                ]
+                if pending:
+                    with ThreadPoolExecutor(max_workers=min(len(pending), 16)) as executor:
+                        steps = dict(zip(pending, executor.map(lambda rid: query_steps(table, rid), pending)))
 
-            # Sort steps by timestamp
-            steps.sort(key=lambda x: x.get('ts', ''))
+            results = []
+            for request_id in request_ids:
+                if request_id in summaries:
+                    result = {'requestId': request_id, 'status': 'complete', 'summary': summaries[request_id]}
+                elif request_id in unprocessed:
+                    result = {'requestId': request_id, 'status': 'unknown', 'summary': None}
+                else:
+                    result = {'requestId': request_id, 'status': 'pending', 'summary': None}
+                    if request_id in steps:
+                        result['steps'] = steps[request_id]
+                results.append(result)
 
             return {
                 'statusCode': 200,
@@ -70,14 +508,58 @@ def lambda_handler(event, context):
                     'Access-Control-Allow-Origin': '*'
                 },
                 'body': json.dumps({
-                    'requestId': request_id,
-                    'summary': summary,
-                    'steps': steps
+                    'results': results,
+                    'complete': sum(1 for result in results if result['status'] == 'complete'),
+                    'pending': sum(1 for result in results if result['status'] == 'pending'),
+                    'unprocessed': unprocessed
                 }, default=decimal_default)
             }
 
+        elif (path == '/status' or path.endswith('/status')
+              or path == '/status/stream' or path.endswith('/status/stream')):
+            # GET /status?requestId=...[&wait=N]
+            # GET /status/stream?requestId=... (text/event-stream)
+            request_id = query_params.get('requestId', '')
+
+            if not request_id:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': 'Missing required parameter: requestId'
+                    })
+                }
+
+            # Header names are lower-case in HTTP API events
+            headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+
+            if path.endswith('/status/stream'):
+                # EventSource sends the id of the last event it received on reconnect
+                metrics.current().set_stage('status-stream')
+                seen = headers.get('last-event-id') or query_params.get('lastEventId')
+                wait = requested_wait(query_params, headers, default=max_wait_seconds())
+                body, etag, completed = wait_for_change(table, request_id, seen, wait, context)
+                return sse_response(body, etag, completed, seen)
+
+            if_none_match = headers.get('if-none-match') or query_params.get('version')
+
+            # Long poll: hold the request until the version the client has changes
+            wait = requested_wait(query_params, headers)
+            if wait and if_none_match:
+                # Held requests would swamp the plain reads' latency percentiles
+                metrics.current().set_stage('status-wait')
+                body, etag, completed = wait_for_change(table, request_id, if_none_match, wait, context)
+            else:
+                body, etag, completed = load_status(table, request_id)
+
+            return status_response(body, etag, completed, if_none_match)
+
         elif path == '/recent' or path.endswith('/recent'):
             # GET /recent?target=...
+            metrics.current().set_stage('recent')
             target = query_params.get('target', '')
 
             if not target:
@@ -92,23 +574,69 @@ def lambda_handler(event, context):
                     })
                 }
 
-            # Query GSI byTarget
-            response = table.query(
-                IndexName='byTarget',
-                KeyConditionExpression='target = :target AND begins_with(#time, :prefix)',
-                ExpressionAttributeNames={
-                    '#time': 'time'
-                },
-                ExpressionAttributeValues={
-                    ':target': target,
-                    ':prefix': '202'  # Rough filter for recent (202x dates)
-                },
-                ScanIndexForward=False,  # Descending order
-                Limit=10
-            )
+            try:
+                limit = int(query_params.get('limit', RECENT_DEFAULT_LIMIT))
+                if not 1 <= limit <= RECENT_MAX_LIMIT:
+                    raise ValueError
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': f'limit must be an integer between 1 and {RECENT_MAX_LIMIT}'
+                    })
+                }
+
+            # Time range on finishedAt (ISO 8601 strings compare chronologically)
+            since = query_params.get('since')
+            until = query_params.get('until')
+            key_condition = 'summaryTarget = :target'
+            expression_values = {':target': target}
+
+            if since and until:
+                key_condition += ' AND finishedAt BETWEEN :since AND :until'
+                expression_values.update({':since': since, ':until': until})
+            elif since:
+                key_condition += ' AND finishedAt >= :since'
+                expression_values[':since'] = since
+            elif until:
+                key_condition += ' AND finishedAt <= :until'
+                expression_values[':until'] = until
+
+            query_kwargs = {
+                'IndexName': 'byTargetSummary',
+                'KeyConditionExpression': key_condition,
+                'ExpressionAttributeValues': expression_values,
+                'ScanIndexForward': False,  # Newest first
+                'Limit': limit
+            }
+
+            if query_params.get('cursor'):
+                start_key = decode_cursor(query_params['cursor'])
+                if start_key is None or start_key.get('summaryTarget') != target:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({
+                            'error': 'Invalid cursor'
+                        })
+                    }
+                query_kwargs['ExclusiveStartKey'] = start_key
+
+            # Sparse index: every row is a SUMMARY, so Limit is the page size
+            response = table.query(**query_kwargs)
+
+            # Rows of RESULT items (single storage layout) read like SUMMARY rows
+            for item in response['Items']:
+                item['step'] = 'SUMMARY'
 
-            # Get only SUMMARY items
-            summaries = [item for item in response['Items'] if item['step'] == 'SUMMARY']
+            last_key = response.get('LastEvaluatedKey')
 
             return {
                 'statusCode': 200,
@@ -118,7 +646,8 @@ def lambda_handler(event, context):
                 },
                 'body': json.dumps({
                     'target': target,
-                    'recent': summaries
+                    'recent': response['Items'],
+                    'nextCursor': encode_cursor(last_key) if last_key else None
                 }, default=decimal_default)
             }
 
@@ -0,0 +1,15 @@
+"""Code shared by the dnscheck Lambda functions, deployed as a Lambda layer
+
+- clients: one pool of tuned boto3 clients per container
+- deadlines: end-to-end deadlines bounding every stage's timeouts
+- events: parsing event details and emitting events with retries
+- jsonfast: compact JSON, using orjson when the layer includes it
+- locks: per-target locks coalescing concurrent validations
+- metrics: CloudWatch embedded metric format (EMF) records
+- pinned: HTTP and HTTPS connections pinned to a probed address
+- probes: probing every address of a target concurrently and combining the results
+- ratelimit: per-host and per-IP token buckets pacing the probers
+- redirects: following redirects hop by hop with connection reuse
+- results: the storage layouts of validation results and reading them back
+- targets: normalizing submitted targets into hostnames
+"""
@@ -0,0 +1,79 @@
+"""One pool of tuned AWS clients per container
+
+Every function used to create default-configured boto3 clients: no TCP
+keep-alive, a 10-connection pool, 60s connect/read timeouts and the legacy
+retry mode. Clients here are created once per container on first use, with a
+botocore Config tuned for short Lambda invocations, and are shared by every
+module and thread in the function.
+
+Settings can be overridden per function through environment variables:
+
+- AWS_CONNECT_TIMEOUT (seconds, default 2)
+- AWS_READ_TIMEOUT (seconds, default 5)
+- AWS_MAX_ATTEMPTS (default 4, including the first attempt)
+- AWS_RETRY_MODE (default adaptive: client-side rate limiting on throttles)
+- AWS_MAX_POOL_CONNECTIONS (default 32, enough for the probers' thread pools)
+"""
+
+import os
+import threading
+
+_clients = {}
+_lock = threading.Lock()
+
+# Replaces boto3 when set (see set_factory); the local runner uses it
+_factory = None
+
+
+def client_config():
+    """botocore Config shared by every client"""
+    from botocore.config import Config
+
+    return Config(
+        connect_timeout=float(os.environ.get('AWS_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.environ.get('AWS_READ_TIMEOUT', '5')),
+        retries={
+            'mode': os.environ.get('AWS_RETRY_MODE', 'adaptive'),
+            'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', '4'))
+        },
+        max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32')),
+        tcp_keepalive=True
+    )
+
+
+def _get(kind, service_name):
+    key = (kind, service_name)
+    cached = _clients.get(key)
+    if cached is not None:
+        return cached
+
+    with _lock:
+        if key not in _clients:
+            if _factory is not None:
+                _clients[key] = getattr(_factory, kind)(service_name)
+            else:
+                # boto3 is imported on first use, not when the layer is imported
+                import boto3
+                _clients[key] = getattr(boto3, kind)(service_name, config=client_config())
+        return _clients[key]
+
+
+def client(service_name):
+    """Shared low-level client, e.g. client('events')"""
+    return _get('client', service_name)
+
+
+def resource(service_name):
+    """Shared resource, e.g. resource('dynamodb')"""
+    return _get('resource', service_name)
+
+
+def set_factory(factory):
+    """Use factory.client()/factory.resource() instead of boto3 and drop cached clients
+
+    For running the handlers outside AWS; pass None to go back to boto3.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _clients.clear()
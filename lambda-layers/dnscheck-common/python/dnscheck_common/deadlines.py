@@ -0,0 +1,67 @@
+"""End-to-end deadlines of validation requests
+
+Ingest (or a bulk job) stamps a deadline on ValidationRequested,
+requestedAt plus VALIDATION_BUDGET seconds (default 30, 0 for none), and
+every stage passes it on. A stage sizes its timeouts from what is left of
+it instead of only its own fixed timeout, and reports a step with status
+timeout once the deadline has passed:
+
+    deadline = deadlines.for_event(detail, context)
+    if deadline.expired():
+        ...  # emit the step with status 'timeout'
+    timeout = deadline.cap(float(os.environ.get('HTTP_TIMEOUT', '10')))
+
+The Lambda's own remaining time counts as well, minus EMIT_MARGIN, so a
+stage always has time left to emit its step instead of being killed
+without writing any result.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+# Seconds kept back from the invocation's remaining time to emit the step
+EMIT_MARGIN = 1.0
+
+
+def stamp(now):
+    """Deadline for a request accepted at now (a naive UTC datetime), or None without a budget"""
+    budget = float(os.environ.get('VALIDATION_BUDGET', '30'))
+    if budget <= 0:
+        return None
+    return (now + timedelta(seconds=budget)).isoformat() + 'Z'
+
+
+class Deadline:
+    """A point on the monotonic clock; None means there is no deadline"""
+
+    def __init__(self, seconds=None):
+        self.at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left (never negative), or None without a deadline"""
+        if self.at is None:
+            return None
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+    def cap(self, timeout):
+        """timeout, or the time left if that is shorter"""
+        remaining = self.remaining()
+        return timeout if remaining is None else min(timeout, remaining)
+
+
+def for_event(detail, context=None):
+    """The earlier of the request's deadline and the invocation's own end"""
+    limits = []
+
+    if detail.get('deadline'):
+        deadline = datetime.fromisoformat(detail['deadline'].replace('Z', '+00:00'))
+        limits.append((deadline - datetime.now(timezone.utc)).total_seconds())
+
+    if context is not None:
+        limits.append(context.get_remaining_time_in_millis() / 1000 - EMIT_MARGIN)
+
+    return Deadline(min(limits) if limits else None)
@@ -0,0 +1,99 @@
+"""Reading EventBridge events and emitting new ones"""
+
+import os
+import random
+import time
+
+from . import clients, jsonfast, metrics
+
+# PutEvents accepts at most 10 entries per call
+PUT_EVENTS_BATCH_SIZE = 10
+
+# Request context set by ingest (or a bulk job) that every stage copies
+# into the events it emits, so the aggregator sees it on each step
+PASSTHROUGH_KEYS = ('requestedAt', 'deadline', 'batchId', 'jobId', 'lockKey')
+
+
+class EmitError(Exception):
+    """Entries that could not be delivered to EventBridge after all retries"""
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(f'{len(failed)} event(s) could not be emitted')
+
+
+def parse_detail(event):
+    """The event's detail as a dict; handles both string and dict formats"""
+    detail = event.get('detail')
+    if isinstance(detail, str):
+        return jsonfast.loads(detail)
+    return detail or {}
+
+
+def passthrough(detail):
+    """The PASSTHROUGH_KEYS present in detail, to copy into the next event"""
+    return {key: detail[key] for key in PASSTHROUGH_KEYS if detail.get(key)}
+
+
+def entry(source, detail_type, detail):
+    """PutEvents entry for the pipeline's bus (EVENTBUS_NAME)"""
+    return {
+        'Source': source,
+        'DetailType': detail_type,
+        'Detail': jsonfast.dumps(detail),
+        'EventBusName': os.environ.get('EVENTBUS_NAME', 'dns-checks')
+    }
+
+
+def put_events(entries, max_attempts=3):
+    """Send entries in chunks of PUT_EVENTS_BATCH_SIZE, retrying failed entries.
+
+    PutEvents is not all-or-nothing: individual entries can fail (throttling,
+    internal errors) while the call itself succeeds, so FailedEntryCount has to
+    be checked and only the failed entries resent. Retries use exponential
+    backoff with full jitter so concurrent invocations don't retry in lockstep.
+
+    Each PutEvents call is timed as PutEventsLatency in the invocation's
+    metrics. Returns the list of entries that still failed after all attempts.
+    """
+    eventbridge = clients.client('events')
+    invocation = metrics.current()
+    failed = []
+
+    for i in range(0, len(entries), PUT_EVENTS_BATCH_SIZE):
+        pending = entries[i:i + PUT_EVENTS_BATCH_SIZE]
+
+        for attempt in range(max_attempts):
+            if attempt > 0:
+                # Up to 50ms, 100ms, ...
+                time.sleep(random.uniform(0, 0.05 * (2 ** (attempt - 1))))
+
+            try:
+                with invocation.timer('PutEventsLatency'):
+                    response = eventbridge.put_events(Entries=pending)
+            except Exception as e:
+                print(f"PutEvents call failed (attempt {attempt + 1}): {str(e)}")
+                continue
+
+            if not response.get('FailedEntryCount'):
+                pending = []
+                break
+
+            invocation.count('PutEventsFailedEntries', response['FailedEntryCount'])
+
+            # Result entries are returned in the same order as the request entries
+            pending = [
+                sent for sent, result in zip(pending, response.get('Entries', []))
+                if result.get('ErrorCode')
+            ]
+
+        failed.extend(pending)
+
+    return failed
+
+
+def emit(source, detail_type, detail):
+    """Emit one event, raising EmitError if it still fails after retries"""
+    failed = put_events([entry(source, detail_type, detail)])
+    if failed:
+        raise EmitError(failed)
@@ -0,0 +1,41 @@
+"""JSON encode/decode for event detail payloads
+
+Uses orjson when it is installed in the layer (it is several times faster
+for both directions) and the standard library otherwise. Output is compact
+either way, which also keeps PutEvents payloads small.
+
+The backend is picked on first use rather than at import time: importing
+orjson takes several milliseconds, which handlers that never encode JSON
+(or only once) shouldn't pay for during init.
+"""
+
+import json
+
+# orjson module, False when it isn't installed, None until first use
+_orjson = None
+
+
+def _backend():
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    return _orjson
+
+
+def dumps(value, default=None):
+    """Compact JSON string"""
+    orjson = _backend()
+    if orjson:
+        return orjson.dumps(value, default=default).decode('utf-8')
+    return json.dumps(value, separators=(',', ':'), default=default)
+
+
+def loads(text):
+    orjson = _backend()
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
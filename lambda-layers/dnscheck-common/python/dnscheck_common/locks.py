@@ -0,0 +1,78 @@
+"""Per-target locks that coalesce concurrent validations of the same target
+
+Ingest takes a target's lock with a conditional put before starting a
+validation. Requests for the same target that arrive while it is held get
+the running validation's requestId back instead of starting another one.
+The aggregator releases the lock when it finalizes that request, and
+expiresAt (also the table's TTL attribute) lets a lock lapse if it never
+does.
+
+Lock items live in the validations table under requestId LOCK#<target> and
+step LOCK. They have no target/time attributes, so they stay out of the
+byTarget index.
+"""
+
+import time
+
+LOCK_STEP = 'LOCK'
+
+# Attempts to take a lock that is released between our put and our read
+ACQUIRE_ATTEMPTS = 2
+
+
+def lock_key(target):
+    return f'LOCK#{target}'
+
+
+def _condition_failed(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def acquire(table, target, request_id, ttl):
+    """Take target's lock for request_id for up to ttl seconds
+
+    Returns None when request_id holds the lock (or it could not be
+    determined who does, in which case the caller just goes ahead), or the
+    requestId of the validation already in flight.
+    """
+    for _ in range(ACQUIRE_ATTEMPTS):
+        now = int(time.time())
+        try:
+            table.put_item(
+                Item={
+                    'requestId': lock_key(target),
+                    'step': LOCK_STEP,
+                    'lockedRequestId': request_id,
+                    'expiresAt': now + ttl
+                },
+                ConditionExpression='attribute_not_exists(requestId) OR expiresAt < :now',
+                ExpressionAttributeValues={':now': now}
+            )
+            return None
+        except Exception as e:
+            if not _condition_failed(e):
+                raise
+
+        lock = table.get_item(
+            Key={'requestId': lock_key(target), 'step': LOCK_STEP},
+            ConsistentRead=True
+        ).get('Item')
+        if lock and lock['expiresAt'] >= now:
+            return lock['lockedRequestId']
+
+    return None
+
+
+def release(table, key, request_id):
+    """Delete a lock if request_id still holds it; returns whether it did"""
+    try:
+        table.delete_item(
+            Key={'requestId': key, 'step': LOCK_STEP},
+            ConditionExpression='lockedRequestId = :request',
+            ExpressionAttributeValues={':request': request_id}
+        )
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
+        return False
+    return True
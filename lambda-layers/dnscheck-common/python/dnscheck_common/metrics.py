@@ -0,0 +1,208 @@
+"""CloudWatch metrics in embedded metric format (EMF)
+
+Each invocation collects its metrics in a Metrics object and writes them as
+a single JSON log line when it finishes. CloudWatch Logs turns EMF lines
+into metrics, so there are no synchronous API calls and no IAM permission is
+needed.
+
+Every record carries the Stage and Status dimensions. It is also published
+under Stage alone, which is what the p99 alarms in cloudwatch.tf use. A
+handler opts in with the decorator, and anything running in the
+invocation's thread records through current():
+
+    @metrics.instrumented('dns')
+    def lambda_handler(event, context):
+        metrics.current().add('dnsA', 12.5)
+        metrics.current().set_status('ok')
+
+Records are printed to stdout (the function's log stream) unless set_sink()
+replaces it, e.g. with a list's append to inspect them offline. The
+namespace is METRICS_NAMESPACE (default DNSCheck). METRICS_ENABLED=false
+turns emission off.
+"""
+
+import functools
+import os
+import threading
+import time
+
+from . import jsonfast
+
+# EMF allows at most 100 values per metric in one record
+MAX_VALUES = 100
+
+MILLISECONDS = 'Milliseconds'
+COUNT = 'Count'
+
+_sink = None
+_local = threading.local()
+
+
+def set_sink(sink):
+    """Send records (dicts) to sink(record) instead of printing them; None restores stdout"""
+    global _sink
+    _sink = sink
+
+
+def write(record):
+    if _sink is not None:
+        _sink(record)
+    else:
+        print(jsonfast.dumps(record))
+
+
+class Metrics:
+    """Metrics of one invocation, flushed as one EMF record"""
+
+    def __init__(self, stage, status=None):
+        self.stage = stage
+        self.status = status
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+
+    def add(self, name, value, unit=MILLISECONDS):
+        """Record a value; a metric recorded several times keeps every value"""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        self.values.setdefault(name, []).append(value)
+        self.units[name] = unit
+
+    def count(self, name, value=1):
+        self.add(name, value, COUNT)
+
+    def add_timings(self, timings):
+        """Numeric entries of a step's timings dict, under the same names"""
+        for name, value in (timings or {}).items():
+            self.add(name, value)
+
+    def timer(self, name):
+        """Context manager timing the block (e.g. a downstream call) in milliseconds, even if it raises"""
+        return _Timer(self, name)
+
+    def set_stage(self, stage):
+        """For handlers serving several routes, e.g. long polls vs plain reads"""
+        self.stage = stage
+
+    def set_status(self, status):
+        self.status = status
+
+    def set_property(self, name, value):
+        """Extra field for Logs Insights; not a metric or dimension"""
+        self.properties[name] = value
+
+    def record(self):
+        """The EMF record for everything collected so far"""
+        record = dict(self.properties)
+        record['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': os.environ.get('METRICS_NAMESPACE', 'DNSCheck'),
+                'Dimensions': [['Stage', 'Status'], ['Stage']],
+                'Metrics': [{'Name': name, 'Unit': self.units[name]} for name in self.values]
+            }]
+        }
+        record['Stage'] = self.stage
+        record['Status'] = self.status or 'ok'
+
+        for name, values in self.values.items():
+            values = values[-MAX_VALUES:]
+            record[name] = values[0] if len(values) == 1 else values
+
+        return record
+
+    def flush(self):
+        """Write the record and start over; does nothing if no metric was recorded"""
+        if self.values and os.environ.get('METRICS_ENABLED', 'true').lower() != 'false':
+            write(self.record())
+        self.values, self.units = {}, {}
+
+
+class _Timer:
+    # A plain class rather than contextlib.contextmanager, which is slow to import
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.name, round((time.perf_counter() - self.started) * 1000, 2))
+        return False
+
+
+def current():
+    """Metrics of the invocation running in this thread
+
+    Outside an instrumented handler (or in a worker thread) this is a
+    throwaway object, so callers never have to check.
+    """
+    metrics = getattr(_local, 'metrics', None)
+    return metrics if metrics is not None else Metrics(None)
+
+
+def status_for_response(response):
+    """Default Status for a handler's return value"""
+    status_code = response.get('statusCode', 200) if isinstance(response, dict) else 200
+    if status_code >= 500:
+        return 'error'
+    if status_code >= 400:
+        return 'rejected'
+    return 'ok'
+
+
+def instrumented(stage):
+    """Decorator for lambda_handler: one EMF record per invocation
+
+    Records StageDuration and Invocations. Status is what the handler set
+    with current().set_status(), or else derived from the response
+    (5xx always counts as error).
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            metrics = Metrics(stage)
+            _local.metrics = metrics
+            started = time.perf_counter()
+            try:
+                response = handler(event, context)
+            except Exception:
+                metrics.set_status('error')
+                raise
+            else:
+                default = status_for_response(response)
+                if metrics.status is None or default == 'error':
+                    metrics.set_status(default)
+            finally:
+                metrics.add('StageDuration', round((time.perf_counter() - started) * 1000, 2))
+                metrics.count('Invocations')
+                _local.metrics = None
+                metrics.flush()
+            return response
+        return wrapper
+    return decorator
+
+
+class TimedCalls:
+    """Wraps a client or table so every method call is timed as one metric
+
+    For example TimedCalls(table, 'DynamoDBLatency') records one value per
+    put_item/query/... call in the current invocation's metrics.
+    """
+
+    def __init__(self, target, name):
+        self._target = target
+        self._name = name
+
+    def __getattr__(self, attribute):
+        value = getattr(self._target, attribute)
+        if not callable(value):
+            return value
+
+        def timed(*args, **kwargs):
+            with current().timer(self._name):
+                return value(*args, **kwargs)
+        return timed
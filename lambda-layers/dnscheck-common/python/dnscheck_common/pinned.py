@@ -0,0 +1,157 @@
+"""HTTP and HTTPS connections pinned to one address, shared by the probers
+
+A probe connects to the address it is probing, not to whatever the OS
+resolves the target to, while the hostname stays in the Host header (and
+in SNI and the certificate check over TLS). Both probers use both classes:
+each for its own protocol, and the other one for redirects that switch
+scheme. hop_connections() opens every redirect hop this way, so hops back
+to the target stay on the probed address:
+
+    chain = redirects.Chain(url, pinned.hop_connections(target, ip, timeout), ...)
+
+Each connection records its phases (connect, plus tls over HTTPS) in
+milliseconds and has an abort() method that probes.probe_all() calls at the
+deadline. TLS sessions are cached per container, keyed by (ip, sni), so the
+next probe of an address can resume one (TLS_SESSION_CACHE_SIZE, default
+512, 0 disables the cache).
+"""
+
+import http.client
+import os
+import socket
+import ssl
+import threading
+import time
+from collections import OrderedDict
+
+from . import probes
+
+# Loading and parsing the CA bundle is the expensive part of creating a
+# context, so it is done once per container and shared by all probes
+_ssl_context = None
+
+# TLS sessions from earlier probes, keyed by (ip, sni), in LRU order
+TLS_SESSIONS = OrderedDict()
+_tls_sessions_lock = threading.Lock()
+
+
+def get_ssl_context():
+    """Return the per-container SSL context, creating it on first use
+
+    HTTPS_CA_FILE replaces the system CA bundle (e.g. a private CA in tests).
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context(cafile=os.environ.get('HTTPS_CA_FILE') or None)
+    return _ssl_context
+
+
+def get_tls_session(ip, sni):
+    """Return a cached session for this address and server name, if any"""
+    with _tls_sessions_lock:
+        session = TLS_SESSIONS.get((ip, sni))
+        if session is not None:
+            TLS_SESSIONS.move_to_end((ip, sni))
+        return session
+
+
+def store_tls_session(ip, sni, session):
+    """Remember a session so the next probe of this address can resume it"""
+    max_sessions = int(os.environ.get('TLS_SESSION_CACHE_SIZE', '512'))
+    if session is None or max_sessions <= 0:
+        return
+
+    with _tls_sessions_lock:
+        TLS_SESSIONS[(ip, sni)] = session
+        TLS_SESSIONS.move_to_end((ip, sni))
+        while len(TLS_SESSIONS) > max_sessions:
+            TLS_SESSIONS.popitem(last=False)
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a fixed IP but keeps the hostname in the Host header
+
+    Without an IP it connects to the hostname, letting the OS resolve it.
+    """
+
+    def __init__(self, host, ip, **kwargs):
+        super().__init__(host, **kwargs)
+        self.ip = ip
+        self.phases = {}
+        self.raw_sock = None
+
+    def connect(self):
+        started = time.perf_counter()
+        self.sock = socket.create_connection((self.ip or self.host, self.port), self.timeout, self.source_address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.phases['connect'] = probes.elapsed_ms(started)
+
+        # http.client drops self.sock as soon as a response says it will close
+        self.raw_sock = self.sock
+
+    def abort(self):
+        """Make a request blocked in another thread fail at once"""
+        if self.raw_sock is not None:
+            try:
+                self.raw_sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPSConnection that connects to a fixed IP but keeps the hostname for SNI,
+    certificate verification and the Host header
+
+    Without an IP it connects to the hostname, letting the OS resolve it.
+    """
+
+    def __init__(self, host, ip, context, **kwargs):
+        super().__init__(host, context=context, **kwargs)
+        self.ip = ip
+        self.ssl_context = context
+        self.phases = {}
+        self.tls_resumed = None
+        self.tls_sock = None
+
+    def connect(self):
+        started = time.perf_counter()
+        sock = socket.create_connection((self.ip or self.host, self.port), self.timeout, self.source_address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.phases['connect'] = probes.elapsed_ms(started)
+
+        # Offer the session from the last probe of this (ip, sni) for an abbreviated handshake
+        handshake_started = time.perf_counter()
+        try:
+            # http.client drops self.sock as soon as a response says it will
+            # close, so tls_sock keeps it; it is set before the handshake so
+            # abort() can interrupt that too
+            self.sock = self.tls_sock = self.ssl_context.wrap_socket(
+                sock,
+                server_hostname=self.host,
+                session=get_tls_session(self.ip, self.host),
+                do_handshake_on_connect=False
+            )
+            self.sock.do_handshake()
+        except Exception:
+            sock.close()
+            raise
+        self.phases['tls'] = probes.elapsed_ms(handshake_started)
+        self.tls_resumed = self.sock.session_reused
+
+    def abort(self):
+        """Make a handshake or request blocked in another thread fail at once"""
+        if self.tls_sock is not None:
+            try:
+                self.tls_sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def hop_connections(target, ip, timeout):
+    """Opens the connections of redirect hops; hops to the target stay on ip"""
+    def open_connection(scheme, host, port):
+        address = ip if host == target else None
+        if scheme == 'https':
+            return PinnedHTTPSConnection(host, address, get_ssl_context(), port=port, timeout=timeout)
+        return PinnedHTTPConnection(host, address, port=port, timeout=timeout)
+    return open_connection
@@ -0,0 +1,138 @@
+"""Probing every address of a target, shared by the HTTP and HTTPS probers
+
+Each prober brings its own probe(ip, connections) for its protocol; this
+module picks the addresses to probe, runs the probes concurrently within
+the request's deadline and combines their results into the step's status:
+
+    addresses = probes.select_addresses(detail['ipAddresses'])
+    results = probes.probe_all(addresses, probe, deadline)
+    status, status_code, reason = probes.combine_results(results)
+
+A result is a dict with at least ip, status (ok, warn, fail or timeout)
+and timings (milliseconds per phase, total included).
+"""
+
+import ipaddress
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def elapsed_ms(started):
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def select_addresses(ip_addresses):
+    """Pick the addresses to probe
+
+    IPv6 addresses are skipped unless PROBE_IPV6 is enabled (Lambda functions
+    outside a VPC have no IPv6 egress), except when a target has nothing else.
+    Malformed addresses are dropped, so the list can end up empty.
+    """
+    max_ips = int(os.environ.get('MAX_PROBE_IPS', '16'))
+    probe_ipv6 = os.environ.get('PROBE_IPV6', 'false').lower() == 'true'
+
+    selected = []
+    ipv6 = []
+    for ip in ip_addresses:
+        try:
+            version = ipaddress.ip_address(ip).version
+        except ValueError:
+            continue
+        if version == 6:
+            ipv6.append(ip)
+        if version == 4 or probe_ipv6:
+            selected.append(ip)
+
+    if not selected:
+        selected = ipv6
+
+    return selected[:max(0, max_ips)]
+
+
+def probe_all(ip_addresses, probe, deadline, unfinished=None):
+    """Probe every address concurrently through a bounded thread pool
+
+    probe(ip, connections) probes one address and adds what it connects to
+    connections[ip], as objects with an abort() method. Probes still running
+    at the deadline are aborted (their sockets are shut down, so blocked
+    handshakes and reads fail at once) and reported with status timeout,
+    plus the fields in unfinished. No addresses means no results.
+    """
+    if not ip_addresses:
+        return []
+
+    concurrency = max(1, int(os.environ.get('PROBE_CONCURRENCY', '8')))
+    connections = {}
+
+    pool = ThreadPoolExecutor(max_workers=min(concurrency, len(ip_addresses)))
+    futures = [pool.submit(probe, ip, connections) for ip in ip_addresses]
+    done, _ = wait(futures, timeout=deadline.remaining())
+
+    results = []
+    for ip, future in zip(ip_addresses, futures):
+        if future in done:
+            result = future.result()
+            # A socket timeout cut short by the deadline is the deadline's too
+            if result.get('reason') == 'timed out' and deadline.expired():
+                result['status'] = 'timeout'
+            results.append(result)
+            continue
+        for pending in connections.get(ip, ()):
+            pending.abort()
+        results.append({'ip': ip, 'status': 'timeout', **(unfinished or {}), 'timings': {}, 'reason': 'Deadline exceeded'})
+
+    # Aborted probes finish on their own; queued ones never start
+    pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def combine_results(results):
+    """(status, first HTTP status code, reason) of a step: ok only if every address is healthy
+
+    A partial failure is reported as warn so that a single bad backend behind
+    round-robin DNS is visible without failing the whole target. Without any
+    address to probe the step fails.
+    """
+    if not results:
+        return 'fail', None, 'No addresses to probe'
+
+    failed = [r for r in results if r['status'] == 'fail']
+    warned = [r for r in results if r['status'] == 'warn']
+
+    timed_out = [r for r in results if r['status'] == 'timeout']
+
+    status_code = next((r['httpStatusCode'] for r in results if r.get('httpStatusCode')), None)
+
+    # Unfinished addresses say nothing about the target, only that time ran out
+    if timed_out:
+        return 'timeout', status_code, f"Deadline exceeded with {len(timed_out)} of {len(results)} addresses unfinished"
+
+    if not failed and not warned:
+        return 'ok', status_code, None
+
+    if len(failed) == len(results):
+        return 'fail', status_code, failed[0]['reason']
+
+    if failed:
+        details = ', '.join(f"{r['ip']} ({r['reason']})" for r in failed)
+        return 'warn', status_code, f"{len(failed)} of {len(results)} addresses failed: {details}"
+
+    return 'warn', status_code, warned[0]['reason']
+
+
+def slowest_result(results):
+    return max(results, key=lambda r: r['timings'].get('total', 0))
+
+
+def phase_timings(results, prefix):
+    """Event-level phase breakdown, taken from the slowest address: prefix + Connect, ..."""
+    if not results:
+        return {}
+
+    slowest = slowest_result(results)
+    return {
+        prefix + phase.capitalize(): value
+        for phase, value in slowest['timings'].items() if phase != 'total'
+    }
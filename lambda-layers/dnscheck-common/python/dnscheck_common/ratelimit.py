@@ -0,0 +1,241 @@
+"""Token buckets pacing the probers per hostname and per IP address
+
+Many hostnames of a bulk run can sit behind the same IP (or provider), and
+every prober invocation used to connect as soon as it started. Servers that
+rate-limit then time out or reset the connections, which the pipeline
+recorded as failures of the targets. A prober now takes a token from the
+target's bucket and from each address's bucket before connecting, waiting
+for them to refill when they are empty.
+
+Buckets are shared by every container through items of the validations
+table (requestId RATE#host#<target> or RATE#ip#<address>, step RATE). A
+take reads the item and writes it back with a condition on its version, so
+concurrent takes never hand out the same token; the loser just re-reads.
+Tokens taken from some buckets of a probe are given back when another of
+its buckets doesn't fill up in time, so a probe that gave up waiting holds
+no tokens other probes could have used.
+expiresAt (the table's TTL attribute) cleans up idle buckets. Like lock
+items they have no target/time attributes, so they stay out of the byTarget
+index.
+
+Configured through environment variables:
+
+- HOST_RATE_LIMIT / IP_RATE_LIMIT: tokens per second, 0 (default) disables
+  that limit
+- HOST_RATE_BURST / IP_RATE_BURST: bucket size (default: the rate, at least 1)
+- RATE_LIMIT_MAX_WAIT: seconds to wait at most (default 5); after that the
+  probe goes ahead anyway and is marked as rate limited
+- RATE_LIMIT_BACKEND: dynamodb (default, needs DYNAMODB_TABLE) or memory,
+  the stand-in limiting each container on its own
+"""
+
+import os
+import random
+import threading
+import time
+from decimal import Decimal
+
+from . import clients
+
+BUCKET_STEP = 'RATE'
+
+# Idle buckets are full again long before this; TTL only cleans them up
+BUCKET_TTL = 3600
+
+# Delay before re-reading a bucket another container updated under us
+CONTENDED_DELAY = 0.01
+
+# Tries at giving tokens back to a contended bucket before giving up
+GIVE_BACK_ATTEMPTS = 3
+
+
+def bucket_key(kind, name):
+    return f'RATE#{kind}#{name}'
+
+
+def _condition_failed(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def refill(tokens, elapsed, rate, burst):
+    """Tokens in a bucket elapsed seconds after it held tokens"""
+    return min(burst, tokens + max(0.0, elapsed) * rate)
+
+
+class MemoryBuckets:
+    """Buckets of this container only"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, count, rate, burst):
+        """Take count tokens; returns 0 when taken, else seconds until they could be"""
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = refill(tokens, now - updated, rate, burst)
+            if tokens >= count:
+                self._buckets[key] = (tokens - count, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (count - tokens) / rate
+
+    def give_back(self, key, count, rate, burst):
+        """Return count tokens taken earlier"""
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            self._buckets[key] = (min(burst, refill(tokens, now - updated, rate, burst) + count), now)
+
+
+class DynamoDBBuckets:
+    """Buckets stored in the validations table, shared by every container"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def _read(self, key, rate, burst):
+        """(item or None, tokens now, now)"""
+        item = self.table.get_item(
+            Key={'requestId': key, 'step': BUCKET_STEP},
+            ConsistentRead=True
+        ).get('Item')
+
+        now = time.time()
+        if item:
+            tokens = refill(float(item['tokens']), now - float(item['updatedAt']), rate, burst)
+        else:
+            tokens = burst
+        return item, tokens, now
+
+    def _write(self, key, item, tokens, now):
+        """Store tokens unless another container updated the bucket since item was read; False then"""
+        new_item = {
+            'requestId': key,
+            'step': BUCKET_STEP,
+            'tokens': Decimal(str(round(tokens, 3))),
+            'updatedAt': Decimal(str(round(now, 3))),
+            'version': int(item['version']) + 1 if item else 1,
+            'expiresAt': int(now) + BUCKET_TTL
+        }
+        try:
+            if item:
+                self.table.put_item(
+                    Item=new_item,
+                    ConditionExpression='version = :version',
+                    ExpressionAttributeValues={':version': item['version']}
+                )
+            else:
+                self.table.put_item(Item=new_item, ConditionExpression='attribute_not_exists(requestId)')
+        except Exception as e:
+            if not _condition_failed(e):
+                raise
+            return False
+        return True
+
+    def take(self, key, count, rate, burst):
+        """Take count tokens; returns 0 when taken, else seconds until they could be"""
+        item, tokens, now = self._read(key, rate, burst)
+        if tokens < count:
+            return (count - tokens) / rate
+
+        if not self._write(key, item, tokens - count, now):
+            return random.uniform(0, CONTENDED_DELAY)
+        return 0
+
+    def give_back(self, key, count, rate, burst):
+        """Return count tokens taken earlier; dropped if the bucket stays contended"""
+        for _ in range(GIVE_BACK_ATTEMPTS):
+            item, tokens, now = self._read(key, rate, burst)
+            if tokens >= burst or self._write(key, item, min(burst, tokens + count), now):
+                return
+            time.sleep(random.uniform(0, CONTENDED_DELAY))
+
+
+class Limiter:
+    """Per-host and per-IP limits over a buckets backend"""
+
+    def __init__(self, buckets, host_rate=0, host_burst=None, ip_rate=0, ip_burst=None, max_wait=5):
+        self.buckets = buckets
+        self.host_rate = host_rate
+        self.host_burst = host_burst or max(1, host_rate)
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst or max(1, ip_rate)
+        self.max_wait = max_wait
+
+    def requests(self, host, ips):
+        """(key, count, rate, burst) of every bucket a probe of host at ips takes from"""
+        wanted = []
+        if host and self.host_rate > 0:
+            # One request to the host per address
+            count = min(max(1, len(ips)), self.host_burst)
+            wanted.append((bucket_key('host', host), count, self.host_rate, self.host_burst))
+        if self.ip_rate > 0:
+            for ip in sorted(set(ips)):
+                wanted.append((bucket_key('ip', ip), 1, self.ip_rate, self.ip_burst))
+        return wanted
+
+    def acquire(self, host, ips=(), max_wait=None):
+        """Wait for the tokens to probe host at ips
+
+        Returns (waited, acquired): milliseconds spent waiting, and False
+        when max_wait (the limiter's, or the given one if shorter) ran out
+        first (the caller probes anyway). Tokens already taken from other
+        buckets are given back then.
+        """
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else min(self.max_wait, max_wait))
+        taken = []
+
+        for request in self.requests(host, ips):
+            while True:
+                delay = self.buckets.take(*request)
+                if delay <= 0:
+                    taken.append(request)
+                    break
+                if time.monotonic() + delay > deadline:
+                    for taken_request in taken:
+                        self.buckets.give_back(*taken_request)
+                    return round((time.monotonic() - started) * 1000, 2), False
+                # Jitter keeps waiting containers from retrying in lockstep
+                time.sleep(delay * random.uniform(1, 1.2))
+
+        return round((time.monotonic() - started) * 1000, 2), True
+
+
+_memory_buckets = MemoryBuckets()
+
+
+def from_environment():
+    """Limiter configured by the environment, or None when no limit is set"""
+    host_rate = float(os.environ.get('HOST_RATE_LIMIT', '0'))
+    ip_rate = float(os.environ.get('IP_RATE_LIMIT', '0'))
+    if host_rate <= 0 and ip_rate <= 0:
+        return None
+
+    if os.environ.get('RATE_LIMIT_BACKEND', 'dynamodb') == 'memory':
+        buckets = _memory_buckets
+    else:
+        buckets = DynamoDBBuckets(clients.resource('dynamodb').Table(os.environ['DYNAMODB_TABLE']))
+
+    return Limiter(
+        buckets,
+        host_rate=host_rate,
+        host_burst=float(os.environ.get('HOST_RATE_BURST', '0')),
+        ip_rate=ip_rate,
+        ip_burst=float(os.environ.get('IP_RATE_BURST', '0')),
+        max_wait=float(os.environ.get('RATE_LIMIT_MAX_WAIT', '5'))
+    )
+
+
+def wait(host, ips=(), max_wait=None):
+    """Wait for the environment's limits before probing host at ips
+
+    Returns (waited, acquired) as Limiter.acquire does, or (None, True)
+    when no limit is configured.
+    """
+    limiter = from_environment()
+    if limiter is None:
+        return None, True
+    return limiter.acquire(host, ips, max_wait)
@@ -0,0 +1,160 @@
+"""Following HTTP redirects hop by hop
+
+The probers follow redirects themselves rather than through urlopen, which
+hides the hops and opens a new connection for each one. A Chain sends every
+hop, reusing the keep-alive connection of an earlier hop while scheme, host
+and port stay the same, and records each one:
+
+    {'url': 'http://example.com/', 'status': 301, 'location': 'https://example.com/',
+     'latency': 12.3, 'reused': False}
+
+latency is milliseconds from sending the hop (connecting first unless
+reused) until its body was read. Following stops at MAX_REDIRECTS hops
+(default 5, 0 disables following) or when a Location points back to a URL
+the chain already visited.
+"""
+
+import http.client
+import os
+import socket
+import time
+from urllib.parse import urljoin, urlsplit
+
+REDIRECT_STATUSES = frozenset((301, 302, 303, 307, 308))
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# A reused connection the server closed in the meantime is retried on a new one
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class RedirectError(Exception):
+    """A redirect that is not followed: a loop, too many hops or an unusable Location"""
+
+
+def max_redirects():
+    return int(os.environ.get('MAX_REDIRECTS', '5'))
+
+
+def url_for(scheme, host, port, path='/'):
+    if port == DEFAULT_PORTS[scheme]:
+        return f'{scheme}://{host}{path}'
+    return f'{scheme}://{host}:{port}{path}'
+
+
+def origin(url):
+    """(scheme, host, port) of url: the hops that may share a connection"""
+    parts = urlsplit(url)
+    return parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme]
+
+
+def request_path(url):
+    parts = urlsplit(url)
+    return (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+class Chain:
+    """The hops of one probe and the connections they can reuse
+
+    open_connection(scheme, host, port) returns a new, unconnected
+    http.client connection for an origin. The caller sends the first hop
+    itself (to time its phases) and hands its connection to add_connection.
+    """
+
+    def __init__(self, url, open_connection, headers, body_limit, limit=None):
+        self.url = url
+        self.open_connection = open_connection
+        self.headers = headers
+        self.body_limit = body_limit
+        self.limit = max_redirects() if limit is None else limit
+        self.hops = []
+        self.connections = {}
+        self.sockets = []
+        self.seen = {url}
+
+    def add_connection(self, conn):
+        """Make conn, connected to the current URL's origin, available to later hops"""
+        self.connections[origin(self.url)] = conn
+
+    def record(self, status, location, latency, reused):
+        hop = {'url': self.url, 'status': status, 'latency': latency, 'reused': reused}
+        if location:
+            hop['location'] = location
+        self.hops.append(hop)
+
+    def next_url(self, location):
+        """Absolute URL of the next hop; raises RedirectError when it must not be followed"""
+        if len(self.hops) > self.limit:
+            raise RedirectError(f'Too many redirects (more than {self.limit})')
+
+        url = urljoin(self.url, location)
+        if urlsplit(url).scheme not in DEFAULT_PORTS:
+            raise RedirectError(f'Unsupported redirect to {url}')
+        if url in self.seen:
+            raise RedirectError(f'Redirect loop back to {url}')
+
+        self.seen.add(url)
+        self.url = url
+        return url
+
+    def send(self, conn):
+        """Request the current URL on conn; returns (status, location, body length)"""
+        conn.request('GET', request_path(self.url), headers=self.headers)
+        # http.client drops conn.sock as soon as a response says it will close
+        self.sockets.append(conn.sock)
+        response = conn.getresponse()
+        body_bytes = len(response.read(self.body_limit))
+
+        # A body larger than body_limit is left unread, so the connection
+        # can't carry another request
+        if not response.isclosed():
+            conn.close()
+
+        return response.status, response.getheader('Location'), body_bytes
+
+    def follow(self, status, location):
+        """Follow redirects from a hop that answered status with location
+
+        Returns the final (status, body length); the length is None when no
+        redirect was followed. Raises RedirectError for a redirect that must
+        not be followed, or whatever the connection raises.
+        """
+        body_bytes = None
+        while status in REDIRECT_STATUSES and location and self.limit > 0:
+            self.next_url(location)
+            key = origin(self.url)
+            started = time.perf_counter()
+
+            conn = self.connections.get(key)
+            reused = conn is not None and conn.sock is not None
+            try:
+                if not reused:
+                    conn = self.connections[key] = self.open_connection(*key)
+                status, location, body_bytes = self.send(conn)
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                reused = False
+                conn = self.connections[key] = self.open_connection(*key)
+                status, location, body_bytes = self.send(conn)
+
+            self.record(status, location, elapsed_ms(started), reused)
+
+        return status, body_bytes
+
+    def abort(self):
+        """Make a hop blocked in another thread fail at once"""
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.close()
@@ -0,0 +1,173 @@
+"""Storage layouts of validation results in the validations table
+
+items (default): the aggregator writes one item per step, a PROGRESS item
+tracking the steps seen, and a SUMMARY item. Every step item repeats
+target, ts and time and is projected in full into the byTarget index.
+
+single: the aggregator merges every step into one RESULT item per request
+with UpdateItem, each step as a map attribute named step_<step>:
+
+    {'requestId': '...', 'step': 'RESULT', 'target': 'example.com',
+     'requestedAt': '...', 'stepsSeen': {'dnsresolved|ok|...', ...},
+     'step_dnsresolved': {'status': 'ok', 'reason': '', 'timings': {...}, 'ts': '...'},
+     'expiresAt': 1767225600}
+
+Finalizing adds the summary attributes (startedAt, finishedAt,
+overallStatus, summaryTarget, ...) to the same item, so the byTargetSummary
+and byJob indexes work as before. A RESULT item has no time attribute and
+stays out of byTarget, and expiresAt (the table's TTL attribute) removes it
+RESULT_TTL_DAYS (default 30, 0 to keep it) after its last step.
+
+Selected by STORAGE_LAYOUT. Readers use expand() to turn a RESULT item
+back into the SUMMARY and step items of the items layout, so either layout
+(and records written before a switch) reads the same.
+
+In both layouts the summary carries completionPending from finalizing until
+the final event, lock release and job count went through; public() drops it
+for readers.
+
+Also here: to_dynamodb() and serialize_item() for writing items through
+the resource and the low-level client, and deserialize_item() for reading
+them back from the low-level client and DynamoDB streams.
+"""
+
+import json
+import os
+from decimal import Decimal
+
+RESULT_STEP = 'RESULT'
+STEP_PREFIX = 'step_'
+
+ITEMS = 'items'
+SINGLE = 'single'
+
+# Set on the summary by finalizing, removed once completing it went through
+COMPLETION_PENDING = 'completionPending'
+
+# Attributes of a step that belong to the request; the RESULT item has them once
+REQUEST_ATTRIBUTES = ('target', 'requestedAt', 'jobId', 'lockKey')
+
+# Attributes finalize() adds, as a SUMMARY item of the items layout has them
+SUMMARY_ATTRIBUTES = ('target', 'startedAt', 'finishedAt', 'overallStatus', 'summaryTarget', 'summaryJob', 'timedOut')
+
+# Attribute order of SUMMARY and step items, so both layouts serialize alike
+SUMMARY_ORDER = ('requestId', 'step', 'target', 'startedAt', 'finishedAt', 'overallStatus', 'ts', 'time')
+STEP_ORDER = ('requestId', 'step', 'status', 'reason', 'timings', 'ts', 'target', 'time') + REQUEST_ATTRIBUTES[1:]
+
+
+def layout():
+    return os.environ.get('STORAGE_LAYOUT', ITEMS)
+
+
+def summary_key(request_id):
+    """Key of the item holding a request's summary in the layout in use"""
+    return {
+        'requestId': request_id,
+        'step': RESULT_STEP if layout() == SINGLE else 'SUMMARY'
+    }
+
+
+def public(item):
+    """A stored SUMMARY item without the aggregator's bookkeeping"""
+    return {key: value for key, value in item.items() if key != COMPLETION_PENDING}
+
+
+def step_attribute(step):
+    return STEP_PREFIX + step
+
+
+def expires_at(now):
+    """TTL of a RESULT item last updated at now (epoch seconds), or None to keep it"""
+    days = int(os.environ.get('RESULT_TTL_DAYS', '30'))
+    if days <= 0:
+        return None
+    return int(now) + days * 86400
+
+
+def _ordered(attributes, order):
+    ordered = {key: attributes.pop(key) for key in order if key in attributes}
+    ordered.update(attributes)
+    return ordered
+
+
+def summary(item):
+    """The SUMMARY item a RESULT item stands for, or None while the request is running"""
+    if not item.get('finishedAt'):
+        return None
+
+    attributes = {key: item[key] for key in SUMMARY_ATTRIBUTES if key in item}
+    attributes.update(requestId=item['requestId'], step='SUMMARY', ts=item['finishedAt'], time=item['finishedAt'])
+
+    return _ordered(attributes, SUMMARY_ORDER)
+
+
+def steps(item):
+    """The step items a RESULT item stands for, oldest first"""
+    request = {key: item[key] for key in REQUEST_ATTRIBUTES if key in item}
+
+    step_items = []
+    for name, value in item.items():
+        if name.startswith(STEP_PREFIX):
+            attributes = dict(value, requestId=item['requestId'], step=name[len(STEP_PREFIX):], time=value.get('ts', ''))
+            attributes.update(request)
+            step_items.append(_ordered(attributes, STEP_ORDER))
+
+    step_items.sort(key=lambda x: x.get('ts', ''))
+    return step_items
+
+
+def expand(item):
+    """(SUMMARY item or None, step items) of a RESULT item"""
+    return summary(item), steps(item)
+
+
+def to_dynamodb(value):
+    """DynamoDB rejects Python floats, so round-trip through JSON to turn them into Decimals"""
+    return json.loads(json.dumps(value), parse_float=Decimal)
+
+
+def serialize(value):
+    """Python value -> DynamoDB AttributeValue, for the low-level client"""
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, dict):
+        return {'M': {k: serialize(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize(v) for v in value]}
+    raise TypeError(f'Unsupported type {type(value).__name__} for DynamoDB')
+
+
+def serialize_item(item):
+    return {k: serialize(v) for k, v in item.items()}
+
+
+def deserialize(attribute):
+    """DynamoDB AttributeValue (low-level client, stream record) -> Python value, numbers as Decimal like the resource layer"""
+    (kind, value), = attribute.items()
+    if kind in ('S', 'BOOL', 'B'):
+        return value
+    if kind == 'N':
+        return Decimal(value)
+    if kind == 'M':
+        return {k: deserialize(v) for k, v in value.items()}
+    if kind == 'L':
+        return [deserialize(v) for v in value]
+    if kind == 'NULL':
+        return None
+    if kind == 'SS':
+        return set(value)
+    if kind == 'NS':
+        return {Decimal(v) for v in value}
+    if kind == 'BS':
+        return set(value)
+    raise TypeError(f'Unsupported DynamoDB attribute type {kind}')
+
+
+def deserialize_item(item):
+    return {k: deserialize(v) for k, v in (item or {}).items()}
@@ -0,0 +1,39 @@
+"""Normalizing the targets callers submit (shared by ingest and bulk jobs)"""
+
+
+def normalize_target(raw):
+    """Normalize a user supplied target into a bare, lower-case hostname.
+
+    Accepts things people commonly paste (``https://Example.com/path``,
+    ``example.com.``, ``example.com:8443``) and returns ``example.com``.
+    Returns None when nothing usable is left.
+    """
+    target = raw.strip().lower()
+
+    if '://' in target:
+        target = target.split('://', 1)[1]
+
+    # Drop path, query and fragment
+    for separator in ('/', '?', '#'):
+        target = target.split(separator, 1)[0]
+
+    # Drop credentials and port (IPv6 literals are not supported here)
+    target = target.rsplit('@', 1)[-1]
+    if target.count(':') == 1:
+        target = target.split(':', 1)[0]
+
+    target = target.rstrip('.')
+
+    if not target:
+        return None
+
+    # IDNA encode so that unicode names resolve the same way as their punycode form
+    try:
+        target = target.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+
+    if len(target) > 253:
+        return None
+
+    return target
@@ -8,6 +8,22 @@ data "archive_file" "lambda_zip" {
   output_path = "${path.module}/lambda-functions/${each.value}.zip"
 }
 
+# Shared layer (dnscheck_common): client pool, event emission, JSON
+data "archive_file" "common_layer" {
+  type        = "zip"
+  source_dir  = "${path.module}/lambda-layers/dnscheck-common"
+  output_path = "${path.module}/lambda-layers/dnscheck-common.zip"
+  excludes    = ["**/__pycache__/**"]
+}
+
+resource "aws_lambda_layer_version" "common" {
+  filename            = data.archive_file.common_layer.output_path
+  layer_name          = "${local.project_name}-common"
+  compatible_runtimes = ["python3.13"]
+
+  source_code_hash = data.archive_file.common_layer.output_base64sha256
+}
+
 # API Ingest Lambda
 resource "aws_lambda_function" "api_ingest" {
   filename      = data.archive_file.lambda_zip["api_ingest"].output_path
@@ -16,13 +32,18 @@ resource "aws_lambda_function" "api_ingest" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 30
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["api_ingest"].output_base64sha256
 
   environment {
     variables = {
-      EVENTBUS_NAME = aws_cloudwatch_event_bus.dns_checks.name
-      MAX_TARGETS   = "10"
+      EVENTBUS_NAME     = aws_cloudwatch_event_bus.dns_checks.name
+      DYNAMODB_TABLE    = aws_dynamodb_table.validations.name
+      MAX_TARGETS       = "500"
+      COALESCE_WINDOW   = tostring(var.coalesce_window)
+      VALIDATION_BUDGET = tostring(var.validation_budget)
+      METRICS_NAMESPACE = local.metrics_namespace
     }
   }
 
@@ -41,13 +62,17 @@ resource "aws_lambda_function" "dns_resolver" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 30
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["dns_resolver"].output_base64sha256
 
   environment {
     variables = {
-      EVENTBUS_NAME = aws_cloudwatch_event_bus.dns_checks.name
-      DNS_TIMEOUT   = "5"
+      EVENTBUS_NAME     = aws_cloudwatch_event_bus.dns_checks.name
+      DNS_TIMEOUT       = "5"
+      DNS_CACHE_SIZE    = "4096"
+      DNS_NEGATIVE_TTL  = "30"
+      METRICS_NAMESPACE = local.metrics_namespace
     }
   }
 
@@ -66,13 +91,24 @@ resource "aws_lambda_function" "http_prober" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 30
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["http_prober"].output_base64sha256
 
   environment {
     variables = {
-      EVENTBUS_NAME = aws_cloudwatch_event_bus.dns_checks.name
-      HTTP_TIMEOUT  = "10"
+      EVENTBUS_NAME       = aws_cloudwatch_event_bus.dns_checks.name
+      HTTP_TIMEOUT        = "10"
+      PROBE_MODE          = "per-ip"
+      PROBE_CONCURRENCY   = "8"
+      MAX_REDIRECTS       = tostring(var.probe_max_redirects)
+      METRICS_NAMESPACE   = local.metrics_namespace
+      DYNAMODB_TABLE      = aws_dynamodb_table.validations.name
+      HOST_RATE_LIMIT     = tostring(var.probe_rate_limits.host_rate)
+      HOST_RATE_BURST     = tostring(var.probe_rate_limits.host_burst)
+      IP_RATE_LIMIT       = tostring(var.probe_rate_limits.ip_rate)
+      IP_RATE_BURST       = tostring(var.probe_rate_limits.ip_burst)
+      RATE_LIMIT_MAX_WAIT = tostring(var.probe_rate_limits.max_wait)
     }
   }
 
@@ -91,13 +127,24 @@ resource "aws_lambda_function" "https_prober" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 30
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["https_prober"].output_base64sha256
 
   environment {
     variables = {
-      EVENTBUS_NAME = aws_cloudwatch_event_bus.dns_checks.name
-      HTTPS_TIMEOUT = "10"
+      EVENTBUS_NAME       = aws_cloudwatch_event_bus.dns_checks.name
+      HTTPS_TIMEOUT       = "10"
+      PROBE_MODE          = "per-ip"
+      PROBE_CONCURRENCY   = "8"
+      MAX_REDIRECTS       = tostring(var.probe_max_redirects)
+      METRICS_NAMESPACE   = local.metrics_namespace
+      DYNAMODB_TABLE      = aws_dynamodb_table.validations.name
+      HOST_RATE_LIMIT     = tostring(var.probe_rate_limits.host_rate)
+      HOST_RATE_BURST     = tostring(var.probe_rate_limits.host_burst)
+      IP_RATE_LIMIT       = tostring(var.probe_rate_limits.ip_rate)
+      IP_RATE_BURST       = tostring(var.probe_rate_limits.ip_burst)
+      RATE_LIMIT_MAX_WAIT = tostring(var.probe_rate_limits.max_wait)
     }
   }
 
@@ -116,13 +163,17 @@ resource "aws_lambda_function" "aggregator" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 30
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["aggregator"].output_base64sha256
 
   environment {
     variables = {
-      EVENTBUS_NAME  = aws_cloudwatch_event_bus.dns_checks.name
-      DYNAMODB_TABLE = aws_dynamodb_table.validations.name
+      EVENTBUS_NAME     = aws_cloudwatch_event_bus.dns_checks.name
+      DYNAMODB_TABLE    = aws_dynamodb_table.validations.name
+      STORAGE_LAYOUT    = var.storage_layout
+      RESULT_TTL_DAYS   = tostring(var.result_ttl_days)
+      METRICS_NAMESPACE = local.metrics_namespace
     }
   }
 
@@ -141,12 +192,19 @@ resource "aws_lambda_function" "status_api" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 30
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["status_api"].output_base64sha256
 
   environment {
     variables = {
-      DYNAMODB_TABLE = aws_dynamodb_table.validations.name
+      DYNAMODB_TABLE       = aws_dynamodb_table.validations.name
+      DYNAMODB_API         = "client"
+      STATUS_CACHE_SIZE    = "1024"
+      BATCH_GET_CHUNK_SIZE = "25"
+      STATUS_MAX_WAIT      = "20"
+      STORAGE_LAYOUT       = var.storage_layout
+      METRICS_NAMESPACE    = local.metrics_namespace
     }
   }
 
@@ -165,12 +223,16 @@ resource "aws_lambda_function" "ip_authorizer" {
   handler       = "lambda_function.lambda_handler"
   runtime       = "python3.13"
   timeout       = 5
+  layers        = [aws_lambda_layer_version.common.arn]
 
   source_code_hash = data.archive_file.lambda_zip["ip_authorizer"].output_base64sha256
 
   environment {
     variables = {
-      ALLOWED_IPS = "${trimspace(data.http.my_public_ip.response_body)}/32"
+      ALLOWED_IPS                 = "${trimspace(data.http.my_public_ip.response_body)}/32"
+      ALLOWED_IPS_PARAMETER       = var.allowed_ips_parameter
+      ALLOWED_IPS_REFRESH_SECONDS = "300"
+      METRICS_NAMESPACE           = local.metrics_namespace
     }
   }
 
@@ -181,6 +243,64 @@ resource "aws_lambda_function" "ip_authorizer" {
   tags = local.tags
 }
 
+# Bulk Job Lambda (POST/GET /jobs, BulkJobChunk and BulkJobDrained events)
+resource "aws_lambda_function" "bulk_job" {
+  filename      = data.archive_file.lambda_zip["bulk_job"].output_path
+  function_name = local.lambda_functions.bulk_job
+  role          = aws_iam_role.bulk_job.arn
+  handler       = "lambda_function.lambda_handler"
+  runtime       = "python3.13"
+  timeout       = 900
+  layers        = [aws_lambda_layer_version.common.arn]
+
+  source_code_hash = data.archive_file.lambda_zip["bulk_job"].output_base64sha256
+
+  environment {
+    variables = {
+      EVENTBUS_NAME     = aws_cloudwatch_event_bus.dns_checks.name
+      DYNAMODB_TABLE    = aws_dynamodb_table.validations.name
+      JOBS_BUCKET       = aws_s3_bucket.jobs.id
+      JOB_RATE          = tostring(var.bulk_job_rate)
+      JOB_CHUNK_SIZE    = tostring(var.bulk_job_chunk_size)
+      VALIDATION_BUDGET = tostring(var.validation_budget)
+      METRICS_NAMESPACE = local.metrics_namespace
+    }
+  }
+
+  depends_on = [
+    aws_cloudwatch_log_group.lambda_logs["bulk_job"]
+  ]
+
+  tags = local.tags
+}
+
+resource "aws_lambda_function" "history_exporter" {
+  filename      = data.archive_file.lambda_zip["history_exporter"].output_path
+  function_name = local.lambda_functions.history_exporter
+  role          = aws_iam_role.history_exporter.arn
+  handler       = "lambda_function.lambda_handler"
+  runtime       = "python3.13"
+  timeout       = 60
+  layers        = [aws_lambda_layer_version.common.arn]
+
+  source_code_hash = data.archive_file.lambda_zip["history_exporter"].output_base64sha256
+
+  environment {
+    variables = {
+      DYNAMODB_TABLE    = aws_dynamodb_table.validations.name
+      HISTORY_BUCKET    = aws_s3_bucket.history.id
+      HISTORY_FORMAT    = var.history_format
+      METRICS_NAMESPACE = local.metrics_namespace
+    }
+  }
+
+  depends_on = [
+    aws_cloudwatch_log_group.lambda_logs["history_exporter"]
+  ]
+
+  tags = local.tags
+}
+
 # Lambda permissions for EventBridge
 resource "aws_lambda_permission" "dns_resolver" {
   statement_id  = "AllowExecutionFromEventBridge"
@@ -207,9 +327,19 @@ resource "aws_lambda_permission" "https_prober" {
 }
 
 resource "aws_lambda_permission" "aggregator" {
+  count = var.aggregator_batching ? 0 : 1
+
   statement_id  = "AllowExecutionFromEventBridge"
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.aggregator.function_name
   principal     = "events.amazonaws.com"
   source_arn    = aws_cloudwatch_event_rule.aggregator_events.arn
 }
+
+resource "aws_lambda_permission" "bulk_job_events" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.bulk_job.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.bulk_job.arn
+}
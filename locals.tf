@@ -18,6 +18,9 @@ locals {
     aggregator    = "${local.project_name}-aggregator"
     status_api    = "${local.project_name}-status-api"
     ip_authorizer = "${local.project_name}-ip-authorizer"
+    bulk_job      = "${local.project_name}-bulk-job"
+
+    history_exporter = "${local.project_name}-history-exporter"
   }
 
   # EventBridge bus name
@@ -25,6 +28,9 @@ locals {
 
   # DynamoDB table name
   dynamodb_table_name = "${local.project_name}-validations"
+
+  # CloudWatch namespace of the handlers' embedded metric format (EMF) metrics
+  metrics_namespace = "DNSCheck/${local.project_name}"
 }
 
 # Build frontend before deployment
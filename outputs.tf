@@ -22,3 +22,18 @@ output "s3_bucket_name" {
   description = "S3 bucket name for frontend"
   value       = aws_s3_bucket.frontend.id
 }
+
+output "jobs_bucket_name" {
+  description = "S3 bucket for bulk job inputs and results files"
+  value       = aws_s3_bucket.jobs.id
+}
+
+output "history_bucket_name" {
+  description = "S3 bucket of the history export (files under history/ when history_export is enabled)"
+  value       = aws_s3_bucket.history.id
+}
+
+output "aggregator_queue_url" {
+  description = "SQS queue buffering aggregator events (null unless aggregator_batching is enabled)"
+  value       = var.aggregator_batching ? aws_sqs_queue.aggregator[0].url : null
+}
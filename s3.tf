@@ -91,3 +91,93 @@ resource "aws_s3_object" "frontend_files" {
     "application/octet-stream"
   )
 }
+
+# Bulk job inputs (any key) and results (results/<jobId>.ndjson.gz); private
+resource "aws_s3_bucket" "jobs" {
+  bucket = "${local.project_name}-jobs-${data.aws_caller_identity.current.account_id}"
+
+  force_destroy = true
+
+  tags = local.tags
+}
+
+resource "aws_s3_bucket_public_access_block" "jobs" {
+  bucket = aws_s3_bucket.jobs.id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "jobs" {
+  bucket = aws_s3_bucket.jobs.id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_lifecycle_configuration" "jobs" {
+  bucket = aws_s3_bucket.jobs.id
+
+  rule {
+    id     = "expire-results"
+    status = "Enabled"
+
+    filter {
+      prefix = "results/"
+    }
+
+    expiration {
+      days = var.bulk_job_results_expiration_days
+    }
+  }
+}
+
+# History export (history/date=<day>/target=<target>/<sequence>.<format>); private
+resource "aws_s3_bucket" "history" {
+  bucket = "${local.project_name}-history-${data.aws_caller_identity.current.account_id}"
+
+  force_destroy = true
+
+  tags = local.tags
+}
+
+resource "aws_s3_bucket_public_access_block" "history" {
+  bucket = aws_s3_bucket.history.id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "history" {
+  bucket = aws_s3_bucket.history.id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+
+resource "aws_s3_bucket_lifecycle_configuration" "history" {
+  bucket = aws_s3_bucket.history.id
+
+  rule {
+    id     = "expire-history"
+    status = "Enabled"
+
+    filter {
+      prefix = "history/"
+    }
+
+    expiration {
+      days = var.history_expiration_days
+    }
+  }
+}
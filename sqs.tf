@@ -0,0 +1,64 @@
+# SQS buffer for the aggregator (only when var.aggregator_batching is enabled)
+
+resource "aws_sqs_queue" "aggregator_dlq" {
+  count = var.aggregator_batching ? 1 : 0
+
+  name                      = "${local.project_name}-aggregator-dlq"
+  message_retention_seconds = 1209600
+
+  tags = local.tags
+}
+
+resource "aws_sqs_queue" "aggregator" {
+  count = var.aggregator_batching ? 1 : 0
+
+  name = "${local.project_name}-aggregator"
+  # At least 6x the aggregator timeout, as recommended for Lambda event sources
+  visibility_timeout_seconds = 6 * aws_lambda_function.aggregator.timeout
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.aggregator_dlq[0].arn
+    maxReceiveCount     = 5
+  })
+
+  tags = local.tags
+}
+
+# Allow the aggregator EventBridge rule to send to the queue
+resource "aws_sqs_queue_policy" "aggregator" {
+  count = var.aggregator_batching ? 1 : 0
+
+  queue_url = aws_sqs_queue.aggregator[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Sid    = "AllowEventBridge"
+      Effect = "Allow"
+      Principal = {
+        Service = "events.amazonaws.com"
+      }
+      Action   = "sqs:SendMessage"
+      Resource = aws_sqs_queue.aggregator[0].arn
+      Condition = {
+        ArnEquals = {
+          "aws:SourceArn" = aws_cloudwatch_event_rule.aggregator_events.arn
+        }
+      }
+    }]
+  })
+}
+
+resource "aws_lambda_event_source_mapping" "aggregator" {
+  count = var.aggregator_batching ? 1 : 0
+
+  event_source_arn                   = aws_sqs_queue.aggregator[0].arn
+  function_name                      = aws_lambda_function.aggregator.arn
+  batch_size                         = var.aggregator_batch_size
+  maximum_batching_window_in_seconds = var.aggregator_batch_window
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  depends_on = [
+    aws_iam_role_policy.aggregator_sqs
+  ]
+}
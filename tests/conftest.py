@@ -0,0 +1,49 @@
+"""Shared fixtures: the local runner (tools/dnscheck_local) and the shared layer on sys.path"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / 'tools'))
+sys.path.insert(0, str(REPO_ROOT / 'lambda-layers' / 'dnscheck-common' / 'python'))
+
+from dnscheck_local import Pipeline  # noqa: E402
+from dnscheck_local.dnsstub import StubDNSServer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def environment():
+    """The runner sets the handlers' environment in os.environ; each test starts from a clean one"""
+    saved = dict(os.environ)
+    os.environ['METRICS_ENABLED'] = 'false'
+    yield os.environ
+    os.environ.clear()
+    os.environ.update(saved)
+
+
+@pytest.fixture
+def dns():
+    """The pipeline's nameserver; names missing from its zone are NXDOMAIN"""
+    with StubDNSServer() as server:
+        yield server
+
+
+@pytest.fixture
+def pipeline(dns):
+    with Pipeline(env={'DNS_NAMESERVERS': dns.address}) as pipeline:
+        yield pipeline
+
+
+@pytest.fixture
+def emf_records(environment):
+    """EMF records the handlers write, captured instead of printed"""
+    from dnscheck_common import metrics
+
+    records = []
+    environment['METRICS_ENABLED'] = 'true'
+    metrics.set_sink(records.append)
+    yield records
+    metrics.set_sink(None)
@@ -0,0 +1,33 @@
+"""aggregator: SQS batches of step events"""
+
+import json
+
+import pytest
+
+
+def sqs_record(message_id, detail_type, detail):
+    body = {'detail-type': detail_type, 'source': 'dnscheck', 'detail': detail}
+    return {'messageId': message_id, 'body': json.dumps(body)}
+
+
+@pytest.fixture
+def aggregator(pipeline):
+    def invoke(*records):
+        return pipeline.invoke('aggregator', {'Records': list(records)})
+    return invoke
+
+
+def test_batch_counts_are_emf_metrics(pipeline, aggregator, emf_records, capsys):
+    response = aggregator(
+        sqs_record('m1', 'DNSFailed', {'requestId': 'r1', 'target': 'a.test', 'status': 'fail'}),
+        sqs_record('m2', 'DNSResolved', {'requestId': 'r2', 'target': 'b.test', 'status': 'ok'}),
+        {'messageId': 'm3', 'body': 'not json'},
+    )
+    pipeline.wait(10)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'm3'}]}
+    record = next(record for record in emf_records if record['Stage'] == 'aggregate')
+    assert record['Status'] == 'partial'
+    counts = [record[name] for name in ('Messages', 'MessagesFailed', 'Requests', 'RequestsCompleted', 'RequestsFinalized')]
+    assert counts == [3, 1, 2, 1, 1]
+    assert 'aggregatorBatch' not in capsys.readouterr().out
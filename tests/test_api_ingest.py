@@ -0,0 +1,82 @@
+"""api-ingest: parsing and validating POST /check submissions"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from dnscheck_local.runner import api_event
+
+
+def post_check(pipeline, body):
+    response = pipeline.invoke('api_ingest', api_event('POST', '/check', body=body))
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_multiple_targets_are_normalized_and_deduplicated(pipeline):
+    status, body = post_check(pipeline, {'targets': ['Example.com', 'https://example.com/path', 'example.org']})
+
+    assert status == 200
+    assert [request['target'] for request in body['requests']] == ['example.com', 'example.org']
+
+
+@pytest.mark.parametrize('item', [None, 123, True, {'target': 'example.com'}])
+def test_non_string_target_items_are_rejected(pipeline, item):
+    status, body = post_check(pipeline, {'targets': ['example.com', item]})
+
+    assert status == 400
+    assert body['invalid'] == [item]
+    assert pipeline.bus.events == []
+
+
+def put_summary(pipeline, request_id, finished_at, **attributes):
+    table = pipeline.facade.resource('dynamodb').Table('dnscheck-validations')
+    table.put_item(Item={
+        'requestId': request_id,
+        'step': 'SUMMARY',
+        'target': 'example.com',
+        'summaryTarget': 'example.com',
+        'finishedAt': finished_at,
+        'overallStatus': 'ok',
+        **attributes
+    })
+
+
+def test_max_age_reuses_a_summary_behind_timed_out_ones(pipeline):
+    now = datetime.utcnow()
+    put_summary(pipeline, 'usable', (now - timedelta(seconds=60)).isoformat() + 'Z')
+    for index in range(8):
+        finished_at = (now - timedelta(seconds=index + 1)).isoformat() + 'Z'
+        put_summary(pipeline, f'timed-out-{index}', finished_at, overallStatus='timeout', timedOut=True)
+
+    status, body = post_check(pipeline, {'target': 'example.com', 'maxAge': 300})
+
+    assert status == 200
+    assert body['requests'][0] == dict(body['requests'][0], requestId='usable', status='cached')
+    assert pipeline.bus.events == []
+
+
+def test_max_age_ignores_summaries_outside_the_window(pipeline):
+    put_summary(pipeline, 'old', (datetime.utcnow() - timedelta(seconds=600)).isoformat() + 'Z')
+
+    status, body = post_check(pipeline, {'target': 'example.com', 'maxAge': 300})
+
+    assert status == 200
+    assert body['requests'][0]['status'] == 'accepted'
+
+
+def test_plain_submission_does_not_touch_dynamodb(pipeline):
+    status, _ = post_check(pipeline, {'target': 'example.com'})
+
+    assert status == 200
+    assert set(pipeline.facade.call_counts()) == {'PutEvents'}
+
+
+def test_coalescing_returns_the_running_request(pipeline, environment):
+    environment['COALESCE_WINDOW'] = '60'
+
+    _, first = post_check(pipeline, {'target': 'example.com'})
+    _, second = post_check(pipeline, {'target': 'example.com'})
+
+    assert second['requests'][0]['status'] == 'coalesced'
+    assert second['requests'][0]['requestId'] == first['requests'][0]['requestId']
@@ -0,0 +1,76 @@
+"""bulk-job: POST /jobs, chunked reading of the input and the results file"""
+
+import gzip
+import json
+from decimal import Decimal
+
+import pytest
+
+from dnscheck_local.handlers import LambdaContext
+
+
+@pytest.fixture
+def bulk_job(pipeline):
+    return pipeline.handler('bulk_job')
+
+
+def upload(pipeline, tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return pipeline.upload(path)
+
+
+def test_job_runs_to_a_results_file(pipeline, tmp_path, environment):
+    environment['JOB_RATE'] = '0'
+    key = upload(pipeline, tmp_path, 'hosts.txt', '# comment\n127.0.0.1\n\n127.0.0.2\nbad..name\n')
+
+    job = pipeline.submit_job(key)
+    pipeline.wait(60)
+    status = pipeline.job(job['jobId'])
+
+    assert status['status'] == 'complete'
+    assert (status['submitted'], status['skipped'], status['completed']) == (2, 1, 2)
+    with gzip.open(pipeline.job_results(job['jobId']), 'rt') as results:
+        assert sorted(json.loads(line)['target'] for line in results) == ['127.0.0.1', '127.0.0.2']
+
+
+def test_missing_input_is_not_found(pipeline):
+    assert pipeline.submit_job('input/missing.txt')['statusCode'] == 404
+
+
+def test_request_ids_are_stable_per_line(bulk_job):
+    job_id = '0b7c2a3e-5f0e-4a53-9d3c-1f6f2c9e8a11'
+
+    assert bulk_job.line_request_id(job_id, 120) == bulk_job.line_request_id(job_id, 120)
+    assert bulk_job.line_request_id(job_id, 120) != bulk_job.line_request_id(job_id, 121)
+
+
+def test_retried_chunk_resends_the_same_requests(pipeline, bulk_job, tmp_path, environment):
+    environment['JOB_RATE'] = '0'
+    key = upload(pipeline, tmp_path, 'hosts.txt', '127.0.0.1\n127.0.0.2\n')
+    job_id = pipeline.submit_job(key)['jobId']
+    pipeline.wait(60)
+
+    # The same chunk again, as a Lambda retry of an invocation that never recorded it
+    table = pipeline.facade.resource('dynamodb').Table('dnscheck-validations')
+    table.update_item(
+        Key={'requestId': job_id, 'step': 'JOB'},
+        UpdateExpression='SET nextOffset = :zero, submitted = :zero, readDone = :false, jobStatus = :running '
+                         'REMOVE claimedOffset',
+        ExpressionAttributeValues={':zero': 0, ':false': False, ':running': 'running'}
+    )
+    sent = [e['detail'] for e in pipeline.bus.events if e['detail-type'] == 'ValidationRequested']
+    bulk_job.process_chunk({'jobId': job_id, 'offset': 0}, LambdaContext('bulk_job'))
+    pipeline.wait(60)
+    resent = [e['detail'] for e in pipeline.bus.events if e['detail-type'] == 'ValidationRequested'][len(sent):]
+
+    assert sorted(d['requestId'] for d in resent) == sorted(d['requestId'] for d in sent)
+    status = pipeline.job(job_id)
+    assert (status['submitted'], status['completed']) == (2, 2)
+
+
+def test_decimal_default(bulk_job):
+    assert bulk_job.decimal_default(Decimal('3')) == 3
+    assert bulk_job.decimal_default(Decimal('2.5')) == 2.5
+    with pytest.raises(TypeError):
+        bulk_job.decimal_default(object())
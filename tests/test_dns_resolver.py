@@ -0,0 +1,173 @@
+"""DNS resolver: wire format, fallbacks and failures against a local stub server"""
+
+import time
+
+import pytest
+
+from dnscheck_local.dnsstub import StubDNSServer
+from dnscheck_local.handlers import LambdaContext
+
+ZONE = {
+    'example.test': [('A', '192.0.2.1'), ('A', '192.0.2.2'), ('AAAA', '2001:db8::1')],
+    'www.example.test': [('CNAME', 'edge.example.test')],
+    'edge.example.test': [('CNAME', 'example.test')],
+    'v6only.example.test': [('AAAA', '2001:db8::6')],
+}
+
+
+@pytest.fixture
+def resolver(pipeline):
+    return pipeline.handler('dns_resolver')
+
+
+@pytest.fixture
+def stub():
+    with StubDNSServer(ZONE, rcodes={'broken.example.test': 'SERVFAIL'}) as server:
+        yield server
+
+
+def servers(*stubs):
+    return [(server.host, server.port) for server in stubs]
+
+
+def values(result):
+    return [answer['value'] for answer in result['answers'] if answer['type'] == result['qtype']]
+
+
+def test_a_and_aaaa_records(resolver, stub):
+    results = resolver.resolve('example.test', 2.0, servers(stub))
+
+    assert results['A']['rcode'] == 'NOERROR'
+    assert values(results['A']) == ['192.0.2.1', '192.0.2.2']
+    assert values(results['AAAA']) == ['2001:db8::1']
+    assert results['A']['transport'] == 'udp'
+    assert all(answer['ttl'] == 60 for answer in results['A']['answers'])
+
+
+def test_cname_chain_is_followed_to_the_addresses(resolver, stub):
+    results = resolver.resolve('www.example.test', 2.0, servers(stub))
+    _, _, _, ip_list = resolver.summarize('www.example.test', results)
+
+    cnames = [(a['name'], a['value']) for a in results['A']['answers'] if a['type'] == 'CNAME']
+    assert cnames == [('www.example.test', 'edge.example.test'), ('edge.example.test', 'example.test')]
+    assert values(results['CNAME']) == ['edge.example.test']
+    assert ip_list == ['192.0.2.1', '192.0.2.2', '2001:db8::1']
+
+
+def test_ipv6_only_target(resolver, stub):
+    results = resolver.resolve('v6only.example.test', 2.0, servers(stub))
+    _, _, _, ip_list = resolver.summarize('v6only.example.test', results)
+
+    assert values(results['A']) == []
+    assert ip_list == ['2001:db8::6']
+    assert resolver.failure_reason(results, ip_list) is None
+
+
+def test_truncated_udp_answer_is_retried_over_tcp(resolver):
+    with StubDNSServer(ZONE, truncate=True) as server:
+        results = resolver.resolve('example.test', 2.0, servers(server))
+
+    assert results['A']['transport'] == 'tcp'
+    assert values(results['A']) == ['192.0.2.1', '192.0.2.2']
+    assert ('tcp', 'example.test', 1) in server.queries
+
+
+def test_nxdomain(resolver, stub):
+    results = resolver.resolve('missing.example.test', 2.0, servers(stub))
+    _, _, _, ip_list = resolver.summarize('missing.example.test', results)
+
+    assert {result['rcode'] for result in results.values()} == {'NXDOMAIN'}
+    assert resolver.failure_reason(results, ip_list) == 'DNS resolution failed: NXDOMAIN'
+
+
+def test_servfail_asks_the_next_server(resolver, stub):
+    with StubDNSServer({'broken.example.test': [('A', '192.0.2.9')]}) as healthy:
+        results = resolver.resolve('broken.example.test', 2.0, servers(stub, healthy))
+
+    assert results['A']['rcode'] == 'NOERROR'
+    assert results['A']['server'] == healthy.address
+    assert values(results['A']) == ['192.0.2.9']
+
+
+def test_servfail_from_the_last_server_is_reported(resolver, stub):
+    results = resolver.resolve('broken.example.test', 2.0, servers(stub))
+    _, _, _, ip_list = resolver.summarize('broken.example.test', results)
+
+    assert results['A']['rcode'] == 'SERVFAIL'
+    assert resolver.failure_reason(results, ip_list) == 'DNS resolution failed: SERVFAIL'
+
+
+def test_timeout_is_split_between_servers(resolver, stub):
+    with StubDNSServer(silent=True) as silent:
+        started = time.monotonic()
+        results = resolver.resolve('example.test', 1.0, servers(silent, stub))
+        elapsed = time.monotonic() - started
+
+    # The silent server gets half the budget, then the next one answers
+    assert results['A']['server'] == stub.address
+    assert 0.4 < results['A']['latencyMs'] / 1000 < 0.9
+    assert elapsed < 1.0
+
+
+def test_every_server_silent_times_out(resolver):
+    with StubDNSServer(silent=True) as silent:
+        results = resolver.resolve('example.test', 0.3, servers(silent))
+    _, _, _, ip_list = resolver.summarize('example.test', results)
+
+    assert {result['rcode'] for result in results.values()} == {'TIMEOUT'}
+    assert resolver.failure_reason(results, ip_list) == 'DNS resolution timed out'
+
+
+@pytest.mark.parametrize('name', ['', 'a' * 70 + '.com', 'bad..example.test'])
+def test_unencodable_name_fails_the_queries(resolver, stub, name):
+    results = resolver.resolve(name, 1.0, servers(stub))
+
+    assert {result['rcode'] for result in results.values()} == {'ERROR'}
+    assert stub.queries == []
+
+
+def test_answers_are_cached(resolver, stub):
+    resolver.resolve('example.test', 2.0, servers(stub))
+    results = resolver.resolve('example.test', 2.0, servers(stub))
+
+    assert {result['cache'] for result in results.values()} == {'hit'}
+    assert len(stub.queries) == 3
+
+
+def test_parse_response_rejects_mismatched_id(resolver):
+    response = bytes.fromhex('1234 8180 0000 0000 0000 0000'.replace(' ', ''))
+
+    with pytest.raises(resolver.DNSError):
+        resolver.parse_response(response, 0x4321)
+
+
+def test_parse_response_rejects_compression_loops(resolver):
+    # One answer whose owner name points at itself
+    response = bytes.fromhex('1234 8180 0000 0001 0000 0000 c00c'.replace(' ', ''))
+
+    with pytest.raises(resolver.DNSError):
+        resolver.parse_response(response, 0x1234)
+
+
+def test_unencodable_target_fails_and_finalizes_the_request(pipeline, stub, environment):
+    environment['DNS_NAMESERVERS'] = stub.address
+    event = {'detail-type': 'ValidationRequested', 'detail': {'requestId': 'r1', 'target': 'a' * 70 + '.com'}}
+
+    response = pipeline.invoke('dns_resolver', event)
+    pipeline.wait(10)
+
+    assert response['statusCode'] == 200
+    assert [e['detail-type'] for e in pipeline.bus.events] == ['DNSFailed', 'ValidationFailed']
+
+
+def test_cache_counters_are_emf_metrics(pipeline, stub, environment, emf_records, capsys):
+    environment['DNS_NAMESERVERS'] = stub.address
+    event = {'detail-type': 'ValidationRequested', 'detail': {'requestId': 'r1', 'target': 'example.test'}}
+
+    pipeline.handler('dns_resolver').lambda_handler(event, LambdaContext('dns_resolver'))
+    pipeline.handler('dns_resolver').lambda_handler(event, LambdaContext('dns_resolver'))
+
+    first, second = [record for record in emf_records if record['Stage'] == 'dns']
+    assert (first['CacheHits'], first['CacheMisses'], first['CacheSize']) == (0, 3, 3)
+    assert (second['CacheHits'], second['CacheMisses'], second['CacheEvictions']) == (3, 0, 0)
+    assert 'dnsCache' not in capsys.readouterr().out
@@ -0,0 +1,120 @@
+"""The local runner end to end: routing, completion, storage layouts and the CLI"""
+
+import json
+import threading
+
+import pytest
+
+from dnscheck_local import Pipeline, SQLiteStore, cli
+from dnscheck_local.dnsstub import StubDNSServer
+
+STEP_EVENTS = [
+    ('DNSResolved', {'status': 'ok', 'ipList': ['127.0.0.1']}),
+    ('HTTPChecked', {'status': 'ok'}),
+    ('HTTPSChecked', {'status': 'ok'}),
+]
+
+
+@pytest.fixture
+def dns():
+    with StubDNSServer({'site.test': [('A', '127.0.0.1')]}) as server:
+        yield server
+
+
+def step_event(detail_type, request_id, detail):
+    return {
+        'detail-type': detail_type,
+        'source': 'dnscheck',
+        'detail': {'requestId': request_id, 'target': 'site.test', **detail}
+    }
+
+
+def final_events(pipeline, request_id):
+    return [
+        event for event in pipeline.bus.events
+        if event['detail-type'] in ('ValidationCompleted', 'ValidationFailed')
+        and event['detail']['requestId'] == request_id
+    ]
+
+
+def test_validate_runs_every_stage(pipeline):
+    [status] = pipeline.validate(['site.test'], timeout=30)
+
+    assert status['summary']['target'] == 'site.test'
+    assert sorted(step['step'] for step in status['steps']) == ['dnsresolved', 'httpchecked', 'httpschecked']
+    functions = sorted({invocation['function'] for invocation in pipeline.invocations})
+    assert functions == ['aggregator', 'api_ingest', 'dns_resolver', 'http_prober', 'https_prober', 'status_api']
+
+
+def test_concurrent_last_steps_complete_once(pipeline):
+    request_ids = [f'race-{i}' for i in range(10)]
+    barrier = threading.Barrier(len(STEP_EVENTS))
+
+    def deliver(detail_type, detail, request_id):
+        barrier.wait()
+        pipeline.invoke('aggregator', step_event(detail_type, request_id, detail))
+
+    for request_id in request_ids:
+        threads = [
+            threading.Thread(target=deliver, args=(detail_type, detail, request_id))
+            for detail_type, detail in STEP_EVENTS
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for request_id in request_ids:
+        assert len(final_events(pipeline, request_id)) == 1
+
+
+def test_sqs_batch_reports_only_the_failed_request(pipeline, monkeypatch):
+    aggregator = pipeline.handler('aggregator')
+    store_steps = aggregator.store_steps
+
+    def failing_store_steps(table, request_id, step_items):
+        if request_id == 'broken':
+            raise RuntimeError('throttled')
+        return store_steps(table, request_id, step_items)
+
+    monkeypatch.setattr(aggregator, 'store_steps', failing_store_steps)
+    records = [
+        {'messageId': f'{request_id}-{detail_type}', 'body': json.dumps(step_event(detail_type, request_id, detail))}
+        for request_id in ('healthy', 'broken') for detail_type, detail in STEP_EVENTS
+    ]
+
+    response = pipeline.invoke('aggregator', {'Records': records})
+
+    failed = sorted(failure['itemIdentifier'] for failure in response['batchItemFailures'])
+    assert failed == ['broken-DNSResolved', 'broken-HTTPChecked', 'broken-HTTPSChecked']
+    assert len(final_events(pipeline, 'healthy')) == 1
+    assert final_events(pipeline, 'broken') == []
+
+
+def test_single_layout_stores_one_item_per_request(dns, environment):
+    with Pipeline(env={'DNS_NAMESERVERS': dns.address, 'STORAGE_LAYOUT': 'single'}) as pipeline:
+        [status] = pipeline.validate(['site.test'], timeout=30)
+        request_id = status['summary']['requestId']
+        items = pipeline.store.partition('dnscheck-validations', request_id)
+
+    assert [item['step'] for item in items] == ['RESULT']
+    assert sorted(step['step'] for step in status['steps']) == ['dnsresolved', 'httpchecked', 'httpschecked']
+
+
+def test_sqlite_store_keeps_results_across_pipelines(dns, environment, tmp_path):
+    path = tmp_path / 'results.db'
+    with Pipeline(store=SQLiteStore(path), env={'DNS_NAMESERVERS': dns.address}) as pipeline:
+        [status] = pipeline.validate(['site.test'], timeout=30)
+
+    with Pipeline(store=SQLiteStore(path)) as pipeline:
+        stored = pipeline.status(status['summary']['requestId'])
+
+    assert stored['summary'] == status['summary']
+
+
+def test_cli_validate_prints_json(dns, environment, capsys):
+    exit_code = cli.main(['validate', 'site.test', '--json', '--env', f'DNS_NAMESERVERS={dns.address}'])
+
+    [status] = json.loads(capsys.readouterr().out)
+    assert status['summary']['target'] == 'site.test'
+    assert exit_code == (0 if status['summary']['overallStatus'] == 'ok' else 1)
@@ -0,0 +1,34 @@
+"""dnscheck_common.probes: picking addresses and combining per-address results"""
+
+from dnscheck_common import probes
+
+
+def test_ipv6_is_skipped_when_there_is_ipv4(environment):
+    assert probes.select_addresses(['192.0.2.1', '2001:db8::1']) == ['192.0.2.1']
+
+
+def test_ipv6_only_target_falls_back_to_valid_ipv6(environment):
+    assert probes.select_addresses(['2001:db8::1', 'not:an:address', 'bogus']) == ['2001:db8::1']
+
+
+def test_malformed_addresses_leave_nothing_to_probe(environment):
+    assert probes.select_addresses(['bogus', 'zz::zz::zz']) == []
+    assert probes.combine_results([]) == ('fail', None, 'No addresses to probe')
+
+
+def test_max_probe_ips(environment):
+    environment['MAX_PROBE_IPS'] = '2'
+
+    assert probes.select_addresses(['192.0.2.1', '192.0.2.2', '192.0.2.3']) == ['192.0.2.1', '192.0.2.2']
+
+
+def test_partial_failure_is_a_warning():
+    results = [
+        {'ip': '192.0.2.1', 'status': 'ok', 'httpStatusCode': 200, 'timings': {'total': 5}},
+        {'ip': '192.0.2.2', 'status': 'fail', 'reason': 'refused', 'timings': {'total': 1}},
+    ]
+
+    status, status_code, reason = probes.combine_results(results)
+
+    assert (status, status_code) == ('warn', 200)
+    assert reason == '1 of 2 addresses failed: 192.0.2.2 (refused)'
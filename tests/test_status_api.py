@@ -0,0 +1,26 @@
+"""status-api: GET /status responses and their caching headers"""
+
+import json
+
+from dnscheck_local.runner import api_event
+
+
+def get_status(pipeline, request_id):
+    return pipeline.invoke('status_api', api_event('GET', '/status', query={'requestId': request_id}))
+
+
+def test_completed_result_is_privately_cacheable(pipeline):
+    request_id = pipeline.submit(['127.0.0.1'])['requests'][0]['requestId']
+    pipeline.wait(30)
+
+    response = get_status(pipeline, request_id)
+
+    assert json.loads(response['body'])['summary']['requestId'] == request_id
+    assert response['headers']['Cache-Control'] == 'private, max-age=31536000, immutable'
+
+
+def test_unfinished_result_is_revalidated(pipeline):
+    response = get_status(pipeline, 'unknown-request')
+
+    assert json.loads(response['body'])['summary'] is None
+    assert response['headers']['Cache-Control'] == 'no-cache'
@@ -0,0 +1,12 @@
+"""Offline analytics over the validation history the exporter writes
+
+dataset finds and reads the date/target-partitioned history files (gzip
+NDJSON or Parquet) in a local directory or an S3 prefix; aggregates turns
+their rows into columns and computes percentiles and failure rates per
+group, vectorized with numpy when it is installed.
+"""
+
+from .aggregates import probe_columns, summarize, validation_columns
+from .dataset import list_files, load, read_file
+
+__all__ = ['list_files', 'load', 'probe_columns', 'read_file', 'summarize', 'validation_columns']
@@ -0,0 +1,180 @@
+"""Percentiles and failure rates of history rows, per group
+
+Rows are first turned into columns: a group key, the metric's value (None
+when the row doesn't have it) and whether the row failed. summarize() then
+reduces them per group. With numpy installed that is vectorized: counts and
+means come from bincount and every group's percentiles from one sort of all
+values. Without numpy the same numbers are computed group by group in plain
+Python. Percentiles interpolate linearly between the closest ranks, as
+numpy.percentile does by default.
+"""
+
+import math
+
+# Statuses that count as failures (a timeout is a failure of the request)
+FAILED_STATUSES = ('fail', 'timeout')
+
+# Group keys of validation rows
+VALIDATION_GROUPS = {
+    'all': lambda row: ('all',),
+    'date': lambda row: (row['finishedAt'][:10],),
+    'target': lambda row: (row['target'],),
+}
+
+# Group keys of probe rows (one per address and step)
+PROBE_GROUPS = {
+    'ip': lambda row, probe: (probe.get('ip') or '-',),
+    'target-ip': lambda row, probe: (row['target'], probe.get('ip') or '-'),
+}
+
+# numpy module, False when it isn't installed, None until first use
+_numpy = None
+
+
+def _backend():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def validation_columns(rows, by='target', metric='https'):
+    """(keys, values, failed) with one entry per validation
+
+    metric is a key of the rows' timings (dns, https, httpsTtfb, ...) or
+    endToEnd for the request's whole time in the pipeline.
+    """
+    group = VALIDATION_GROUPS[by]
+    keys, values, failed = [], [], []
+    for row in rows:
+        keys.append(group(row))
+        values.append(row.get('endToEndMs') if metric == 'endToEnd' else row.get('timings', {}).get(metric))
+        failed.append(row.get('overallStatus') in FAILED_STATUSES)
+    return keys, values, failed
+
+
+def probe_columns(rows, by='target-ip', step='https', metric='total'):
+    """(keys, values, failed) with one entry per probed address of step (http or https)
+
+    metric is a probe phase: connect, tls, ttfb, transfer, redirects or total.
+    """
+    group = PROBE_GROUPS[by]
+    keys, values, failed = [], [], []
+    for row in rows:
+        for probe in row.get('probes') or []:
+            if probe.get('step') != step:
+                continue
+            keys.append(group(row, probe))
+            values.append(probe.get(metric))
+            failed.append(probe.get('status') in FAILED_STATUSES)
+    return keys, values, failed
+
+
+def _interpolate(sorted_values, q):
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _summarize_python(groups, codes, values, failed, percentiles):
+    count = [0] * len(groups)
+    failures = [0] * len(groups)
+    samples = [[] for _ in groups]
+
+    for code, value, is_failed in zip(codes, values, failed):
+        count[code] += 1
+        failures[code] += is_failed
+        if value is not None:
+            samples[code].append(value)
+
+    stats = []
+    for code in range(len(groups)):
+        ordered = sorted(samples[code])
+        stats.append({
+            'count': count[code],
+            'failures': failures[code],
+            'samples': len(ordered),
+            'mean': sum(ordered) / len(ordered) if ordered else None,
+            'percentiles': [_interpolate(ordered, q) if ordered else None for q in percentiles]
+        })
+    return stats
+
+
+def _summarize_numpy(numpy, groups, codes, values, failed, percentiles):
+    codes = numpy.asarray(codes, dtype=numpy.int64)
+    values = numpy.array([math.nan if value is None else value for value in values], dtype=float)
+    size = len(groups)
+
+    count = numpy.bincount(codes, minlength=size)
+    failures = numpy.bincount(codes, weights=numpy.asarray(failed, dtype=float), minlength=size)
+
+    present = ~numpy.isnan(values)
+    codes, values = codes[present], values[present]
+    samples = numpy.bincount(codes, minlength=size)
+    sums = numpy.bincount(codes, weights=values, minlength=size)
+
+    # Values sorted by group, then value: group g's run starts at starts[g]
+    ordered = values[numpy.lexsort((values, codes))]
+    starts = numpy.concatenate(([0], numpy.cumsum(samples)[:-1]))
+    has_samples = samples > 0
+
+    columns = []
+    for q in percentiles:
+        # Groups without samples have no run to index into
+        position = (starts + (samples - 1) * q / 100)[has_samples]
+        lower = ordered[numpy.floor(position).astype(numpy.int64)]
+        upper = ordered[numpy.ceil(position).astype(numpy.int64)]
+        column = numpy.full(size, math.nan)
+        column[has_samples] = lower + (upper - lower) * (position - numpy.floor(position))
+        columns.append(column)
+
+    stats = []
+    for code in range(size):
+        stats.append({
+            'count': int(count[code]),
+            'failures': int(failures[code]),
+            'samples': int(samples[code]),
+            'mean': float(sums[code] / samples[code]) if has_samples[code] else None,
+            'percentiles': [float(column[code]) if has_samples[code] else None for column in columns]
+        })
+    return stats
+
+
+def summarize(keys, values, failed, percentiles=(50, 95, 99)):
+    """One summary per group key, sorted by key
+
+    Each has count, failures, failureRate, samples (rows with a value for
+    the metric), mean and p<N> for each percentile, rounded to 2 places.
+    """
+    groups = {}
+    codes = [groups.setdefault(key, len(groups)) for key in keys]
+
+    numpy = _backend()
+    if numpy:
+        stats = _summarize_numpy(numpy, list(groups), codes, values, failed, percentiles)
+    else:
+        stats = _summarize_python(list(groups), codes, values, failed, percentiles)
+
+    def rounded(value):
+        return None if value is None else round(value, 2)
+
+    summaries = []
+    for key, code in sorted(groups.items()):
+        stat = stats[code]
+        summary = {
+            'group': list(key),
+            'count': stat['count'],
+            'failures': stat['failures'],
+            'failureRate': round(stat['failures'] / stat['count'], 4),
+            'samples': stat['samples'],
+            'mean': rounded(stat['mean'])
+        }
+        for q, value in zip(percentiles, stat['percentiles']):
+            summary[f'p{q:g}'] = rounded(value)
+        summaries.append(summary)
+    return summaries
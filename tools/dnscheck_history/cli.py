@@ -0,0 +1,96 @@
+"""``dnscheck-history`` command line interface for the exported history"""
+
+import argparse
+import json
+import sys
+
+from . import aggregates, dataset
+
+
+def parse_percentiles(value):
+    try:
+        percentiles = tuple(float(q) for q in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected comma-separated numbers, got {value!r}')
+    if not all(0 <= q <= 100 for q in percentiles):
+        raise argparse.ArgumentTypeError('Percentiles must be between 0 and 100')
+    return percentiles
+
+
+def format_cell(key, value):
+    if value is None:
+        return '-'
+    if key == 'failureRate':
+        return f'{value:.1%}'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
+
+
+def print_table(summaries, by, percentiles):
+    group_header = by.upper().split('-')
+    stat_keys = ['count', 'failures', 'failureRate', 'samples', 'mean'] + [f'p{q:g}' for q in percentiles]
+    header = group_header + [key.upper() for key in stat_keys]
+
+    rows = [header]
+    for summary in summaries:
+        rows.append(summary['group'] + [format_cell(key, summary[key]) for key in stat_keys])
+
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(header))]
+    for row in rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def command_summary(args):
+    rows = dataset.load(args.root, since=args.since, until=args.until, targets=args.target)
+
+    if args.by in aggregates.PROBE_GROUPS:
+        metric = args.metric or 'total'
+        columns = aggregates.probe_columns(rows, by=args.by, step=args.step, metric=metric)
+    else:
+        metric = args.metric or 'https'
+        columns = aggregates.validation_columns(rows, by=args.by, metric=metric)
+
+    summaries = aggregates.summarize(*columns, percentiles=args.percentiles)
+
+    if args.json:
+        print(json.dumps({'validations': len(rows), 'metric': metric, 'groups': summaries}, indent=2))
+    else:
+        print(f'{len(rows)} validations, {metric} (ms)', file=sys.stderr)
+        print_table(summaries, args.by, args.percentiles)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='dnscheck-history',
+        description='Percentiles, failure rates and per-IP breakdowns of exported validation history'
+    )
+    parser.add_argument('root', metavar='ROOT', help='directory of history files or s3://bucket/prefix')
+    parser.add_argument('--since', help='first date or timestamp (ISO 8601) to include')
+    parser.add_argument('--until', help='last date or timestamp (ISO 8601) to include')
+    parser.add_argument('--target', action='append', help='only this target (repeatable)')
+    parser.add_argument('--by', default='target',
+                        choices=list(aggregates.VALIDATION_GROUPS) + list(aggregates.PROBE_GROUPS),
+                        help='group by validation (all, date, target; default target) or by probed address '
+                             '(ip, target-ip)')
+    parser.add_argument('--step', choices=['http', 'https'], default='https',
+                        help='probe step of --by ip/target-ip (default https)')
+    parser.add_argument('--metric',
+                        help='timing to aggregate: a timings key (dns, http, https, httpsTtfb, ...) or endToEnd '
+                             '(default https); with --by ip/target-ip a probe phase (connect, tls, ttfb, '
+                             'transfer, redirects, total; default total)')
+    parser.add_argument('--percentiles', type=parse_percentiles, default=(50, 95, 99),
+                        help='comma-separated percentiles (default 50,95,99)')
+    parser.add_argument('--json', action='store_true', help='print the summaries as JSON')
+    parser.set_defaults(func=command_summary)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
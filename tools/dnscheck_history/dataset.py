@@ -0,0 +1,126 @@
+"""Finding and reading the exporter's history files
+
+The exporter writes Hive-style partitions, one object per partition and
+stream batch:
+
+    history/date=2026-10-18/target=example.com/<sequence>.ndjson.gz
+
+A root is a local directory (for example a synced copy of the bucket, or
+the files ``dnscheck validate --history DIR`` exported) or an
+``s3://bucket/prefix`` URL, which needs boto3 and credentials. Partitions
+outside the date range or target list are skipped by their path alone.
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+from urllib.parse import unquote, urlsplit
+
+HISTORY_SUFFIXES = ('.ndjson.gz', '.parquet')
+
+PARTITION_RE = re.compile(r'(?:^|/)date=(\d{4}-\d{2}-\d{2})/target=([^/]+)/[^/]+$')
+
+
+def partition_of(path):
+    """(date, target) of a history file's path, or None if it isn't in a partition"""
+    match = PARTITION_RE.search(path.replace(os.sep, '/'))
+    if not match:
+        return None
+    return match.group(1), unquote(match.group(2))
+
+
+def wanted(path, since=None, until=None, targets=None):
+    """Whether the partition of path can hold rows in the range and of the targets"""
+    if not path.endswith(HISTORY_SUFFIXES):
+        return False
+    partition = partition_of(path)
+    if partition is None:
+        return False
+
+    date, target = partition
+    if since and date < since[:10]:
+        return False
+    if until and date > until[:10]:
+        return False
+    return not targets or target in targets
+
+
+def list_files(root, since=None, until=None, targets=None):
+    """History files under root (a directory or s3:// URL) that can hold matching rows"""
+    if root.startswith('s3://'):
+        return list_s3_files(root, since, until, targets)
+
+    found = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if wanted(path, since, until, targets):
+                found.append(path)
+    return sorted(found)
+
+
+def list_s3_files(root, since=None, until=None, targets=None):
+    import boto3
+
+    url = urlsplit(root)
+    paginator = boto3.client('s3').get_paginator('list_objects_v2')
+
+    found = []
+    for page in paginator.paginate(Bucket=url.netloc, Prefix=url.path.lstrip('/')):
+        for entry in page.get('Contents', []):
+            if wanted(entry['Key'], since, until, targets):
+                found.append(f"s3://{url.netloc}/{entry['Key']}")
+    return found
+
+
+def read_bytes(path):
+    if path.startswith('s3://'):
+        import boto3
+
+        url = urlsplit(path)
+        return boto3.client('s3').get_object(Bucket=url.netloc, Key=url.path.lstrip('/'))['Body'].read()
+
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def read_file(path):
+    """Rows of one history file"""
+    data = read_bytes(path)
+
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError(f'Reading {path} needs pyarrow (pip install pyarrow)')
+        rows = pyarrow.parquet.read_table(io.BytesIO(data)).to_pylist()
+        # timings is a map column, which pyarrow returns as (key, value) pairs
+        for row in rows:
+            if isinstance(row.get('timings'), list):
+                row['timings'] = dict(row['timings'])
+        return rows
+
+    return [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines() if line]
+
+
+def load(root, since=None, until=None, targets=None):
+    """Rows of every matching history file, one per requestId
+
+    since/until are ISO 8601 dates or timestamps compared with finishedAt.
+    The exporter delivers at least once, so a request can be in more than
+    one file; the first row read wins.
+    """
+    rows = {}
+    for path in list_files(root, since, until, targets):
+        for row in read_file(path):
+            if since and row['finishedAt'] < since:
+                continue
+            # A bare date includes that whole day
+            if until and row['finishedAt'][:len(until)] > until:
+                continue
+            if targets and row['target'] not in targets:
+                continue
+            rows.setdefault(row['requestId'], row)
+    return list(rows.values())
@@ -0,0 +1,12 @@
+"""Local, in-process runner for the DNS/HTTP validation pipeline
+
+Loads the Lambda handlers from lambda-functions/ unchanged and wires them
+together with an in-memory event bus (routing as in eventbridge.tf) and a
+local item store in place of DynamoDB. No AWS account or credentials needed.
+"""
+
+from .bus import EventBus
+from .runner import Pipeline
+from .store import MemoryStore, SQLiteStore, parse_store
+
+__all__ = ['EventBus', 'MemoryStore', 'Pipeline', 'SQLiteStore', 'parse_store']
@@ -0,0 +1,77 @@
+"""In-memory event bus that routes events the way eventbridge.tf does"""
+
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# (rule name, detail types, target functions), mirroring eventbridge.tf
+RULES = [
+    ('validation-requested', ['ValidationRequested'], ['dns_resolver']),
+    ('dns-resolved', ['DNSResolved'], ['http_prober', 'https_prober']),
+    ('aggregator', ['DNSResolved', 'DNSFailed', 'HTTPChecked', 'HTTPSChecked'], ['aggregator']),
+    ('bulk-job', ['BulkJobChunk', 'BulkJobDrained'], ['bulk_job']),
+]
+
+
+class EventBus:
+    """Delivers each published event to every matching rule target
+
+    Like EventBridge, delivery is asynchronous and targets of the same event
+    run concurrently (so the HTTP and HTTPS probers overlap). ``wait_idle``
+    blocks until no invocation is running or queued.
+    """
+
+    def __init__(self, invoke, rules=RULES, max_workers=32):
+        self.invoke = invoke
+        self.rules = rules
+        self.events = []
+        self.listeners = []
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dnscheck-bus')
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._events_lock = threading.Lock()
+
+    def targets_for(self, detail_type):
+        return [
+            target for _, detail_types, targets in self.rules
+            if detail_type in detail_types for target in targets
+        ]
+
+    def publish(self, event):
+        """Accept an event in EventBridge envelope form (detail as a JSON string)"""
+        event = dict(event)
+        if isinstance(event.get('detail'), str):
+            event['detail'] = json.loads(event['detail'])
+        event.setdefault('published', time.monotonic())
+
+        with self._events_lock:
+            self.events.append(event)
+
+        for listener in self.listeners:
+            listener(event)
+
+        for target in self.targets_for(event['detail-type']):
+            with self._idle:
+                self._pending += 1
+            self._pool.submit(self._deliver, target, event)
+
+    def _deliver(self, target, event):
+        try:
+            self.invoke(target, event)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with self._idle:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._idle.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Wait until every delivery (including ones they trigger) has finished"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
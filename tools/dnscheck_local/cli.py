@@ -0,0 +1,164 @@
+"""``dnscheck`` command line interface for the local pipeline"""
+
+import argparse
+import contextlib
+import json
+import shutil
+import sys
+
+from .runner import Pipeline
+from .store import parse_store
+
+STEP_COLUMNS = [
+    ('dns', ('dnsresolved', 'dnsfailed'), 'dns'),
+    ('http', ('httpchecked',), 'http'),
+    ('https', ('httpschecked',), 'https'),
+]
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs or []:
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError(f'Expected KEY=VALUE, got {pair!r}')
+        env[key] = value
+    return env
+
+
+def format_row(status):
+    summary = status.get('summary') or {}
+    steps = {step['step']: step for step in status.get('steps', [])}
+
+    cells = [summary.get('target', ''), summary.get('overallStatus', 'pending')]
+    reasons = []
+
+    for _, step_names, timing_key in STEP_COLUMNS:
+        step = next((steps[name] for name in step_names if name in steps), None)
+        if step is None:
+            cells.append('-')
+            continue
+        timing = step.get('timings', {}).get(timing_key)
+        cells.append(f"{step.get('status')} {timing:.0f}ms" if isinstance(timing, (int, float)) else step.get('status'))
+        if step.get('reason'):
+            reasons.append(f"{timing_key}: {step['reason']}")
+
+    cells.append('; '.join(reasons))
+    return cells
+
+
+def print_table(statuses):
+    header = ['TARGET', 'OVERALL', 'DNS', 'HTTP', 'HTTPS', 'REASON']
+    rows = [header] + [format_row(status) for status in statuses]
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(header) - 1)]
+    for row in rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)) + '  ' + row[-1])
+
+
+def copy_history(pipeline, directory):
+    """Run the history exporter over everything stored so far and copy its files to directory"""
+    exported = pipeline.export_history()
+    if exported.is_dir():
+        shutil.copytree(exported, directory, dirs_exist_ok=True)
+
+
+def command_validate(args):
+    # Handler log output (print() in Lambda) goes to stderr, results to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        with Pipeline(store=parse_store(args.store), env=parse_env(args.env), history=bool(args.history)) as pipeline:
+            statuses = pipeline.validate(args.targets, timeout=args.timeout)
+            if args.history:
+                copy_history(pipeline, args.history)
+
+    if args.json:
+        print(json.dumps(statuses, indent=2))
+    else:
+        print_table(statuses)
+
+    return 0 if all((s.get('summary') or {}).get('overallStatus') == 'ok' for s in statuses) else 1
+
+
+def command_status(args):
+    with contextlib.redirect_stdout(sys.stderr):
+        with Pipeline(store=parse_store(args.store), env=parse_env(args.env)) as pipeline:
+            statuses = [pipeline.status(request_id) for request_id in args.request_ids]
+
+    if args.json:
+        print(json.dumps(statuses, indent=2))
+    else:
+        print_table(statuses)
+    return 0
+
+
+def command_job(args):
+    options = {'format': args.format, 'column': args.column}
+    if args.header is not None:
+        options['header'] = args.header
+    options = {key: value for key, value in options.items() if value is not None}
+
+    with contextlib.redirect_stdout(sys.stderr):
+        with Pipeline(store=parse_store(args.store), env=parse_env(args.env), history=bool(args.history)) as pipeline:
+            submission = pipeline.submit_job(pipeline.upload(args.file), **options)
+            if submission['statusCode'] != 202:
+                print(f"Job rejected: {submission.get('error')}", file=sys.stderr)
+                return 1
+
+            pipeline.wait(args.timeout)
+            job = pipeline.job(submission['jobId'])
+            if job.get('resultKey') and args.output:
+                shutil.copyfile(pipeline.job_results(job['jobId']), args.output)
+            if args.history:
+                copy_history(pipeline, args.history)
+
+    job.pop('resultUrl', None)
+    print(json.dumps(job, indent=2))
+    return 0 if job['status'] == 'complete' else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='dnscheck', description='Run the DNS/HTTP validation pipeline locally')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def common(subparser):
+        subparser.add_argument('--store', default='memory', help='memory (default) or sqlite:PATH')
+        subparser.add_argument('--env', action='append', metavar='KEY=VALUE',
+                               help='environment variable for the handlers (repeatable)')
+        subparser.add_argument('--json', action='store_true', help='print the raw status responses as JSON')
+
+    validate = subparsers.add_parser('validate', help='validate one or more targets')
+    validate.add_argument('targets', nargs='+', metavar='TARGET')
+    validate.add_argument('--timeout', type=float, default=60, help='seconds to wait for the pipeline (default 60)')
+    validate.add_argument('--history', metavar='DIR',
+                          help='export the results as history files into DIR (read them with dnscheck-history)')
+    common(validate)
+    validate.set_defaults(func=command_validate)
+
+    status = subparsers.add_parser('status', help='show stored results (use with --store sqlite:PATH)')
+    status.add_argument('request_ids', nargs='+', metavar='REQUEST_ID')
+    common(status)
+    status.set_defaults(func=command_status)
+
+    job = subparsers.add_parser('job', help='run a bulk job over a file of targets (one per line, or CSV)')
+    job.add_argument('file', metavar='FILE')
+    job.add_argument('--format', choices=['lines', 'csv'], help='default: csv for *.csv files, else lines')
+    job.add_argument('--column', type=lambda value: int(value) if value.isdigit() else value,
+                     help='CSV column holding the target: name or 0-based index (default 0)')
+    job.add_argument('--header', action=argparse.BooleanOptionalAction, default=None,
+                     help='the CSV file starts with a header line (default: only with a named --column)')
+    job.add_argument('--output', metavar='PATH', help='copy the results file (gzip NDJSON) here')
+    job.add_argument('--timeout', type=float, default=600, help='seconds to wait for the job (default 600)')
+    job.add_argument('--history', metavar='DIR',
+                     help='export the results as history files into DIR (read them with dnscheck-history)')
+    common(job)
+    job.set_defaults(func=command_job)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Stub DNS server answering from a small in-memory zone
+
+Listens on UDP and TCP on the same local port, so the resolver can be
+pointed at it with DNS_NAMESERVERS=127.0.0.1:<port>:
+
+    with StubDNSServer({'www.example.test': [('CNAME', 'example.test')],
+                        'example.test': [('A', '192.0.2.1'), ('AAAA', '2001:db8::1')]}) as server:
+        os.environ['DNS_NAMESERVERS'] = server.address
+
+CNAMEs are followed within the zone, as a recursive resolver would. A name
+missing from the zone is NXDOMAIN, unless ``rcodes`` gives it another
+response code (e.g. SERVFAIL). With ``truncate=True`` every UDP answer has
+the TC flag and no records, so only TCP gets the records; with
+``silent=True`` queries are dropped. Every query is recorded in ``queries``
+as (transport, name, qtype).
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+
+QTYPES = {'A': 1, 'CNAME': 5, 'AAAA': 28}
+RCODES = {'NOERROR': 0, 'FORMERR': 1, 'SERVFAIL': 2, 'NXDOMAIN': 3, 'NOTIMP': 4, 'REFUSED': 5}
+
+FLAG_RESPONSE = 0x8000
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+
+# CNAME chains longer than this are cut off, like loops
+MAX_CNAME_HOPS = 8
+
+
+def encode_name(name):
+    labels = [label for label in name.rstrip('.').split('.') if label]
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in labels) + b'\x00'
+
+
+def parse_question(data):
+    """(query id, name, qtype, question bytes) of a query"""
+    query_id = struct.unpack('!H', data[:2])[0]
+    labels = []
+    offset = 12
+    while data[offset]:
+        length = data[offset]
+        labels.append(data[offset + 1:offset + 1 + length].decode('ascii'))
+        offset += 1 + length
+    offset += 1
+    qtype = struct.unpack('!H', data[offset:offset + 2])[0]
+    return query_id, '.'.join(labels), qtype, data[12:offset + 4]
+
+
+def encode_record(name, rtype, value, ttl):
+    if rtype == 'A':
+        rdata = socket.inet_pton(socket.AF_INET, value)
+    elif rtype == 'AAAA':
+        rdata = socket.inet_pton(socket.AF_INET6, value)
+    else:
+        rdata = encode_name(value)
+    return encode_name(name) + struct.pack('!HHIH', QTYPES[rtype], 1, ttl, len(rdata)) + rdata
+
+
+class StubDNSServer:
+    """UDP and TCP DNS server on a free port of host, answering from zone"""
+
+    def __init__(self, zone=None, rcodes=None, truncate=False, silent=False, ttl=60, host='127.0.0.1'):
+        self.zone = {name.lower(): records for name, records in (zone or {}).items()}
+        self.rcodes = {name.lower(): rcode for name, rcode in (rcodes or {}).items()}
+        self.truncate = truncate
+        self.silent = silent
+        self.ttl = ttl
+        self.queries = []
+        self._lock = threading.Lock()
+
+        self._udp = socketserver.ThreadingUDPServer((host, 0), _UDPHandler)
+        self._udp.daemon_threads = True
+        self._udp.stub = self
+        port = self._udp.server_address[1]
+        self._tcp = socketserver.ThreadingTCPServer((host, port), _TCPHandler)
+        self._tcp.daemon_threads = True
+        self._tcp.stub = self
+
+        self.host = host
+        self.port = port
+        self.address = f'{host}:{port}'
+
+        # A short poll interval keeps close() quick
+        for server in (self._udp, self._tcp):
+            threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def answer(self, data, transport):
+        """Response to the query data, or None to drop it"""
+        query_id, name, qtype, question = parse_question(data)
+        with self._lock:
+            self.queries.append((transport, name, qtype))
+        if self.silent:
+            return None
+
+        flags = FLAG_RESPONSE | FLAG_RD | FLAG_RA
+        records = []
+        rcode = RCODES.get(self.rcodes.get(name.lower(), 'NOERROR'))
+
+        if rcode == 0:
+            current = name.lower()
+            if current not in self.zone:
+                rcode = RCODES['NXDOMAIN']
+            for _ in range(MAX_CNAME_HOPS):
+                entries = self.zone.get(current, [])
+                cnames = [entry for entry in entries if entry[0] == 'CNAME']
+                if cnames and qtype != QTYPES['CNAME']:
+                    records.append((current, 'CNAME', cnames[0][1]))
+                    current = cnames[0][1].lower()
+                    continue
+                records.extend((current, rtype, value) for rtype, value, *_ in entries if QTYPES[rtype] == qtype)
+                break
+
+        if transport == 'udp' and self.truncate:
+            flags |= FLAG_TC
+            records = []
+
+        header = struct.pack('!HHHHHH', query_id, flags | rcode, 1, len(records), 0, 0)
+        return header + question + b''.join(encode_record(*record, self.ttl) for record in records)
+
+    def close(self):
+        for server in (self._udp, self._tcp):
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        data, sock = self.request
+        response = self.server.stub.answer(data, 'udp')
+        if response is not None:
+            sock.sendto(response, self.client_address)
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        length = self.request.recv(2)
+        if len(length) < 2:
+            return
+        data = b''
+        while len(data) < struct.unpack('!H', length)[0]:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            data += chunk
+        response = self.server.stub.answer(data, 'tcp')
+        if response is not None:
+            self.request.sendall(struct.pack('!H', len(response)) + response)
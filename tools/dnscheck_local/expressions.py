@@ -0,0 +1,491 @@
+"""Evaluator for the subset of DynamoDB expression syntax the handlers use
+
+Supports key condition, condition and filter expressions (comparisons,
+BETWEEN, IN, AND/OR/NOT, begins_with, contains, attribute_exists,
+attribute_not_exists, size) and update expressions (SET with +/-,
+if_not_exists and list_append, REMOVE, ADD and DELETE).
+"""
+
+import copy
+import re
+from decimal import Decimal
+
+MISSING = object()
+
+KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE'}
+COMPARATORS = {'=', '<>', '<', '<=', '>', '>='}
+
+TOKEN_RE = re.compile(
+    r'\s*(?:'
+    r'(?P<op><>|<=|>=|[=<>(),.\[\]+\-])|'
+    r'(?P<name>#[A-Za-z0-9_]+)|'
+    r'(?P<value>:[A-Za-z0-9_]+)|'
+    r'(?P<ident>[A-Za-z_][A-Za-z0-9_]*)|'
+    r'(?P<number>\d+)'
+    r')'
+)
+
+
+class ExpressionError(Exception):
+    """Raised for expressions DynamoDB would reject with a ValidationException"""
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise ExpressionError(f'Invalid syntax near: {expression[position:]!r}')
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+def get_path(item, path):
+    """Resolve a document path (tuple of str keys and int indexes) against an item"""
+    value = item
+    for element in path:
+        if isinstance(element, int):
+            if not isinstance(value, list) or element >= len(value):
+                return MISSING
+        elif not isinstance(value, dict) or element not in value:
+            return MISSING
+        value = value[element]
+    return value
+
+
+def _comparable(left, right):
+    if left is MISSING or right is MISSING:
+        return False
+    numeric = (int, Decimal)
+    if isinstance(left, numeric) and not isinstance(left, bool):
+        return isinstance(right, numeric) and not isinstance(right, bool)
+    return type(left) is type(right)
+
+
+def compare(operator, left, right):
+    if operator == '=':
+        return _comparable(left, right) and left == right
+    if operator == '<>':
+        return not (_comparable(left, right) and left == right)
+    if not _comparable(left, right) or isinstance(left, (dict, list, set, bool)):
+        return False
+    if operator == '<':
+        return left < right
+    if operator == '<=':
+        return left <= right
+    if operator == '>':
+        return left > right
+    return left >= right
+
+
+class _Parser:
+
+    def __init__(self, expression, names, values):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+        self.used_names = set()
+        self.used_values = set()
+
+    # Token helpers
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ExpressionError('Unexpected end of expression')
+        self.position += 1
+        return token
+
+    def accept_op(self, op):
+        if self.peek() == ('op', op):
+            self.position += 1
+            return True
+        return False
+
+    def expect_op(self, op):
+        if not self.accept_op(op):
+            raise ExpressionError(f'Expected {op!r}, got {self.peek()[1]!r}')
+
+    def accept_keyword(self, keyword):
+        kind, text = self.peek()
+        if kind == 'ident' and text.upper() == keyword:
+            self.position += 1
+            return True
+        return False
+
+    def at_end(self):
+        return self.position >= len(self.tokens)
+
+    # Operands
+
+    def path(self):
+        kind, text = self.next()
+        if kind == 'name':
+            if text not in self.names:
+                raise ExpressionError(f'Undefined attribute name: {text}')
+            self.used_names.add(text)
+            elements = [self.names[text]]
+        elif kind == 'ident' and text.upper() not in KEYWORDS:
+            elements = [text]
+        else:
+            raise ExpressionError(f'Expected attribute path, got {text!r}')
+
+        while True:
+            if self.accept_op('.'):
+                kind, text = self.next()
+                if kind == 'name':
+                    if text not in self.names:
+                        raise ExpressionError(f'Undefined attribute name: {text}')
+                    self.used_names.add(text)
+                    elements.append(self.names[text])
+                elif kind == 'ident':
+                    elements.append(text)
+                else:
+                    raise ExpressionError(f'Invalid path element {text!r}')
+            elif self.accept_op('['):
+                kind, text = self.next()
+                if kind != 'number':
+                    raise ExpressionError('List index must be a number')
+                elements.append(int(text))
+                self.expect_op(']')
+            else:
+                return tuple(elements)
+
+    def value_ref(self):
+        _, text = self.next()
+        if text not in self.values:
+            raise ExpressionError(f'Undefined attribute value: {text}')
+        self.used_values.add(text)
+        value = self.values[text]
+        return lambda item: value
+
+    def operand(self):
+        """Operand inside a condition: value, path or size(path)"""
+        kind, text = self.peek()
+        if kind == 'value':
+            return self.value_ref()
+        if kind == 'ident' and text == 'size' and self.peek(1) == ('op', '('):
+            self.position += 2
+            path = self.path()
+            self.expect_op(')')
+
+            def size(item):
+                value = get_path(item, path)
+                if value is MISSING:
+                    return MISSING
+                return Decimal(len(value))
+            return size
+        path = self.path()
+        return lambda item: get_path(item, path)
+
+    # Conditions
+
+    def condition(self):
+        left = self.and_condition()
+        while self.accept_keyword('OR'):
+            right = self.and_condition()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def and_condition(self):
+        left = self.not_condition()
+        while self.accept_keyword('AND'):
+            right = self.not_condition()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def not_condition(self):
+        if self.accept_keyword('NOT'):
+            inner = self.not_condition()
+            return lambda item: not inner(item)
+        return self.primary_condition()
+
+    def primary_condition(self):
+        if self.accept_op('('):
+            inner = self.condition()
+            self.expect_op(')')
+            return inner
+
+        kind, text = self.peek()
+        if kind == 'ident' and self.peek(1) == ('op', '(') and text != 'size':
+            return self.function_condition()
+
+        left = self.operand()
+
+        if self.accept_keyword('BETWEEN'):
+            low = self.operand()
+            if not self.accept_keyword('AND'):
+                raise ExpressionError('Expected AND in BETWEEN')
+            high = self.operand()
+            return lambda item: compare('>=', left(item), low(item)) and compare('<=', left(item), high(item))
+
+        if self.accept_keyword('IN'):
+            self.expect_op('(')
+            options = [self.operand()]
+            while self.accept_op(','):
+                options.append(self.operand())
+            self.expect_op(')')
+            return lambda item: any(compare('=', left(item), option(item)) for option in options)
+
+        kind, operator = self.next()
+        if kind != 'op' or operator not in COMPARATORS:
+            raise ExpressionError(f'Expected comparator, got {operator!r}')
+        right = self.operand()
+        return lambda item: compare(operator, left(item), right(item))
+
+    def function_condition(self):
+        _, function = self.next()
+        self.expect_op('(')
+
+        if function in ('attribute_exists', 'attribute_not_exists'):
+            path = self.path()
+            self.expect_op(')')
+            if function == 'attribute_exists':
+                return lambda item: get_path(item, path) is not MISSING
+            return lambda item: get_path(item, path) is MISSING
+
+        if function in ('begins_with', 'contains'):
+            target = self.operand()
+            self.expect_op(',')
+            operand = self.operand()
+            self.expect_op(')')
+
+            if function == 'begins_with':
+                def begins_with(item):
+                    value, prefix = target(item), operand(item)
+                    return isinstance(value, (str, bytes)) and type(value) is type(prefix) and value.startswith(prefix)
+                return begins_with
+
+            def contains(item):
+                value, member = target(item), operand(item)
+                if isinstance(value, str):
+                    return isinstance(member, str) and member in value
+                if isinstance(value, (set, frozenset, list)):
+                    return member in value
+                return False
+            return contains
+
+        raise ExpressionError(f'Unsupported function: {function}')
+
+    # Updates
+
+    def update_value(self):
+        left = self.update_operand()
+        if self.accept_op('+'):
+            right = self.update_operand()
+            return lambda item: _arithmetic(left(item), right(item), 1)
+        if self.accept_op('-'):
+            right = self.update_operand()
+            return lambda item: _arithmetic(left(item), right(item), -1)
+        return left
+
+    def update_operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            return self.value_ref()
+        if kind == 'ident' and self.peek(1) == ('op', '('):
+            self.position += 2
+            if text == 'if_not_exists':
+                path = self.path()
+                self.expect_op(',')
+                default = self.update_value()
+                self.expect_op(')')
+
+                def if_not_exists(item):
+                    value = get_path(item, path)
+                    return default(item) if value is MISSING else value
+                return if_not_exists
+            if text == 'list_append':
+                first = self.update_value()
+                self.expect_op(',')
+                second = self.update_value()
+                self.expect_op(')')
+
+                def list_append(item):
+                    a, b = first(item), second(item)
+                    if not isinstance(a, list) or not isinstance(b, list):
+                        raise ExpressionError('list_append operands must be lists')
+                    return a + b
+                return list_append
+            raise ExpressionError(f'Unsupported function: {text}')
+
+        path = self.path()
+
+        def read(item):
+            value = get_path(item, path)
+            if value is MISSING:
+                raise ExpressionError('The provided expression refers to an attribute that does not exist in the item')
+            return value
+        return read
+
+    def update(self):
+        actions = []
+        seen_clauses = set()
+        while not self.at_end():
+            _, clause = self.next()
+            clause = clause.upper()
+            if clause not in ('SET', 'REMOVE', 'ADD', 'DELETE') or clause in seen_clauses:
+                raise ExpressionError(f'Invalid update clause: {clause}')
+            seen_clauses.add(clause)
+
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect_op('=')
+                    actions.append((clause, path, self.update_value()))
+                elif clause == 'REMOVE':
+                    actions.append((clause, path, None))
+                else:
+                    if self.peek()[0] != 'value':
+                        raise ExpressionError(f'{clause} requires a value')
+                    actions.append((clause, path, self.value_ref()))
+                if not self.accept_op(','):
+                    break
+        return actions
+
+
+def _arithmetic(left, right, sign):
+    numeric = (int, Decimal)
+    if not isinstance(left, numeric) or not isinstance(right, numeric):
+        raise ExpressionError('Incorrect operand type for operator or function')
+    return Decimal(left) + sign * Decimal(right)
+
+
+class Expressions:
+    """Compiles all expressions of one request, sharing the name/value maps
+
+    DynamoDB rejects requests whose ExpressionAttributeNames or
+    ExpressionAttributeValues contain unused entries, so the maps are checked
+    once every expression of the request has been compiled.
+    """
+
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = values or {}
+        self.used_names = set()
+        self.used_values = set()
+
+    def _parser(self, expression):
+        return _Parser(expression, self.names, self.values)
+
+    def _finish(self, parser):
+        if not parser.at_end():
+            raise ExpressionError(f'Unexpected token: {parser.peek()[1]!r}')
+        self.used_names |= parser.used_names
+        self.used_values |= parser.used_values
+
+    def condition(self, expression):
+        """Compile a condition into a predicate over items"""
+        if not expression:
+            return None
+        parser = self._parser(expression)
+        predicate = parser.condition()
+        self._finish(parser)
+        return predicate
+
+    def update(self, expression):
+        """Compile an update expression into a list of actions"""
+        parser = self._parser(expression)
+        actions = parser.update()
+        self._finish(parser)
+        return actions
+
+    def projection(self, expression):
+        """Compile a projection expression into a list of paths"""
+        if not expression:
+            return None
+        paths = []
+        for part in expression.split(','):
+            parser = self._parser(part)
+            paths.append(parser.path())
+            self._finish(parser)
+        return paths
+
+    def check_all_used(self):
+        unused = (set(self.names) - self.used_names) | (set(self.values) - self.used_values)
+        if unused:
+            raise ExpressionError(
+                f'Value provided in ExpressionAttributeNames/Values unused in expressions: {sorted(unused)}'
+            )
+
+
+def _set_path(item, path, value):
+    parent = get_path(item, path[:-1]) if len(path) > 1 else item
+    if parent is MISSING or not isinstance(parent, (dict, list)):
+        raise ExpressionError('The document path provided in the update expression is invalid for update')
+    key = path[-1]
+    if isinstance(parent, list):
+        if not isinstance(key, int):
+            raise ExpressionError('The document path provided in the update expression is invalid for update')
+        if key >= len(parent):
+            parent.append(value)
+        else:
+            parent[key] = value
+    else:
+        parent[key] = value
+
+
+def _remove_path(item, path):
+    parent = get_path(item, path[:-1]) if len(path) > 1 else item
+    if parent is MISSING:
+        return
+    key = path[-1]
+    if isinstance(parent, dict):
+        parent.pop(key, None)
+    elif isinstance(parent, list) and isinstance(key, int) and key < len(parent):
+        del parent[key]
+
+
+def apply_update(item, actions):
+    """Apply compiled update actions, returning the new item
+
+    As in DynamoDB, every operand is evaluated against the item as it was
+    before the update.
+    """
+    original = item
+    updated = copy.deepcopy(item)
+
+    for clause, path, operand in actions:
+        if clause == 'SET':
+            _set_path(updated, path, copy.deepcopy(operand(original)))
+
+        elif clause == 'REMOVE':
+            _remove_path(updated, path)
+
+        elif clause == 'ADD':
+            value = operand(original)
+            current = get_path(updated, path)
+            if isinstance(value, (set, frozenset)):
+                if current is MISSING:
+                    current = set()
+                if not isinstance(current, (set, frozenset)):
+                    raise ExpressionError('An operand in the update expression has an incorrect data type')
+                _set_path(updated, path, set(current) | set(value))
+            elif isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+                if current is MISSING:
+                    current = Decimal(0)
+                _set_path(updated, path, _arithmetic(current, value, 1))
+            else:
+                raise ExpressionError('ADD only supports numbers and sets')
+
+        elif clause == 'DELETE':
+            value = operand(original)
+            current = get_path(updated, path)
+            if current is MISSING:
+                continue
+            remaining = set(current) - set(value)
+            if remaining:
+                _set_path(updated, path, remaining)
+            else:
+                _remove_path(updated, path)
+
+    return updated
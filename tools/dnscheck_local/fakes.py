@@ -0,0 +1,911 @@
+"""In-process stand-ins for the AWS clients the Lambda handlers create
+
+The handlers are loaded unmodified; they get these objects from
+``boto3.client()`` / ``boto3.resource()`` through :class:`Boto3Facade`.
+The low-level DynamoDB client wraps the same tables, so both APIs see the
+same data and count calls together. S3 objects are plain files under a
+local directory.
+Behaviour that the handlers rely on is kept faithful to the real services:
+numbers come back as Decimal, floats are rejected, PutEvents takes at most
+10 entries, and failed conditions raise ClientError with
+ConditionalCheckFailedException.
+"""
+
+import contextlib
+import copy
+import re
+import shutil
+import sys
+import threading
+import types
+import uuid
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from .expressions import MISSING, ExpressionError, Expressions, apply_update, get_path
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:
+    class ClientError(Exception):
+        """Same constructor and ``response`` shape as botocore's ClientError"""
+
+        def __init__(self, error_response, operation_name):
+            self.response = error_response
+            self.operation_name = operation_name
+            error = error_response.get('Error', {})
+            super().__init__(
+                f"An error occurred ({error.get('Code')}) when calling the "
+                f"{operation_name} operation: {error.get('Message')}"
+            )
+
+
+# Mirrors dynamodb.tf
+VALIDATIONS_SCHEMA = {
+    'hash': 'requestId',
+    'range': 'step',
+    'indexes': {
+        'byTarget': {'hash': 'target', 'range': 'time', 'projection': 'ALL'},
+        'byTargetSummary': {
+            'hash': 'summaryTarget',
+            'range': 'finishedAt',
+            'projection': 'INCLUDE',
+            'include': ['target', 'startedAt', 'overallStatus', 'timedOut']
+        },
+        'byJob': {
+            'hash': 'summaryJob',
+            'range': 'requestId',
+            'projection': 'INCLUDE',
+            'include': ['target', 'overallStatus', 'startedAt', 'finishedAt']
+        }
+    }
+}
+
+
+def client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def to_stored(value):
+    """Normalize a value the way DynamoDB would store it
+
+    ints become Decimal and floats are rejected, exactly like the boto3
+    TypeSerializer does, so handler bugs show up locally too.
+    """
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, (set, frozenset)):
+        if not value:
+            raise client_error('ValidationException', 'An string set may not be empty', 'PutItem')
+        return {to_stored(v) for v in value}
+    if isinstance(value, (list, tuple)):
+        return [to_stored(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_stored(v) for k, v in value.items()}
+    raise TypeError(f'Unsupported type "{type(value)}" for value "{value}"')
+
+
+class FakeEventBridge:
+    """``boto3.client('events')`` that publishes onto a local :class:`EventBus`"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.calls = Counter()
+
+    def put_events(self, Entries):
+        self.calls['PutEvents'] += 1
+
+        if not 1 <= len(Entries) <= 10:
+            raise client_error('ValidationException', 'Entries must contain between 1 and 10 items', 'PutEvents')
+
+        results = []
+        for entry in Entries:
+            event_id = str(uuid.uuid4())
+            self.bus.publish({
+                'version': '0',
+                'id': event_id,
+                'detail-type': entry['DetailType'],
+                'source': entry['Source'],
+                'time': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'region': 'local',
+                'resources': entry.get('Resources', []),
+                'detail': entry['Detail']
+            })
+            results.append({'EventId': event_id})
+
+        return {'FailedEntryCount': 0, 'Entries': results}
+
+
+class FakeTable:
+    """``dynamodb.Table(name)`` backed by a :mod:`store`"""
+
+    def __init__(self, name, schema, store, calls):
+        self.name = name
+        self.table_name = name
+        self.schema = schema
+        self.store = store
+        self.calls = calls
+        self._lock = threading.RLock()
+
+    # Helpers
+
+    def _key(self, item):
+        try:
+            return item[self.schema['hash']], item[self.schema['range']]
+        except KeyError:
+            raise client_error(
+                'ValidationException', 'The provided key element does not match the schema', 'PutItem'
+            )
+
+    def _key_attributes(self, item, index=None):
+        names = [self.schema['hash'], self.schema['range']]
+        if index:
+            names += [index['hash'], index.get('range')]
+        return {name: item[name] for name in names if name and name in item}
+
+    @staticmethod
+    def _project(item, paths):
+        if paths is None:
+            return item
+        projected = {}
+        for path in paths:
+            value = get_path(item, path)
+            if value is not MISSING:
+                projected[path[0]] = copy.deepcopy(item[path[0]]) if len(path) > 1 else value
+        return projected
+
+    @staticmethod
+    def _condition_failed(operation, item=None):
+        error = client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+        if item is not None:
+            error.response['Item'] = item
+        return error
+
+    # Single-item operations
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self.calls['PutItem'] += 1
+        item = to_stored(Item)
+        key = self._key(item)
+
+        expressions = Expressions(ExpressionAttributeNames, to_stored(ExpressionAttributeValues or {}))
+        condition = expressions.condition(ConditionExpression)
+        expressions.check_all_used()
+
+        with self._lock:
+            existing = self.store.get(self.name, key)
+            if condition and not condition(existing or {}):
+                raise self._condition_failed('PutItem')
+            self.store.put(self.name, key, item)
+
+        return {'Attributes': existing} if ReturnValues == 'ALL_OLD' and existing else {}
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None,
+                 ExpressionAttributeNames=None):
+        self.calls['GetItem'] += 1
+        expressions = Expressions(ExpressionAttributeNames)
+        projection = expressions.projection(ProjectionExpression)
+        expressions.check_all_used()
+
+        item = self.store.get(self.name, self._key(Key))
+        return {'Item': self._project(item, projection)} if item else {}
+
+    def _update_actions(self, UpdateExpression, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, operation):
+        expressions = Expressions(ExpressionAttributeNames, to_stored(ExpressionAttributeValues or {}))
+        actions = expressions.update(UpdateExpression)
+        condition = expressions.condition(ConditionExpression)
+        expressions.check_all_used()
+
+        for _, path, _ in actions:
+            if path[0] in (self.schema['hash'], self.schema['range']):
+                raise client_error(
+                    'ValidationException', 'Cannot update attribute; this attribute is part of the key', operation
+                )
+        return actions, condition
+
+    def _updated(self, Key, existing, actions, condition, operation):
+        """The item after an update, checking its condition first; call with the lock held"""
+        if condition and not condition(existing or {}):
+            raise self._condition_failed(operation)
+
+        try:
+            return apply_update(existing or dict(to_stored(Key)), actions)
+        except ExpressionError as e:
+            raise client_error('ValidationException', str(e), operation)
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ReturnValues='NONE'):
+        self.calls['UpdateItem'] += 1
+        key = self._key(Key)
+        actions, condition = self._update_actions(
+            UpdateExpression, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, 'UpdateItem'
+        )
+
+        with self._lock:
+            existing = self.store.get(self.name, key)
+            updated = self._updated(Key, existing, actions, condition, 'UpdateItem')
+            self.store.put(self.name, key, updated)
+
+        touched = {path[0] for _, path, _ in actions}
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': updated}
+        if ReturnValues == 'UPDATED_NEW':
+            return {'Attributes': {k: v for k, v in updated.items() if k in touched}}
+        if ReturnValues == 'ALL_OLD' and existing:
+            return {'Attributes': existing}
+        if ReturnValues == 'UPDATED_OLD' and existing:
+            return {'Attributes': {k: v for k, v in existing.items() if k in touched}}
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self.calls['DeleteItem'] += 1
+        key = self._key(Key)
+
+        expressions = Expressions(ExpressionAttributeNames, to_stored(ExpressionAttributeValues or {}))
+        condition = expressions.condition(ConditionExpression)
+        expressions.check_all_used()
+
+        with self._lock:
+            existing = self.store.get(self.name, key)
+            if condition and not condition(existing or {}):
+                raise self._condition_failed('DeleteItem')
+            self.store.delete(self.name, key)
+
+        return {'Attributes': existing} if ReturnValues == 'ALL_OLD' and existing else {}
+
+    def _transact_write(self, kind, request):
+        """Check one TransactWriteItems action; returns (key, item or None to delete, write at all)
+
+        Call with the lock held. Raises like the single-item operation would.
+        """
+        if kind == 'Update':
+            key = self._key(request['Key'])
+            actions, condition = self._update_actions(
+                request['UpdateExpression'], request.get('ConditionExpression'),
+                request.get('ExpressionAttributeNames'), request.get('ExpressionAttributeValues'),
+                'TransactWriteItems'
+            )
+            existing = self.store.get(self.name, key)
+            return key, self._updated(request['Key'], existing, actions, condition, 'TransactWriteItems'), True
+
+        item = to_stored(request['Item']) if kind == 'Put' else None
+        key = self._key(item if kind == 'Put' else request['Key'])
+        expressions = Expressions(
+            request.get('ExpressionAttributeNames'), to_stored(request.get('ExpressionAttributeValues') or {})
+        )
+        condition = expressions.condition(request.get('ConditionExpression'))
+        expressions.check_all_used()
+
+        existing = self.store.get(self.name, key)
+        if condition and not condition(existing or {}):
+            raise self._condition_failed('TransactWriteItems')
+        return key, item, kind != 'ConditionCheck'
+
+    # Queries
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, ConsistentRead=False, Select=None):
+        self.calls['Query'] += 1
+
+        if not isinstance(KeyConditionExpression, str):
+            raise TypeError('Only string KeyConditionExpressions are supported locally')
+
+        expressions = Expressions(ExpressionAttributeNames, to_stored(ExpressionAttributeValues or {}))
+        key_condition = expressions.condition(KeyConditionExpression)
+        item_filter = expressions.condition(FilterExpression)
+        projection = expressions.projection(ProjectionExpression)
+        expressions.check_all_used()
+
+        if IndexName:
+            if IndexName not in self.schema['indexes']:
+                raise client_error(
+                    'ValidationException', f'The table does not have the specified index: {IndexName}', 'Query'
+                )
+            index = self.schema['indexes'][IndexName]
+            if ConsistentRead:
+                raise client_error(
+                    'ValidationException', 'Consistent reads are not supported on global secondary indexes', 'Query'
+                )
+        else:
+            index = None
+
+        hash_name = index['hash'] if index else self.schema['hash']
+        range_name = index.get('range') if index else self.schema['range']
+
+        # Sparse index: only items carrying the index key attributes are in it
+        candidates = [
+            item for item in self.store.scan(self.name)
+            if hash_name in item and (not range_name or range_name in item)
+        ] if index else None
+
+        if candidates is None:
+            hash_value = self._hash_value(KeyConditionExpression, expressions, hash_name)
+            candidates = self.store.partition(self.name, hash_value)
+
+        matches = [item for item in candidates if key_condition(item)]
+
+        # Stable order: index range key, then table key as tie-breaker
+        def order(item):
+            return (
+                item.get(range_name, '') if range_name else '',
+                str(item[self.schema['hash']]),
+                str(item[self.schema['range']])
+            )
+        matches.sort(key=order, reverse=not ScanIndexForward)
+
+        if ExclusiveStartKey:
+            start = order(to_stored(ExclusiveStartKey))
+            matches = [
+                item for item in matches
+                if (order(item) > start if ScanIndexForward else order(item) < start)
+            ]
+
+        last_key = None
+        if Limit is not None and len(matches) > Limit:
+            matches = matches[:Limit]
+            last_key = self._key_attributes(matches[-1], index)
+
+        scanned = len(matches)
+        if item_filter:
+            matches = [item for item in matches if item_filter(item)]
+
+        if index and index.get('projection') not in (None, 'ALL'):
+            keep = set(self._key_attributes(matches[0], index)) if matches else set()
+            if index['projection'] == 'INCLUDE':
+                keep |= set(index.get('include', []))
+            matches = [
+                {k: v for k, v in item.items() if k in keep or k in self._key_attributes(item, index)}
+                for item in matches
+            ]
+
+        response = {
+            'Items': [self._project(item, projection) for item in matches],
+            'Count': len(matches),
+            'ScannedCount': scanned
+        }
+        if Select == 'COUNT':
+            del response['Items']
+        if last_key:
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+    @staticmethod
+    def _hash_value(expression, expressions, hash_name):
+        """Pull the partition key value out of ``<hash> = :value`` in a key condition"""
+        for name, placeholder in _equality_terms(expression):
+            resolved = expressions.names.get(name, name)
+            if resolved == hash_name:
+                return expressions.values[placeholder]
+        raise client_error('ValidationException', 'Query condition missed key schema element', 'Query')
+
+    def scan(self, FilterExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self.calls['Scan'] += 1
+        expressions = Expressions(ExpressionAttributeNames, to_stored(ExpressionAttributeValues or {}))
+        item_filter = expressions.condition(FilterExpression)
+        items = self.store.scan(self.name)
+        if item_filter:
+            items = [item for item in items if item_filter(item)]
+        return {'Items': items, 'Count': len(items), 'ScannedCount': len(items)}
+
+    # Batches
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self, overwrite_by_pkeys)
+
+
+def _equality_terms(expression):
+    """Yield (attribute, :placeholder) pairs for simple equality terms"""
+    for match in re.finditer(r'(#?[A-Za-z0-9_]+)\s*=\s*(:[A-Za-z0-9_]+)', expression):
+        yield match.group(1), match.group(2)
+
+
+class _BatchWriter:
+    """Buffers writes like boto3's BatchWriter and flushes them in groups of 25"""
+
+    def __init__(self, table, overwrite_by_pkeys):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.pending = []
+
+    def put_item(self, Item):
+        self._add(('put', Item))
+
+    def delete_item(self, Key):
+        self._add(('delete', Key))
+
+    def _add(self, request):
+        if self.overwrite_by_pkeys:
+            key = tuple(request[1].get(k) for k in self.overwrite_by_pkeys)
+            self.pending = [
+                r for r in self.pending
+                if tuple(r[1].get(k) for k in self.overwrite_by_pkeys) != key
+            ]
+        self.pending.append(request)
+        if len(self.pending) >= 25:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        self.table.calls['BatchWriteItem'] += 1
+        for action, payload in self.pending:
+            if action == 'put':
+                item = to_stored(payload)
+                self.table.store.put(self.table.name, self.table._key(item), item)
+            else:
+                self.table.store.delete(self.table.name, self.table._key(payload))
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._flush()
+
+
+class FakeDynamoDBResource:
+    """``boto3.resource('dynamodb')`` over a local store"""
+
+    def __init__(self, store, schemas):
+        self.store = store
+        self.schemas = schemas
+        self.calls = Counter()
+        self._tables = {}
+
+    def Table(self, name):
+        if name not in self._tables:
+            if name not in self.schemas:
+                raise client_error('ResourceNotFoundException', f'Requested resource not found: {name}', 'DescribeTable')
+            self._tables[name] = FakeTable(name, self.schemas[name], self.store, self.calls)
+        return self._tables[name]
+
+    def batch_get_item(self, RequestItems):
+        self.calls['BatchGetItem'] += 1
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise client_error('ValidationException', 'Too many items requested for the BatchGetItem call', 'BatchGetItem')
+
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            expressions = Expressions(request.get('ExpressionAttributeNames'))
+            projection = expressions.projection(request.get('ProjectionExpression'))
+            expressions.check_all_used()
+            items = []
+            for key in request['Keys']:
+                item = self.store.get(name, table._key(key))
+                if item:
+                    items.append(table._project(item, projection))
+            responses[name] = items
+
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems):
+        self.calls['BatchWriteItem'] += 1
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise client_error('ValidationException', 'Too many items requested for the BatchWriteItem call', 'BatchWriteItem')
+
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = to_stored(request['PutRequest']['Item'])
+                    self.store.put(name, table._key(item), item)
+                else:
+                    self.store.delete(name, table._key(request['DeleteRequest']['Key']))
+
+        return {'UnprocessedItems': {}}
+
+
+def serialize(value):
+    """Python value -> DynamoDB AttributeValue (as the low-level client takes it)"""
+    value = to_stored(value)
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, Decimal):
+        return {'N': str(value)}
+    if isinstance(value, bytes):
+        return {'B': value}
+    if isinstance(value, set):
+        sample = next(iter(value))
+        if isinstance(sample, str):
+            return {'SS': sorted(value)}
+        if isinstance(sample, bytes):
+            return {'BS': sorted(value)}
+        return {'NS': sorted(str(v) for v in value)}
+    if isinstance(value, list):
+        return {'L': [serialize(v) for v in value]}
+    return {'M': {k: serialize(v) for k, v in value.items()}}
+
+
+def deserialize(attribute):
+    """DynamoDB AttributeValue -> Python value (numbers as Decimal)"""
+    (kind, value), = attribute.items()
+    if kind in ('S', 'B', 'BOOL'):
+        return value
+    if kind == 'NULL':
+        return None
+    if kind == 'N':
+        return Decimal(value)
+    if kind in ('SS', 'BS'):
+        return set(value)
+    if kind == 'NS':
+        return {Decimal(v) for v in value}
+    if kind == 'L':
+        return [deserialize(v) for v in value]
+    if kind == 'M':
+        return {k: deserialize(v) for k, v in value.items()}
+    raise client_error('ValidationException', f'Unknown attribute type {kind}', 'Unknown')
+
+
+def _serialize_item(item):
+    return {k: serialize(v) for k, v in item.items()}
+
+
+def _deserialize_item(item):
+    return {k: deserialize(v) for k, v in item.items()}
+
+
+class FakeDynamoDBClient:
+    """``boto3.client('dynamodb')``: the resource's tables behind AttributeValue marshalling"""
+
+    def __init__(self, resource):
+        self.resource = resource
+
+    @staticmethod
+    def _plain_kwargs(kwargs):
+        kwargs = dict(kwargs)
+        for name in ('Item', 'Key', 'ExclusiveStartKey'):
+            if name in kwargs:
+                kwargs[name] = _deserialize_item(kwargs[name])
+        if 'ExpressionAttributeValues' in kwargs:
+            kwargs['ExpressionAttributeValues'] = _deserialize_item(kwargs['ExpressionAttributeValues'])
+        return kwargs
+
+    @staticmethod
+    def _marshalled_response(response):
+        response = dict(response)
+        for name in ('Item', 'Attributes', 'LastEvaluatedKey'):
+            if name in response:
+                response[name] = _serialize_item(response[name])
+        if 'Items' in response:
+            response['Items'] = [_serialize_item(item) for item in response['Items']]
+        return response
+
+    def _call(self, operation, TableName, kwargs):
+        table = self.resource.Table(TableName)
+        try:
+            return self._marshalled_response(getattr(table, operation)(**self._plain_kwargs(kwargs)))
+        except ClientError as e:
+            if 'Item' in e.response:
+                e.response['Item'] = _serialize_item(e.response['Item'])
+            raise
+
+    def get_item(self, TableName, **kwargs):
+        return self._call('get_item', TableName, kwargs)
+
+    def put_item(self, TableName, **kwargs):
+        return self._call('put_item', TableName, kwargs)
+
+    def update_item(self, TableName, **kwargs):
+        return self._call('update_item', TableName, kwargs)
+
+    def delete_item(self, TableName, **kwargs):
+        return self._call('delete_item', TableName, kwargs)
+
+    def query(self, TableName, **kwargs):
+        return self._call('query', TableName, kwargs)
+
+    def scan(self, TableName, **kwargs):
+        return self._call('scan', TableName, kwargs)
+
+    def batch_get_item(self, RequestItems):
+        plain = {
+            name: dict(request, Keys=[_deserialize_item(key) for key in request['Keys']])
+            for name, request in RequestItems.items()
+        }
+        response = self.resource.batch_get_item(RequestItems=plain)
+        return {
+            'Responses': {
+                name: [_serialize_item(item) for item in items]
+                for name, items in response['Responses'].items()
+            },
+            'UnprocessedKeys': {}
+        }
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None):
+        """All or nothing: a failed condition cancels every action with TransactionCanceledException"""
+        self.resource.calls['TransactWriteItems'] += 1
+        if not 1 <= len(TransactItems) <= 100:
+            raise client_error(
+                'ValidationException', 'Member must have length less than or equal to 100', 'TransactWriteItems'
+            )
+
+        actions = []
+        for entry in TransactItems:
+            (kind, request), = entry.items()
+            request = self._plain_kwargs(request)
+            actions.append((kind, self.resource.Table(request.pop('TableName')), request))
+
+        tables = sorted({table for _, table, _ in actions}, key=lambda table: table.name)
+        with contextlib.ExitStack() as stack:
+            for table in tables:
+                stack.enter_context(table._lock)
+
+            writes = []
+            reasons = []
+            for kind, table, request in actions:
+                try:
+                    writes.append((table, *table._transact_write(kind, request)))
+                    reasons.append({'Code': 'None'})
+                except ClientError as e:
+                    code = e.response['Error']['Code']
+                    if code == 'ValidationException':
+                        raise
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+
+            if len(set((table.name, key) for table, key, _, _ in writes)) < len(writes):
+                raise client_error(
+                    'ValidationException', 'Transaction request cannot include multiple operations on one item',
+                    'TransactWriteItems'
+                )
+
+            if len(writes) < len(actions):
+                error = client_error(
+                    'TransactionCanceledException',
+                    f"Transaction cancelled, please refer cancellation reasons for specific reasons "
+                    f"[{', '.join(reason['Code'] for reason in reasons)}]",
+                    'TransactWriteItems'
+                )
+                error.response['CancellationReasons'] = reasons
+                raise error
+
+            for table, key, item, write in writes:
+                if not write:
+                    continue
+                if item is None:
+                    table.store.delete(table.name, key)
+                else:
+                    table.store.put(table.name, key, item)
+
+        return {}
+
+    def batch_write_item(self, RequestItems):
+        plain = {}
+        for name, requests in RequestItems.items():
+            plain[name] = []
+            for request in requests:
+                if 'PutRequest' in request:
+                    plain[name].append({'PutRequest': {'Item': _deserialize_item(request['PutRequest']['Item'])}})
+                else:
+                    plain[name].append({'DeleteRequest': {'Key': _deserialize_item(request['DeleteRequest']['Key'])}})
+        return self.resource.batch_write_item(RequestItems=plain)
+
+
+class FakeStream:
+    """DynamoDB Streams (``NEW_AND_OLD_IMAGES``) over a :mod:`store`
+
+    Stands in for the store the fake tables write through and records every
+    change as a Lambda stream record, in order. ``drain()`` hands them out
+    the way an event source mapping delivers batches.
+    """
+
+    def __init__(self, store, schemas):
+        self.store = store
+        self.schemas = schemas
+        self.records = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # get, partition, scan and close go straight to the store
+        return getattr(self.store, name)
+
+    def put(self, table, key, item):
+        with self._lock:
+            old = self.store.get(table, key)
+            self.store.put(table, key, item)
+            self._record(table, key, old, item)
+
+    def delete(self, table, key):
+        with self._lock:
+            old = self.store.get(table, key)
+            self.store.delete(table, key)
+            if old is not None:
+                self._record(table, key, old, None)
+
+    def _record(self, table, key, old, new):
+        schema = self.schemas[table]
+        self._sequence += 1
+        change = {
+            'Keys': _serialize_item({schema['hash']: key[0], schema['range']: key[1]}),
+            'SequenceNumber': f'{self._sequence:021d}',
+            'StreamViewType': 'NEW_AND_OLD_IMAGES'
+        }
+        if old is not None:
+            change['OldImage'] = _serialize_item(old)
+        if new is not None:
+            change['NewImage'] = _serialize_item(new)
+
+        self.records.append({
+            'eventID': uuid.uuid4().hex,
+            'eventName': 'INSERT' if old is None else 'REMOVE' if new is None else 'MODIFY',
+            'eventSource': 'aws:dynamodb',
+            'awsRegion': 'local',
+            'dynamodb': change,
+            'eventSourceARN': f'arn:aws:dynamodb:local:000000000000:table/{table}/stream/local'
+        })
+
+    def drain(self, batch_size=100):
+        """Remove and return the recorded changes in batches of up to batch_size"""
+        with self._lock:
+            records, self.records = self.records, []
+        return [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+
+
+class FakeStreamingBody:
+    """The part of botocore's StreamingBody the handlers use"""
+
+    def __init__(self, file, length):
+        self._file = file
+        self._remaining = length
+
+    def read(self, amt=None):
+        size = self._remaining if amt is None else min(amt, self._remaining)
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self._file.close()
+
+
+class FakeS3:
+    """``boto3.client('s3')`` storing objects as files under root/<bucket>/<key>"""
+
+    RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.calls = Counter()
+
+    def _path(self, bucket, key):
+        path = (self.root / bucket / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise client_error('InvalidArgument', 'Invalid key', 'GetObject')
+        return path
+
+    def _existing(self, bucket, key, operation, missing_code='NoSuchKey'):
+        path = self._path(bucket, key)
+        if not path.is_file():
+            raise client_error(missing_code, 'The specified key does not exist.', operation)
+        return path
+
+    def head_object(self, Bucket, Key):
+        self.calls['HeadObject'] += 1
+        # Like S3, a HEAD of a missing key fails with a bare 404
+        path = self._existing(Bucket, Key, 'HeadObject', missing_code='404')
+        return {'ContentLength': path.stat().st_size}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls['GetObject'] += 1
+        path = self._existing(Bucket, Key, 'GetObject')
+        size = path.stat().st_size
+        start, end = 0, size - 1
+
+        if Range:
+            match = self.RANGE_RE.match(Range)
+            if not match:
+                raise client_error('InvalidArgument', f'Unsupported Range: {Range}', 'GetObject')
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                raise client_error('InvalidRange', 'The requested range is not satisfiable', 'GetObject')
+
+        file = path.open('rb')
+        file.seek(start)
+        length = end - start + 1
+        return {'Body': FakeStreamingBody(file, length), 'ContentLength': length}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls['PutObject'] += 1
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Body.encode('utf-8') if isinstance(Body, str) else Body)
+        return {}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        self.calls['PutObject'] += 1
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Filename, path)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        """A file:// URI of the object; nothing to sign locally"""
+        return self._path(Params['Bucket'], Params['Key']).as_uri()
+
+
+class Boto3Facade:
+    """Hands out the fake clients in place of the real ``boto3`` module
+
+    Handlers create their clients either at import time or lazily, so the
+    facade is swapped into ``sys.modules`` while a handler module is being
+    imported and also assigned to the handler's own ``boto3`` global.
+    """
+
+    def __init__(self, bus, store, schemas, s3_root=None):
+        self.events = FakeEventBridge(bus)
+        self.s3 = FakeS3(s3_root) if s3_root else None
+        self.dynamodb = FakeDynamoDBResource(store, schemas)
+        self.dynamodb_client = FakeDynamoDBClient(self.dynamodb)
+        self.module = types.ModuleType('boto3')
+        self.module.client = self.client
+        self.module.resource = self.resource
+
+    def client(self, service_name, **kwargs):
+        if service_name == 'events':
+            return self.events
+        if service_name == 'dynamodb':
+            return self.dynamodb_client
+        if service_name == 's3' and self.s3 is not None:
+            return self.s3
+        raise NotImplementedError(f'No local stand-in for the {service_name} client')
+
+    def resource(self, service_name, **kwargs):
+        if service_name == 'dynamodb':
+            return self.dynamodb
+        raise NotImplementedError(f'No local stand-in for the {service_name} resource')
+
+    def call_counts(self):
+        """Downstream API calls made so far, by operation"""
+        return dict(self.events.calls + self.dynamodb.calls + (self.s3.calls if self.s3 else Counter()))
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Temporarily make ``import boto3`` (and botocore.exceptions) resolve to the fakes"""
+        names = ('boto3', 'botocore', 'botocore.exceptions')
+        saved = {name: sys.modules.get(name) for name in names}
+
+        try:
+            import botocore.exceptions  # noqa: F401
+            installed = ('boto3',)
+        except ImportError:
+            exceptions = types.ModuleType('botocore.exceptions')
+            exceptions.ClientError = ClientError
+            botocore = types.ModuleType('botocore')
+            botocore.exceptions = exceptions
+            sys.modules['botocore'] = botocore
+            sys.modules['botocore.exceptions'] = exceptions
+            installed = names
+
+        sys.modules['boto3'] = self.module
+        try:
+            yield self.module
+        finally:
+            for name in installed:
+                if saved[name] is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = saved[name]
@@ -0,0 +1,77 @@
+"""Loading the unmodified Lambda handlers from lambda-functions/"""
+
+import importlib.util
+import sys
+import time
+import uuid
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+LAMBDA_DIR = REPO_ROOT / 'lambda-functions'
+
+# The shared layer; Lambda puts a layer's python/ directory on sys.path
+LAYER_DIR = REPO_ROOT / 'lambda-layers' / 'dnscheck-common' / 'python'
+
+# Mirrors local.lambda_functions in locals.tf
+FUNCTIONS = {
+    'api_ingest': 'dnscheck-api-ingest',
+    'dns_resolver': 'dnscheck-dns-resolver',
+    'http_prober': 'dnscheck-http-prober',
+    'https_prober': 'dnscheck-https-prober',
+    'aggregator': 'dnscheck-aggregator',
+    'status_api': 'dnscheck-status-api',
+    'ip_authorizer': 'dnscheck-ip-authorizer',
+    'bulk_job': 'dnscheck-bulk-job',
+    'history_exporter': 'dnscheck-history-exporter',
+}
+
+# Mirrors the timeouts in lambda.tf (seconds)
+TIMEOUTS = {
+    'ip_authorizer': 5,
+    'bulk_job': 900,
+    'history_exporter': 60,
+}
+DEFAULT_TIMEOUT = 30
+
+
+class LambdaContext:
+    """Enough of the Lambda context object for the handlers"""
+
+    def __init__(self, key, timeout=None):
+        self.function_name = FUNCTIONS[key]
+        self.function_version = '$LATEST'
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 128
+        self.invoked_function_arn = f'arn:aws:lambda:local:000000000000:function:{self.function_name}'
+        self._deadline = time.monotonic() + (timeout or TIMEOUTS.get(key, DEFAULT_TIMEOUT))
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+def load_handler_module(key, facade):
+    """Import lambda-functions/<name>/lambda_function.py under a unique module name
+
+    All functions share the module name ``lambda_function``, so each one is
+    loaded from its path directly. The boto3 facade is active during the import
+    so clients created at module level are the local fakes, and the shared
+    layer's client pool is pointed at the same facade.
+    """
+    if str(LAYER_DIR) not in sys.path:
+        sys.path.insert(0, str(LAYER_DIR))
+
+    from dnscheck_common import clients
+    clients.set_factory(facade)
+
+    path = LAMBDA_DIR / FUNCTIONS[key] / 'lambda_function.py'
+    spec = importlib.util.spec_from_file_location(f'dnscheck_local.functions.{key}', path)
+    module = importlib.util.module_from_spec(spec)
+
+    with facade.installed():
+        spec.loader.exec_module(module)
+
+    # Clients created lazily later still come from the facade
+    if hasattr(module, 'boto3'):
+        module.boto3 = facade.module
+
+    return module
@@ -0,0 +1,178 @@
+"""Runs the whole validation pipeline in-process"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .bus import EventBus
+from .fakes import VALIDATIONS_SCHEMA, Boto3Facade, FakeStream
+from .handlers import LambdaContext, load_handler_module
+from .store import MemoryStore
+
+# Environment the handlers expect, mirroring lambda.tf
+DEFAULT_ENV = {
+    'EVENTBUS_NAME': 'dnscheck-bus',
+    'DYNAMODB_TABLE': 'dnscheck-validations',
+    'JOBS_BUCKET': 'dnscheck-jobs',
+    'HISTORY_BUCKET': 'dnscheck-history',
+}
+
+
+def api_event(method, path, body=None, query=None, headers=None, source_ip='127.0.0.1'):
+    """API Gateway HTTP API (payload format 2.0) proxy event"""
+    return {
+        'version': '2.0',
+        'routeKey': f'{method} {path}',
+        'rawPath': path,
+        'headers': headers or {},
+        'queryStringParameters': query,
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False,
+        'requestContext': {
+            'http': {
+                'method': method,
+                'path': path,
+                'sourceIp': source_ip
+            }
+        }
+    }
+
+
+class Pipeline:
+    """The deployed architecture, minus AWS
+
+    ``ValidationRequested`` events from the api-ingest handler travel over an
+    in-memory :class:`EventBus` to the resolver, both probers (concurrently)
+    and the aggregator, which writes to a local store instead of DynamoDB.
+    Every handler invocation is recorded in ``invocations`` with its duration.
+    S3 (bulk job inputs and results) is the directory ``s3_root``, a
+    temporary one unless given. With ``history=True`` the table's changes
+    are recorded like a DynamoDB stream for :meth:`export_history`.
+    """
+
+    def __init__(self, store=None, env=None, max_workers=32, s3_root=None, history=False):
+        for key, value in DEFAULT_ENV.items():
+            os.environ.setdefault(key, value)
+        for key, value in (env or {}).items():
+            os.environ[key] = str(value)
+
+        self.store = store or MemoryStore()
+        self._s3_tempdir = None if s3_root else tempfile.mkdtemp(prefix='dnscheck-s3-')
+        self.s3_root = Path(s3_root or self._s3_tempdir)
+        self.bus = EventBus(self.invoke, max_workers=max_workers)
+        schemas = {os.environ['DYNAMODB_TABLE']: VALIDATIONS_SCHEMA}
+        self.stream = FakeStream(self.store, schemas) if history else None
+        self.facade = Boto3Facade(self.bus, self.stream or self.store, schemas, s3_root=self.s3_root)
+        self.invocations = []
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def handler(self, key):
+        """The loaded handler module for a function key (see handlers.FUNCTIONS)"""
+        with self._lock:
+            if key not in self._modules:
+                self._modules[key] = load_handler_module(key, self.facade)
+            return self._modules[key]
+
+    def invoke(self, key, event, timeout=None):
+        """Invoke a handler the way Lambda would and record how long it took"""
+        module = self.handler(key)
+        context = LambdaContext(key, timeout)
+
+        started = time.perf_counter()
+        response = module.lambda_handler(event, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self.invocations.append({
+                'function': key,
+                'detailType': event.get('detail-type'),
+                'durationMs': duration_ms,
+                'statusCode': response.get('statusCode') if isinstance(response, dict) else None
+            })
+
+        if isinstance(response, dict) and response.get('statusCode', 200) >= 500:
+            print(f'{key} returned {response.get("statusCode")}: {response.get("body")}', file=sys.stderr)
+
+        return response
+
+    def submit(self, targets):
+        """POST /check with a list of targets; returns the parsed response body"""
+        response = self.invoke('api_ingest', api_event('POST', '/check', body={'targets': list(targets)}))
+        body = json.loads(response['body'])
+        body['statusCode'] = response['statusCode']
+        return body
+
+    def wait(self, timeout=None):
+        """Block until every event has been delivered and handled"""
+        return self.bus.wait_idle(timeout)
+
+    def status(self, request_id):
+        """GET /status?requestId=...; returns the parsed response body"""
+        response = self.invoke('status_api', api_event('GET', '/status', query={'requestId': request_id}))
+        return json.loads(response['body'])
+
+    def validate(self, targets, timeout=60):
+        """Submit targets, wait for the pipeline to drain and return one status per request"""
+        submission = self.submit(targets)
+        if submission['statusCode'] != 200:
+            raise RuntimeError(submission.get('error', 'Submission failed'))
+
+        self.wait(timeout)
+
+        return [
+            self.status(request['requestId'])
+            for request in submission['requests'] if request['status'] != 'failed'
+        ]
+
+    def upload(self, path, key=None):
+        """Copy a local file into the jobs bucket; returns its key"""
+        key = key or f'input/{Path(path).name}'
+        self.facade.s3.upload_file(str(path), os.environ['JOBS_BUCKET'], key)
+        return key
+
+    def submit_job(self, input_key, **options):
+        """POST /jobs for an object in the jobs bucket; returns the parsed response body"""
+        response = self.invoke('bulk_job', api_event('POST', '/jobs', body={'inputKey': input_key, **options}))
+        body = json.loads(response['body'])
+        body['statusCode'] = response['statusCode']
+        return body
+
+    def job(self, job_id):
+        """GET /jobs?jobId=...; returns the parsed response body"""
+        response = self.invoke('bulk_job', api_event('GET', '/jobs', query={'jobId': job_id}))
+        return json.loads(response['body'])
+
+    def job_results(self, job_id):
+        """Path of a completed job's results file (gzip NDJSON)"""
+        return self.s3_root / os.environ['JOBS_BUCKET'] / self.job(job_id)['resultKey']
+
+    def export_history(self, batch_size=100):
+        """Deliver the recorded stream to the history exporter in batches; returns the directory it wrote to"""
+        if self.stream is None:
+            raise RuntimeError('The stream is only recorded with Pipeline(history=True)')
+
+        for records in self.stream.drain(batch_size):
+            response = self.invoke('history_exporter', {'Records': records})
+            if response['batchItemFailures']:
+                print(f"history_exporter failed from record {response['batchItemFailures'][0]['itemIdentifier']}",
+                      file=sys.stderr)
+
+        return self.s3_root / os.environ['HISTORY_BUCKET']
+
+    def close(self):
+        self.bus.shutdown()
+        self.store.close()
+        if self._s3_tempdir:
+            shutil.rmtree(self._s3_tempdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,155 @@
+"""Item storage behind the fake DynamoDB tables
+
+A store only knows how to keep whole items by (table, hash key, range key);
+key conditions, indexes and expressions are handled by the fake table on
+top of it, so both stores behave identically.
+"""
+
+import base64
+import copy
+import json
+import sqlite3
+import threading
+from decimal import Decimal
+
+
+def parse_store(spec):
+    """Build a store from a CLI spec: ``memory`` or ``sqlite:PATH``"""
+    if not spec or spec == 'memory':
+        return MemoryStore()
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec[len('sqlite:'):])
+    raise ValueError(f'Unknown store {spec!r}; use memory or sqlite:PATH')
+
+
+class MemoryStore:
+    """Items kept in a dict for the lifetime of the process"""
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.RLock()
+
+    def get(self, table, key):
+        with self._lock:
+            item = self._tables.get(table, {}).get(key)
+            return copy.deepcopy(item)
+
+    def put(self, table, key, item):
+        with self._lock:
+            self._tables.setdefault(table, {})[key] = copy.deepcopy(item)
+
+    def delete(self, table, key):
+        with self._lock:
+            self._tables.get(table, {}).pop(key, None)
+
+    def partition(self, table, hash_value):
+        with self._lock:
+            return [
+                copy.deepcopy(item) for (pk, _), item in self._tables.get(table, {}).items()
+                if pk == hash_value
+            ]
+
+    def scan(self, table):
+        with self._lock:
+            return [copy.deepcopy(item) for item in self._tables.get(table, {}).values()]
+
+    def close(self):
+        pass
+
+
+def _encode(value):
+    """JSON-safe encoding that round-trips Decimal, bytes and sets"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, bytes):
+        return {'B': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (set, frozenset)):
+        members = sorted(value, key=str)
+        if all(isinstance(m, str) for m in members):
+            return {'SS': members}
+        if all(isinstance(m, bytes) for m in members):
+            return {'BS': [base64.b64encode(m).decode('ascii') for m in members]}
+        return {'NS': [str(m) for m in members]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {'M': {k: _encode(v) for k, v in value.items()}}
+    raise TypeError(f'Unsupported type: {type(value).__name__}')
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    (kind, inner), = value.items()
+    if kind == 'N':
+        return Decimal(inner)
+    if kind == 'B':
+        return base64.b64decode(inner)
+    if kind == 'SS':
+        return set(inner)
+    if kind == 'NS':
+        return {Decimal(v) for v in inner}
+    if kind == 'BS':
+        return {base64.b64decode(v) for v in inner}
+    return {k: _decode(v) for k, v in inner.items()}
+
+
+class SQLiteStore:
+    """Items persisted in a local SQLite file, so results survive between CLI runs"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS items ('
+            ' tbl TEXT NOT NULL, pk TEXT NOT NULL, sk TEXT NOT NULL, data TEXT NOT NULL,'
+            ' PRIMARY KEY (tbl, pk, sk))'
+        )
+
+    @staticmethod
+    def _key(key):
+        pk, sk = key
+        return json.dumps(_encode(pk)), json.dumps(_encode(sk))
+
+    def get(self, table, key):
+        pk, sk = self._key(key)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM items WHERE tbl = ? AND pk = ? AND sk = ?', (table, pk, sk)
+            ).fetchone()
+        return _decode(json.loads(row[0])) if row else None
+
+    def put(self, table, key, item):
+        pk, sk = self._key(key)
+        data = json.dumps(_encode(item))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO items (tbl, pk, sk, data) VALUES (?, ?, ?, ?)',
+                (table, pk, sk, data)
+            )
+
+    def delete(self, table, key):
+        pk, sk = self._key(key)
+        with self._lock:
+            self._conn.execute('DELETE FROM items WHERE tbl = ? AND pk = ? AND sk = ?', (table, pk, sk))
+
+    def partition(self, table, hash_value):
+        pk = json.dumps(_encode(hash_value))
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM items WHERE tbl = ? AND pk = ?', (table, pk)).fetchall()
+        return [_decode(json.loads(row[0])) for row in rows]
+
+    def scan(self, table):
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM items WHERE tbl = ?', (table,)).fetchall()
+        return [_decode(json.loads(row[0])) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,3 +3,147 @@ variable "project_name" {
   type        = string
   default     = "dnscheck"
 }
+
+variable "aggregator_batching" {
+  description = "Buffer aggregator events in SQS and process them in batches (for bulk runs) instead of one invocation per event"
+  type        = bool
+  default     = false
+}
+
+variable "aggregator_batch_size" {
+  description = "Maximum number of result events per aggregator invocation when aggregator_batching is enabled"
+  type        = number
+  default     = 100
+}
+
+variable "aggregator_batch_window" {
+  description = "Seconds to wait while gathering a batch when aggregator_batching is enabled"
+  type        = number
+  default     = 2
+}
+
+variable "storage_layout" {
+  description = "How the aggregator stores results: items (one item per step plus PROGRESS and SUMMARY) or single (one RESULT item per request, updated in place and expiring after result_ttl_days). The status API reads either"
+  type        = string
+  default     = "items"
+
+  validation {
+    condition     = contains(["items", "single"], var.storage_layout)
+    error_message = "storage_layout must be items or single."
+  }
+}
+
+variable "result_ttl_days" {
+  description = "Days after its last update that DynamoDB TTL removes a RESULT item (storage_layout = single); 0 keeps results forever"
+  type        = number
+  default     = 30
+}
+
+variable "history_export" {
+  description = "Stream finished validations from the table into date/target-partitioned history files in the history bucket (enables the table's stream)"
+  type        = bool
+  default     = false
+}
+
+variable "history_format" {
+  description = "File format of the history export: ndjson (gzip) or parquet (needs pyarrow packaged with the exporter)"
+  type        = string
+  default     = "ndjson"
+
+  validation {
+    condition     = contains(["ndjson", "parquet"], var.history_format)
+    error_message = "history_format must be ndjson or parquet."
+  }
+}
+
+variable "history_batch_size" {
+  description = "Maximum number of stream records per history exporter invocation; larger batches write fewer, larger files"
+  type        = number
+  default     = 1000
+}
+
+variable "history_batch_window" {
+  description = "Seconds the history exporter gathers stream records before writing a batch"
+  type        = number
+  default     = 60
+}
+
+variable "history_expiration_days" {
+  description = "Days to keep history files (history/ in the history bucket)"
+  type        = number
+  default     = 365
+}
+
+variable "allowed_ips_parameter" {
+  description = "Optional SSM parameter (String or StringList of IPs/CIDRs) the IP authorizer allows in addition to the deployer's IP"
+  type        = string
+  default     = ""
+}
+
+variable "coalesce_window" {
+  description = "Seconds a running validation of a target absorbs new requests for it (also the lock's expiry); 0 (default) disables coalescing; enabling it adds a conditional put per target to every submission"
+  type        = number
+  default     = 0
+}
+
+variable "validation_budget" {
+  description = "Seconds a validation may take end to end; stages cut their timeouts to what is left and report a timeout step once it has passed. 0 leaves only the per-stage timeouts"
+  type        = number
+  default     = 30
+}
+
+variable "bulk_job_rate" {
+  description = "Targets per second a bulk job submits to the pipeline (ValidationRequested events)"
+  type        = number
+  default     = 50
+}
+
+variable "bulk_job_chunk_size" {
+  description = "Input lines a bulk job reads per invocation before handing over to the next one"
+  type        = number
+  default     = 5000
+}
+
+variable "bulk_job_results_expiration_days" {
+  description = "Days to keep bulk job results files (results/ in the jobs bucket)"
+  type        = number
+  default     = 30
+}
+
+variable "probe_max_redirects" {
+  description = "Redirects the HTTP and HTTPS probers follow per probe before failing it; 0 reports the first response as is"
+  type        = number
+  default     = 5
+}
+
+variable "probe_rate_limits" {
+  description = "Requests per second (rate) and bucket size (burst) the probers allow per target hostname and per IP address, shared by all containers; a rate of 0 disables that limit, a burst of 0 uses the rate. max_wait is the seconds a probe waits before going ahead anyway"
+  type = object({
+    host_rate  = number
+    host_burst = number
+    ip_rate    = number
+    ip_burst   = number
+    max_wait   = number
+  })
+  default = {
+    host_rate  = 0
+    host_burst = 0
+    ip_rate    = 0
+    ip_burst   = 0
+    max_wait   = 5
+  }
+}
+
+variable "latency_p99_thresholds_ms" {
+  description = "p99 alarm threshold per pipeline stage (StageDuration, milliseconds); end_to_end applies to the aggregator's EndToEndLatency"
+  type        = map(number)
+  default = {
+    ingest     = 1000
+    dns        = 5000
+    http       = 10000
+    https      = 10000
+    aggregate  = 2000
+    status     = 1000
+    end_to_end = 30000
+  }
+}
@@ -10,7 +10,7 @@ terraform {
     }
     archive = {
       source  = "hashicorp/archive"
-      version = ">= 2.0"
+      version = ">= 2.5"
     }
   }
 }